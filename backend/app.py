@@ -5,21 +5,56 @@ Handles all chatbot requests and medical logic
 
 import datetime
 import json
+import math
 import os
+import random
+import time
 
+from batch_analyzer import batch_analyzer
 from camera_analyzer import camera_analyzer
+from compression import CompressionMiddleware
 from emergency_detector import EmergencyDetector
-from flask import Flask, jsonify, request, send_from_directory
+from family_doctor_store import family_doctor_store
+from flask import Flask, jsonify, request
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from gemini_service import gemini_service
+from geo_index import facility_tags, geo_index, parse_coordinates
+from notification_outbox import doctor_notification, whatsapp_outbox
 from otp_service import otp_service
 from severity_classifier import SeverityClassifier
+from sms_dispatcher import sms_dispatcher
 from symptom_analyzer import SymptomAnalyzer
+from symptom_router import symptom_router
+from whatsapp_broadcast import whatsapp_broadcaster
 from database import db
+from doctor_directory import doctor_directory, normalize
 from auth_manager import auth_manager
+from appointment_store import appointment_store
+from rate_limiter import rate_limiter
+from schedule_engine import (
+    BOOKING_FORM_DOCTORS,
+    InvalidBookingError,
+    SlotUnavailableError,
+    parse_slot,
+    schedule_engine,
+)
+from search_index import search_index
+from static_assets import static_assets
+from records import Appointment
+from response_cache import response_cache
 
 app = Flask(__name__)
 CORS(app)  # Allow frontend to communicate
+compression = CompressionMiddleware(app.wsgi_app)
+app.wsgi_app = compression  # gzip/br/zstd for large text responses
+
+# Behind the Heroku router (or any reverse proxy) remote_addr is the proxy;
+# trust that many X-Forwarded-For hops so rate limits see the real client.
+# Heroku sets DYNO; without a proxy the header is the client's and ignored.
+PROXY_HOPS = int(os.getenv("PROXY_FIX_HOPS", "1" if os.getenv("DYNO") else "0"))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
 
 # Initialize medical modules
 analyzer = SymptomAnalyzer()
@@ -27,19 +62,99 @@ classifier = SeverityClassifier()
 emergency = EmergencyDetector()
 
 # Load knowledge bases
-with open("medical_kb.json", "r") as f:
-    MEDICAL_KB = json.load(f)
-with open("doctors_db.json", "r") as f:
-    DOCTORS_DB = json.load(f)
+KB_FILES = ("medical_kb.json", "doctors_db.json")
+MEDICAL_KB = {}
+DOCTORS_DB = {}
+KB_VERSION = 0  # bumped on every (re)load
+_kb_signature = None
+
+
+def reload_knowledge_bases(force=False):
+    """(Re)load the KB files and rebuild the search index if they changed on disk"""
+    global MEDICAL_KB, DOCTORS_DB, KB_VERSION, _kb_signature
+    signature = tuple(os.stat(path).st_mtime_ns for path in KB_FILES)
+    if signature == _kb_signature and not force:
+        return False
+
+    with open("medical_kb.json", "r") as f:
+        medical_kb = json.load(f)
+    with open("doctors_db.json", "r") as f:
+        doctors_db = json.load(f)
+    search_index.rebuild(medical_kb, doctors_db)
+    geo_index.rebuild(facility_tags(doctors_db))
+    doctor_directory.rebuild(doctors_db.get("doctors", []))
+    symptom_router.rebuild(medical_kb, doctors_db)
+    schedule_engine.set_doctors(
+        BOOKING_FORM_DOCTORS + [str(doctor["id"]) for doctor in doctors_db.get("doctors", [])]
+    )
+    MEDICAL_KB, DOCTORS_DB, _kb_signature = medical_kb, doctors_db, signature
+    KB_VERSION += 1
+    return True
+
+
+def current_kb_version():
+    """KB_VERSION after picking up edits to the KB files, without a restart"""
+    try:
+        reload_knowledge_bases()
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Knowledge base reload failed, keeping the current one: {e}")
+    return KB_VERSION
+
+
+reload_knowledge_bases()
+static_assets.load()
+
 
-# Store family doctors locally (simple file-based)
-FAMILY_DOCTOR_FILE = "family_doctor.json"
+def parse_appointment_slot(date_value, time_value):
+    """(date, "HH:MM") for a booking request, or None if either is invalid"""
+    try:
+        date = datetime.date.fromisoformat(date_value)
+    except (TypeError, ValueError):
+        return None
+    slot_time = parse_slot(time_value)
+    return (date, slot_time) if slot_time else None
+
+
+# Seed a new reservation table from appointments booked before it existed
+if schedule_engine.created:
+    existing = []
+    for apt in appointment_store.all():
+        slot = parse_appointment_slot(apt.date, apt.time)
+        if slot is not None and apt.status != "cancelled":
+            existing.append((apt.doctor_id, slot[0], slot[1], apt.id))
+    schedule_engine.backfill(existing)
+
+# Resume delivery of WhatsApp notifications queued before a restart
+try:
+    whatsapp_outbox.relay()
+except Exception as e:
+    print(f"❌ Could not move saved WhatsApp notifications to the outbox: {e}")
+if whatsapp_outbox.store.has_pending():
+    whatsapp_outbox.wake()
+
+@app.before_request
+def enforce_rate_limit():
+    """Reject requests over their route's token-bucket budget"""
+    allowed, retry_after = rate_limiter.check(request)
+    if allowed:
+        return None
+
+    response = jsonify(
+        {
+            "success": False,
+            "message": "Too many requests. Please slow down and try again shortly.",
+            "retry_after": math.ceil(retry_after),
+        }
+    )
+    response.status_code = 429
+    response.headers["Retry-After"] = str(math.ceil(retry_after))
+    return response
 
 
 @app.route("/")
 def home():
     """Serve frontend files"""
-    return send_from_directory("../frontend", "index.html")
+    return static_assets.serve("index.html")
 
 
 @app.route("/<path:path>")
@@ -50,110 +165,127 @@ def serve_frontend(path):
         from flask import abort
 
         abort(404)
-    try:
-        return send_from_directory("../frontend", path)
-    except:
-        return send_from_directory("../frontend", "index.html")
+    return static_assets.serve(path)
 
 
-@app.route("/api/chat", methods=["POST"])
-def chat():
-    """Main chat endpoint with LLM-style responses"""
-    try:
-        data = request.json
-        user_message = data.get("message", "").lower().strip()
-        user_id = data.get("user_id", "anonymous")
+def chat_thinking_time():
+    """Seconds /api/chat pauses before answering (like LLM processing)"""
+    return random.uniform(0.5, 1.5)  # 0.5-1.5 seconds
 
-        # Simulate thinking time (like LLM processing)
-        import random
-        import time
 
-        thinking_time = random.uniform(0.5, 1.5)  # 0.5-1.5 seconds
-        time.sleep(thinking_time)
+def chat_precheck(data):
+    """
+    The part of /api/chat that needs no AI call
 
-        # Check if non-medical query
-        if is_non_medical(user_message):
-            return jsonify(
-                {
-                    "response": generate_llm_style_response(
-                        "I appreciate you reaching out, but I'm specifically designed to assist with medical and health-related concerns. I'm trained to analyze symptoms, provide health guidance, and help in medical emergencies.\n\nIs there a health concern I can help you with today?",
-                        thinking_process="Analyzing query intent → Detected non-medical topic → Providing polite redirection",
-                    ),
-                    "severity": 0,
-                    "type": "general",
-                    "thinking_process": "I analyzed your message and determined it's not health-related. Redirecting to medical topics.",
-                    "follow_up": [
-                        "Do you have any health symptoms?",
-                        "Is there a medical concern I can help with?",
-                    ],
-                }
-            )
+    Returns (payload, None) for messages answered straight away (non-medical
+    or emergency), otherwise (None, analysis) to pass on to chat_reply().
+    """
+    user_message = data.get("message", "").lower().strip()
+    user_id = data.get("user_id", "anonymous")
+
+    # Check if non-medical query
+    if is_non_medical(user_message):
+        return {
+            "response": generate_llm_style_response(
+                "I appreciate you reaching out, but I'm specifically designed to assist with medical and health-related concerns. I'm trained to analyze symptoms, provide health guidance, and help in medical emergencies.\n\nIs there a health concern I can help you with today?",
+                thinking_process="Analyzing query intent → Detected non-medical topic → Providing polite redirection",
+            ),
+            "severity": 0,
+            "type": "general",
+            "thinking_process": "I analyzed your message and determined it's not health-related. Redirecting to medical topics.",
+            "follow_up": [
+                "Do you have any health symptoms?",
+                "Is there a medical concern I can help with?",
+            ],
+        }, None
+
+    # Check for emergency first
+    emergency_result = emergency.check_emergency(user_message)
+    if emergency_result["is_emergency"]:
+        return {
+            "response": generate_llm_style_response(
+                emergency_result["response"],
+                thinking_process=f"Analyzing symptoms → CRITICAL: Emergency detected → Activating emergency protocol",
+            ),
+            "severity": 4,
+            "type": "emergency",
+            "first_aid": emergency_result.get("first_aid", []),
+            "hospitals": get_nearby_hospitals(
+                data.get("city", "unknown"), data.get("lat"), data.get("lon")
+            ),
+            "thinking_process": "Emergency situation identified. Prioritizing immediate safety instructions.",
+            "reasoning": "Based on the keywords in your message, this appears to be a medical emergency requiring immediate attention.",
+        }, None
 
-        # Check for emergency first
-        emergency_result = emergency.check_emergency(user_message)
-        if emergency_result["is_emergency"]:
-            return jsonify(
-                {
-                    "response": generate_llm_style_response(
-                        emergency_result["response"],
-                        thinking_process=f"Analyzing symptoms → CRITICAL: Emergency detected → Activating emergency protocol",
-                    ),
-                    "severity": 4,
-                    "type": "emergency",
-                    "first_aid": emergency_result.get("first_aid", []),
-                    "hospitals": get_nearby_hospitals(data.get("city", "unknown")),
-                    "thinking_process": "Emergency situation identified. Prioritizing immediate safety instructions.",
-                    "reasoning": "Based on the keywords in your message, this appears to be a medical emergency requiring immediate attention.",
-                }
-            )
+    # Analyze symptoms with detailed reasoning
+    symptoms = analyzer.extract_symptoms(user_message)
+    severity = classifier.classify(user_message, symptoms)
+    return None, (user_message, symptoms, severity, user_id)
 
-        # Analyze symptoms with detailed reasoning
-        symptoms = analyzer.extract_symptoms(user_message)
-        severity = classifier.classify(user_message, symptoms)
 
-        # Generate AI-powered response using Gemini
-        ai_response = gemini_service.chat_medical(user_message, symptoms, severity)
+def chat_reply(analysis, ai_response):
+    """/api/chat payload once the AI response for chat_precheck()'s analysis is in"""
+    user_message, symptoms, severity, user_id = analysis
 
-        # Generate enhanced LLM-style response with reasoning
-        response = generate_medical_response_llm(
-            user_message, symptoms, severity, user_id
-        )
+    # Generate enhanced LLM-style response with reasoning
+    response = generate_medical_response_llm(
+        user_message, symptoms, severity, user_id
+    )
 
-        # Use AI response if available, otherwise use fallback
-        final_response = (
-            ai_response if ai_response != response["text"] else response["text"]
-        )
+    # Use AI response if available, otherwise use fallback
+    final_response = (
+        ai_response if ai_response != response["text"] else response["text"]
+    )
+
+    return {
+        "response": final_response,
+        "severity": severity,
+        "type": response["type"],
+        "suggested_doctors": response.get("doctors", []),
+        "matched_doctors": symptom_router.doctors_for(response.get("doctors", [])),
+        "actions": response.get("actions", []),
+        "redirect_to": response.get("redirect_to"),
+        "thinking_process": response.get("thinking_process", ""),
+        "reasoning": response.get("reasoning", ""),
+        "follow_up": response.get("follow_up", []),
+    }
+
+
+def chat_error_reply():
+    return {
+        "response": generate_llm_style_response(
+            "I encountered an issue processing your message. Could you please rephrase your symptoms more clearly? For example: 'I have a fever and cough for 2 days.'",
+            thinking_process="Error in processing → Requesting clarification",
+        ),
+        "severity": 0,
+        "type": "error",
+        "thinking_process": "I had trouble understanding. Let me help you rephrase.",
+        "follow_up": [
+            "Can you describe your main symptom?",
+            "How long have you had these symptoms?",
+        ],
+    }
 
-        return jsonify(
-            {
-                "response": final_response,
-                "severity": severity,
-                "type": response["type"],
-                "suggested_doctors": response.get("doctors", []),
-                "actions": response.get("actions", []),
-                "redirect_to": response.get("redirect_to"),
-                "thinking_process": response.get("thinking_process", ""),
-                "reasoning": response.get("reasoning", ""),
-                "follow_up": response.get("follow_up", []),
-            }
-        )
+
+@app.route("/api/chat", methods=["POST"])
+def chat():
+    """Main chat endpoint with LLM-style responses"""
+    try:
+        data = request.json
+
+        # Simulate thinking time (like LLM processing)
+        time.sleep(chat_thinking_time())
+
+        payload, analysis = chat_precheck(data)
+        if payload is None:
+            # Generate AI-powered response using Gemini
+            user_message, symptoms, severity, _ = analysis
+            ai_response = gemini_service.chat_medical(user_message, symptoms, severity)
+            payload = chat_reply(analysis, ai_response)
+        return jsonify(payload)
 
     except Exception as e:
-        return jsonify(
-            {
-                "response": generate_llm_style_response(
-                    "I encountered an issue processing your message. Could you please rephrase your symptoms more clearly? For example: 'I have a fever and cough for 2 days.'",
-                    thinking_process="Error in processing → Requesting clarification",
-                ),
-                "severity": 0,
-                "type": "error",
-                "thinking_process": "I had trouble understanding. Let me help you rephrase.",
-                "follow_up": [
-                    "Can you describe your main symptom?",
-                    "How long have you had these symptoms?",
-                ],
-            }
-        )
+        return jsonify(chat_error_reply())
 
 
 @app.route("/api/save-doctor", methods=["POST"])
@@ -169,26 +301,7 @@ def save_doctor():
             "specialization": data.get("specialization", "General Physician"),
         }
 
-        # Load existing doctors
-        doctors = []
-        if os.path.exists(FAMILY_DOCTOR_FILE):
-            with open(FAMILY_DOCTOR_FILE, "r") as f:
-                doctors = json.load(f)
-
-        # Update or add doctor
-        found = False
-        for i, doc in enumerate(doctors):
-            if doc["user_id"] == user_id:
-                doctors[i] = doctor_info
-                found = True
-                break
-
-        if not found:
-            doctors.append(doctor_info)
-
-        # Save
-        with open(FAMILY_DOCTOR_FILE, "w") as f:
-            json.dump(doctors, f, indent=2)
+        family_doctor_store.save(doctor_info)
 
         return jsonify({"success": True, "message": "Doctor saved successfully"})
 
@@ -200,16 +313,12 @@ def save_doctor():
 def get_family_doctor(user_id):
     """Get family doctor for user"""
     try:
-        if not os.path.exists(FAMILY_DOCTOR_FILE):
-            return jsonify({"success": False, "message": "No doctors found"})
-
-        with open(FAMILY_DOCTOR_FILE, "r") as f:
-            doctors = json.load(f)
-
-        for doctor in doctors:
-            if doctor["user_id"] == user_id:
-                return jsonify({"success": True, "doctor": doctor})
+        doctor = family_doctor_store.get(user_id)
+        if doctor is not None:
+            return jsonify({"success": True, "doctor": doctor})
 
+        if not len(family_doctor_store):
+            return jsonify({"success": False, "message": "No doctors found"})
         return jsonify({"success": False, "message": "No doctor found for this user"})
 
     except Exception as e:
@@ -230,8 +339,13 @@ def analyze_injury_image():
         if not image_data:
             return jsonify({"success": False, "error": "No image data provided"})
 
-        # Analyze injury using Gemini AI Vision
-        analysis = gemini_service.analyze_injury_image(image_data)
+        # Answer locally when the on-device classifier is confident,
+        # otherwise escalate to Gemini AI Vision
+        analysis = camera_analyzer.triage_injury_image(image_data)
+        if analysis is None:
+            analysis = gemini_service.analyze_injury_image(
+                image_data, auth_manager.user_from_authorization(request.headers.get("Authorization"))
+            )
 
         # Add user notes if provided
         if user_notes and analysis.get("success"):
@@ -249,31 +363,121 @@ def analyze_injury_image():
         )
 
 
+@app.route("/api/analyze-injury-images/batch", methods=["POST"])
+def analyze_injury_images_batch():
+    """
+    📸 Batch Injury Analysis - Analyzes a series of injury photos at once
+    Returns one result per image, in upload order, with per-image timings
+    """
+    try:
+        data = request.json
+        images = data.get("images") or []
+
+        if not images:
+            return jsonify({"success": False, "error": "No images provided"}), 400
+
+        batch = batch_analyzer.analyze(
+            images, auth_manager.user_from_authorization(request.headers.get("Authorization"))
+        )
+        return jsonify({"success": True, **batch})
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify(
+            {
+                "success": False,
+                "error": str(e),
+                "message": "Batch analysis failed. Please try again.",
+            }
+        )
+
+
 @app.route("/api/injury-stats", methods=["GET"])
 def get_injury_stats():
     """Get available injury types and statistics"""
-    try:
+    def build():
         stats = camera_analyzer.get_injury_statistics()
-        return jsonify({"success": True, "stats": stats, "total_types": len(stats)})
+        return {"success": True, "stats": stats, "total_types": len(stats)}
+
+    try:
+        # The injury database is fixed for the life of the process
+        return response_cache.respond(("injury-stats",), 0, build)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
+@app.route("/api/image-cache/stats", methods=["GET"])
+def get_image_cache_stats():
+    """Hit counters for the injury image analysis caches"""
+    return jsonify(
+        {
+            "success": True,
+            "gemini": gemini_service.image_cache.stats(),
+            "camera": camera_analyzer.analysis_cache.stats(),
+        }
+    )
+
+
+@app.route("/api/injury-triage/stats", methods=["GET"])
+def get_injury_triage_stats():
+    """Local vs Gemini split for injury image analysis"""
+    return jsonify({"success": True, "triage": camera_analyzer.triage_statistics()})
+
+
+@app.route("/api/sms/stats", methods=["GET"])
+def get_sms_stats():
+    """Background SMS delivery counters and recent dead letters"""
+    return jsonify(
+        {
+            "success": True,
+            "sms": sms_dispatcher.get_stats(),
+            "dead_letters": list(sms_dispatcher.dead_letters)[-20:],
+        }
+    )
+
+
+@app.route("/api/compression/stats", methods=["GET"])
+def get_compression_stats():
+    """Bandwidth saved and CPU spent by response compression"""
+    return jsonify({"success": True, "compression": compression.stats()})
+
+
 @app.route("/api/find-doctors")
 def find_doctors():
-    """Find doctors by city and specialization"""
+    """Find doctors by city and specialization (prefixes), ?limit= per page from ?cursor="""
     city = request.args.get("city", "").lower()
     specialization = request.args.get("specialization", "").lower()
+    limit = min(max(request.args.get("limit", 5, type=int), 1), 50)
+
+    if (city or specialization) and not doctor_directory.find(city, specialization, 1)[0]:
+        # Nothing matches at all: retry with misspellings corrected ("pediatrition")
+        city = search_index.correct("doctors", city)
+        specialization = search_index.correct("doctors", specialization)
+
+    position = parse_coordinates(request.args.get("lat"), request.args.get("lon"))
+    if position is not None:
+        # Closest doctors passing the same city/specialization filters, optionally within radius_km
+        cities, specializations = doctor_directory.matching(city, specialization)
+        tags = [
+            tag for tag in geo_index.grids
+            if tag.startswith("doctor:")
+            and (specializations is None or normalize(tag[len("doctor:"):]) in specializations)
+        ]
+        where = None if cities is None else (lambda doctor: normalize(doctor.get("city", "")) in cities)
+        radius_km = request.args.get("radius_km", type=float)
+        if radius_km is not None:
+            doctors = geo_index.within(*position, radius_km, tags, limit=limit, where=where)
+        else:
+            doctors = geo_index.nearest(*position, tags=tags, k=limit, where=where)
+        return jsonify({"doctors": doctors})
 
-    matches = []
-    for doctor in DOCTORS_DB["doctors"]:
-        if (
-            city in doctor["city"].lower()
-            and specialization in doctor["specialization"].lower()
-        ):
-            matches.append(doctor)
+    try:
+        doctors, next_cursor = doctor_directory.find(city, specialization, limit, request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
-    return jsonify({"doctors": matches[:5]})  # Return top 5
+    return jsonify({"doctors": doctors, "nextCursor": next_cursor})
 
 
 def is_non_medical(message):
@@ -298,14 +502,11 @@ def generate_medical_response(message, symptoms, severity, user_id):
     """Generate appropriate medical response based on severity"""
 
     # Load family doctor if available
-    family_doctor = None
-    if os.path.exists(FAMILY_DOCTOR_FILE):
-        with open(FAMILY_DOCTOR_FILE, "r") as f:
-            doctors = json.load(f)
-            for doc in doctors:
-                if doc["user_id"] == user_id:
-                    family_doctor = doc
-                    break
+    family_doctor = family_doctor_store.get(user_id)
+
+    # Routed once; the table below is built for every severity
+    specialties = get_doctors_by_symptoms(symptoms)
+    specialists = get_specialists(symptoms)
 
     responses = {
         1: {  # Mild
@@ -331,7 +532,7 @@ def generate_medical_response(message, symptoms, severity, user_id):
             + f"• Isolate if infectious symptoms are present\n"
             + f"• Monitor for worsening symptoms\n\n"
             + f"📋 I can help you find specialists in your area.",
-            "doctors": get_doctors_by_symptoms(symptoms),
+            "doctors": specialties,
             "redirect_to": "find-doctors",
         },
         3: {  # Serious
@@ -344,7 +545,7 @@ def generate_medical_response(message, symptoms, severity, user_id):
             + f"• Seek emergency care if symptoms worsen\n"
             + f"• Keep a symptom diary for your doctor\n\n"
             + f"🏥 I strongly recommend contacting a healthcare provider immediately.",
-            "doctors": get_specialists(symptoms),
+            "doctors": specialists,
             "actions": [
                 "Consult specialist within 24h",
                 "Monitor closely",
@@ -357,36 +558,31 @@ def generate_medical_response(message, symptoms, severity, user_id):
 
 
 def get_doctors_by_symptoms(symptoms):
-    """Find relevant doctors based on symptoms"""
-    # Simplified matching - in real implementation, use symptom-specialty mapping
-    if any(s in ["cough", "fever", "cold"] for s in symptoms):
-        return ["General Physician", "Pulmonologist"]
-    elif any(s in ["pain", "ache", "injury"] for s in symptoms):
-        return ["Orthopedic", "General Physician"]
-    elif any(s in ["skin", "rash", "itch"] for s in symptoms):
-        return ["Dermatologist"]
-    return ["General Physician"]
+    """Specialties to consult for the symptoms, best match first"""
+    return symptom_router.route(symptoms)
 
 
 def get_specialists(symptoms):
-    """Get specialists for serious conditions"""
-    specializations = []
-    if any(s in ["cancer", "tumor", "lump"] for s in symptoms):
-        specializations.append("Oncologist")
-    if any(s in ["heart", "chest", "pressure"] for s in symptoms):
-        specializations.append("Cardiologist")
-    if any(s in ["brain", "neuro", "seizure"] for s in symptoms):
-        specializations.append("Neurologist")
-    return specializations if specializations else ["Specialist Physician"]
-
-
-def get_nearby_hospitals(city):
-    """Get hospitals in the city"""
-    hospitals = []
-    for hospital in DOCTORS_DB["hospitals"]:
-        if city.lower() in hospital["city"].lower():
-            hospitals.append(hospital)
-    return hospitals[:3]
+    """Specialists (rather than a generalist) for serious conditions"""
+    return symptom_router.route(symptoms, serious=True)
+
+
+def get_nearby_hospitals(city, lat=None, lon=None):
+    """Closest hospitals to the user's position (or city), at least one with an emergency department"""
+    position = parse_coordinates(lat, lon) or geo_index.city_center(city or "")
+    if position is None:
+        hospitals = []
+        for hospital in DOCTORS_DB["hospitals"]:
+            if city.lower() in hospital["city"].lower():
+                hospitals.append(hospital)
+        return hospitals[:3]
+
+    hospitals = geo_index.nearest(*position, tags=["hospital"], k=3)
+    if not any(h.get("emergency") for h in hospitals):
+        # Always include the closest emergency department, however far
+        emergency_rooms = geo_index.nearest(*position, tags=["hospital:emergency"], k=1)
+        hospitals = hospitals[:2] + emergency_rooms
+    return hospitals
 
 
 def generate_llm_style_response(base_response, thinking_process=""):
@@ -398,17 +594,14 @@ def generate_medical_response_llm(message, symptoms, severity, user_id):
     """Generate LLM-style medical response with reasoning and thinking"""
 
     # Load family doctor if available
-    family_doctor = None
-    if os.path.exists(FAMILY_DOCTOR_FILE):
-        with open(FAMILY_DOCTOR_FILE, "r") as f:
-            doctors = json.load(f)
-            for doc in doctors:
-                if doc["user_id"] == user_id:
-                    family_doctor = doc
-                    break
+    family_doctor = family_doctor_store.get(user_id)
 
     symptom_list = ", ".join(symptoms[:5]) if symptoms else "the symptoms you described"
 
+    # Routed once; the table below is built for every severity
+    specialties = get_doctors_by_symptoms(symptoms)
+    specialists = get_specialists(symptoms)
+
     responses = {
         1: {  # Mild
             "type": "mild",
@@ -459,7 +652,7 @@ def generate_medical_response_llm(message, symptoms, severity, user_id):
             f"   • Keep monitoring for any worsening\n"
             f"   • Maintain a symptom diary with times and severity\n\n"
             f"**3. Specialist Consideration**\n"
-            f"   Based on your symptoms, you might benefit from seeing a {', '.join(get_doctors_by_symptoms(symptoms)[:2])}.\n\n"
+            f"   Based on your symptoms, you might benefit from seeing a {', '.join(specialties[:2])}.\n\n"
             f"**Red Flags to Watch:**\n"
             f"If you experience any of these, seek immediate care:\n"
             f"• Difficulty breathing\n"
@@ -467,7 +660,7 @@ def generate_medical_response_llm(message, symptoms, severity, user_id):
             f"• High fever (above 103°F/39.4°C)\n"
             f"• Symptoms that rapidly worsen\n\n"
             f"Would you like me to help you find a specialist in your area?",
-            "doctors": get_doctors_by_symptoms(symptoms),
+            "doctors": specialties,
             "redirect_to": "find-doctors",
             "thinking_process": f"Deep analysis → Symptoms: {symptom_list} → Pattern matching with medical knowledge base → Severity: Moderate → Identifying appropriate specialists → Formulating care plan",
             "reasoning": f"The moderate classification is based on the persistence and combination of symptoms. Your symptoms ({symptom_list}) indicate a condition that, while not immediately dangerous, requires professional evaluation to prevent potential complications and ensure proper treatment.",
@@ -497,7 +690,7 @@ def generate_medical_response_llm(message, symptoms, severity, user_id):
             f"   • Your medical history\n\n"
             f"**3. Specialist Recommendation**\n"
             f"   Given your symptoms, you may need to see a specialist such as:\n"
-            f"   • {', '.join(get_specialists(symptoms))}\n\n"
+            f"   • {', '.join(specialists)}\n\n"
             f"**4. Monitoring**\n"
             f"   Until you see a doctor:\n"
             f"   • Keep detailed notes of symptom changes\n"
@@ -511,7 +704,7 @@ def generate_medical_response_llm(message, symptoms, severity, user_id):
             f"• Severe bleeding or injuries\n"
             f"• Sudden confusion or inability to speak\n\n"
             f"Please take this seriously and seek medical help soon. Your health is important.",
-            "doctors": get_specialists(symptoms),
+            "doctors": specialists,
             "actions": [
                 "Consult specialist within 24h",
                 "Monitor closely",
@@ -540,20 +733,16 @@ def send_otp_simple():
     data = request.json
     phone = data.get("phone")
 
-    # Generate OTP (6 digits)
-    import random
-
-    otp = str(random.randint(100000, 999999))
-
-    # In production, send via SMS provider (Twilio, MSG91)
-    # For now, just return success and log OTP
-    print(f"📱 OTP for {phone}: {otp}")
+    # Stores the OTP and queues the SMS; delivery happens in the background
+    result = otp_service.generate_otp(phone)
+    if not result["success"]:
+        return jsonify(result), 429 if "retry_after" in result else 500
 
     return jsonify(
         {
             "success": True,
             "message": f"OTP sent to {phone}",
-            "otp": otp,  # Remove in production!
+            "otp": result["otp"],  # Remove in production!
         }
     )
 
@@ -561,40 +750,61 @@ def send_otp_simple():
 @app.route("/api/auth/verify-otp", methods=["POST"])
 def verify_otp_simple():
     """Verify OTP and login"""
-    data = request.json
-    phone = data.get("phone")
-    otp = data.get("otp")
-
-    # In production, verify against stored OTP
-    # For now, accept any 6-digit OTP
-    if len(otp) == 6:
-        import uuid
-
-        user_id = str(uuid.uuid4())
-
-        return jsonify(
-            {
-                "success": True,
-                "token": f"jwt_token_{user_id}",
-                "user": {
-                    "id": user_id,
-                    "phone": phone,
-                    "name": "User",
-                    "email": f"{phone}@medicsense.ai",
-                },
-            }
-        )
+    data = request.get_json(silent=True) or {}
+    phone = str(data.get("phone") or "").strip()
+    otp = str(data.get("otp") or "").strip()
+    if not phone or not otp:
+        return jsonify({"success": False, "message": "Phone and OTP are required"}), 400
+
+    result = otp_service.verify_otp(phone, otp)
+    if not result["success"]:
+        return jsonify({"success": False, "message": result["message"]}), 401
+
+    # A real session: its token is what the rate limiter and logout look up
+    user_id = auth_manager.generate_user_id(phone)
+    user = {
+        "id": user_id,
+        "phone": phone,
+        "name": "User",
+        "email": f"{phone}@medicsense.ai",
+    }
+    session = auth_manager.create_session(user_id, user)
 
-    return jsonify({"success": False, "message": "Invalid OTP"}), 401
+    return jsonify({"success": True, "token": session["token"], "user": user})
 
 
 @app.route("/api/auth/logout", methods=["POST"])
 def logout():
     """Logout user"""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        auth_manager.destroy_session(token.strip())
     return jsonify({"success": True, "message": "Logged out successfully"})
 
 
 # Chat Endpoints
+CHAT_MESSAGE_ERROR = {
+    "success": False,
+    "response": "I encountered an error. Please try again.",
+    "severity": 0,
+    "context": "error",
+}
+
+
+def chat_message_reply(symptoms, severity, ai_response):
+    """/api/chat/message payload"""
+    specialties = symptom_router.route(symptoms, serious=severity >= 3)
+    return {
+        "success": True,
+        "response": ai_response,
+        "severity": severity,
+        "context": "medical",
+        "symptoms": symptoms,
+        "suggested_doctors": specialties,
+        "matched_doctors": symptom_router.doctors_for(specialties),
+    }
+
+
 @app.route("/api/chat/message", methods=["POST"])
 def chat_message():
     """Send message to AI chat"""
@@ -610,28 +820,9 @@ def chat_message():
 
         # Generate AI-powered response using Gemini for disease recognition
         ai_response = gemini_service.chat_medical(message, symptoms, severity)
-
-        return jsonify(
-            {
-                "success": True,
-                "response": ai_response,
-                "severity": severity,
-                "context": "medical",
-                "symptoms": symptoms,
-            }
-        )
+        return jsonify(chat_message_reply(symptoms, severity, ai_response))
     except Exception as e:
-        return (
-            jsonify(
-                {
-                    "success": False,
-                    "response": "I encountered an error. Please try again.",
-                    "severity": 0,
-                    "context": "error",
-                }
-            ),
-            500,
-        )
+        return jsonify(CHAT_MESSAGE_ERROR), 500
 
 
 @app.route("/api/chat/history/<user_id>", methods=["GET"])
@@ -650,9 +841,15 @@ def analyze_image():
 
     file = request.files["image"]
 
-    # Use existing camera analyzer
+    # Use existing camera analyzer (streams the upload with a size cap)
     result = camera_analyzer.analyze_image(file)
 
+    if not result.get("success"):
+        return (
+            jsonify({"success": False, "message": result.get("error", "Analysis failed")}),
+            result.get("status", 400),
+        )
+
     return jsonify(
         {
             "success": True,
@@ -660,6 +857,7 @@ def analyze_image():
             "severity": result.get("severity", "medium"),
             "recommendations": result.get("recommendations", []),
             "requiresImmediate": result.get("emergency", False),
+            "details": result.get("details", {}),
         }
     )
 
@@ -720,7 +918,6 @@ def record_symptoms():
 
 
 # Appointments Endpoints
-APPOINTMENTS_FILE = "appointments.json"
 
 
 @app.route("/api/appointments/book", methods=["POST"])
@@ -735,52 +932,71 @@ def book_appointment():
 
         appointment_id = f"APT{uuid.uuid4().hex[:8].upper()}"
 
-        # Create appointment object
-        appointment = {
-            "id": appointment_id,
-            "userId": user_id,
-            "name": data.get("name", ""),
-            "phone": data.get("phone", ""),
-            "email": data.get("email", ""),
-            "doctorId": data.get("doctorId", ""),
-            "date": data.get("date", ""),
-            "time": data.get("time", ""),
-            "reason": data.get("reason", ""),
-            "type": data.get("type", "in-person"),
-            "status": "confirmed",
-            "created_at": datetime.datetime.now().isoformat(),
-        }
+        doctor_id = data.get("doctorId", "")
+        slot = parse_appointment_slot(data.get("date", ""), data.get("time", ""))
+        if slot is None:
+            return (
+                jsonify({"success": False, "message": "Please choose a valid date and time slot"}),
+                400,
+            )
+        date, slot_time = slot
 
-        # Load existing appointments
-        appointments = []
-        if os.path.exists(APPOINTMENTS_FILE):
-            try:
-                with open(APPOINTMENTS_FILE, "r") as f:
-                    appointments = json.load(f)
-            except:
-                appointments = []
-
-        # Add new appointment
-        appointments.append(appointment)
-
-        # Save to file
-        with open(APPOINTMENTS_FILE, "w") as f:
-            json.dump(appointments, f, indent=2)
-
-        # Send WhatsApp notification if appointment is for Dr. Aakash
-        if appointment.get("doctorId") == "dr_aakash":
-            try:
-                send_whatsapp_notification(appointment)
-            except Exception as e:
-                print(f"⚠️  WhatsApp notification failed: {e}")
-                # Don't fail the appointment booking if WhatsApp fails
+        # Take the slot first - exactly one concurrent booking can win it
+        try:
+            schedule_engine.reserve(doctor_id, date, slot_time, appointment_id)
+        except InvalidBookingError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        except SlotUnavailableError as e:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "message": f"Slot not available: {e}",
+                        "availableSlots": schedule_engine.free_slots(doctor_id, date).get(
+                            date.isoformat(), []
+                        ),
+                    }
+                ),
+                409,
+            )
+
+        # Create appointment record
+        appointment = Appointment(
+            id=appointment_id,
+            user_id=user_id,
+            name=data.get("name", ""),
+            phone=data.get("phone", ""),
+            email=data.get("email", ""),
+            doctor_id=doctor_id,
+            date=date.isoformat(),
+            time=slot_time,
+            reason=data.get("reason", ""),
+            type=data.get("type", "in-person"),
+        )
+
+        # WhatsApp notification for the doctor (Dr. Aakash) is saved in the
+        # same atomic rewrite of appointments.json - both or neither
+        notification = doctor_notification(appointment)
+        try:
+            appointment_store.add(appointment, [notification] if notification else ())
+        except Exception:
+            schedule_engine.release(doctor_id, date, slot_time, appointment_id)
+            raise
+        appointment_data = appointment.to_dict()
+
+        # Hand it to the outbox workers; booking never waits on Twilio. If
+        # this fails the notification is still saved and is relayed later.
+        try:
+            whatsapp_outbox.relay()
+        except Exception as e:
+            print(f"⚠️  WhatsApp notification for {appointment_id} will be relayed later: {e}")
 
         return jsonify(
             {
                 "success": True,
                 "message": "Appointment booked successfully",
                 "appointmentId": appointment_id,
-                "appointment": appointment,
+                "appointment": appointment_data,
             }
         )
     except Exception as e:
@@ -799,17 +1015,7 @@ def book_appointment():
 def get_appointments(user_id):
     """Get user appointments from database"""
     try:
-        appointments = []
-        if os.path.exists(APPOINTMENTS_FILE):
-            try:
-                with open(APPOINTMENTS_FILE, "r") as f:
-                    all_appointments = json.load(f)
-                    # Filter by user_id
-                    appointments = [
-                        apt for apt in all_appointments if apt.get("userId") == user_id
-                    ]
-            except:
-                appointments = []
+        appointments = [apt.to_dict() for apt in appointment_store.for_user(user_id)]
 
         return jsonify(
             {
@@ -833,54 +1039,134 @@ def get_appointments(user_id):
 @app.route("/api/appointments/<appointment_id>/cancel", methods=["PUT"])
 def cancel_appointment(appointment_id):
     """Cancel an appointment"""
+    appointment = appointment_store.get(appointment_id)
+    if appointment is None:
+        return jsonify({"success": False, "message": "Appointment not found"}), 404
+
+    if appointment.status != "cancelled":
+        appointment_store.update(appointment_id, status="cancelled")
+        slot = parse_appointment_slot(appointment.date, appointment.time)
+        if slot is not None:
+            schedule_engine.release(appointment.doctor_id, *slot, appointment_id)
+
     return jsonify({"success": True, "message": "Appointment cancelled successfully"})
 
 
 @app.route("/api/appointments/<appointment_id>/reschedule", methods=["PUT"])
 def reschedule_appointment(appointment_id):
     """Reschedule an appointment"""
-    data = request.json
+    data = request.get_json(silent=True) or {}
+    appointment = appointment_store.get(appointment_id)
+    if appointment is None or appointment.status == "cancelled":
+        return jsonify({"success": False, "message": "Appointment not found"}), 404
+
+    new_slot = parse_appointment_slot(
+        data.get("date", appointment.date), data.get("time", appointment.time)
+    )
+    if new_slot is None:
+        return (
+            jsonify({"success": False, "message": "Please choose a valid date and time slot"}),
+            400,
+        )
+    date, slot_time = new_slot
+    old_slot = parse_appointment_slot(appointment.date, appointment.time)
+
+    if new_slot != old_slot:
+        try:
+            schedule_engine.reserve(appointment.doctor_id, date, slot_time, appointment_id)
+        except InvalidBookingError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        except SlotUnavailableError as e:
+            return jsonify({"success": False, "message": f"Slot not available: {e}"}), 409
+
+        doctor_id = appointment.doctor_id
+        try:
+            appointment = appointment_store.update(
+                appointment_id, date=date.isoformat(), time=slot_time
+            )
+        except Exception:
+            # Don't leave the new slot held by an appointment that never moved
+            schedule_engine.release(doctor_id, date, slot_time, appointment_id)
+            raise
+        if appointment is None:
+            # Deleted between our read and the update
+            schedule_engine.release(doctor_id, date, slot_time, appointment_id)
+            return jsonify({"success": False, "message": "Appointment not found"}), 404
+        if old_slot is not None:
+            schedule_engine.release(doctor_id, *old_slot, appointment_id)
+
     return jsonify(
         {
             "success": True,
             "message": "Appointment rescheduled successfully",
-            "data": data,
+            "data": appointment.to_dict(),
         }
     )
 
 
+@app.route("/api/appointments/slots", methods=["GET"])
+def get_appointment_slots():
+    """Free time slots for a doctor on one date"""
+    doctor_id = request.args.get("doctor", "")
+    try:
+        date = datetime.date.fromisoformat(request.args.get("date", ""))
+    except ValueError:
+        return jsonify({"success": False, "message": "date must be YYYY-MM-DD", "slots": []}), 400
+
+    slots = schedule_engine.free_slots(doctor_id, date).get(date.isoformat(), [])
+    return jsonify({"success": True, "doctor": doctor_id, "date": date.isoformat(), "slots": slots})
+
+
 # Doctors Endpoints
 @app.route("/api/doctors", methods=["GET"])
 def get_all_doctors():
     """Get all doctors"""
-    return jsonify({"success": True, "data": DOCTORS_DB.get("doctors", [])})
+    return response_cache.respond(
+        ("doctors",),
+        current_kb_version(),
+        lambda: {"success": True, "data": DOCTORS_DB.get("doctors", [])},
+    )
+
+
+@app.route("/api/hospitals/nearby", methods=["GET"])
+def get_nearby_hospitals_endpoint():
+    """Hospitals closest to ?lat=&lon= (or within ?radius_km=); ?emergency=true to filter"""
+    position = parse_coordinates(request.args.get("lat"), request.args.get("lon"))
+    if position is None:
+        return jsonify({"success": False, "message": "Valid lat and lon are required"}), 400
+
+    emergency_only = request.args.get("emergency", "").lower() in ("1", "true", "yes")
+    tags = ["hospital:emergency" if emergency_only else "hospital"]
+    limit = min(request.args.get("limit", 3, type=int), 50)
+    radius_km = request.args.get("radius_km", type=float)
+    if radius_km is not None:
+        hospitals = geo_index.within(*position, radius_km, tags, limit=limit)
+    else:
+        hospitals = geo_index.nearest(*position, tags=tags, k=limit)
+    return jsonify({"success": True, "data": hospitals})
 
 
 @app.route("/api/doctors/<doctor_id>/availability", methods=["GET"])
 def get_doctor_availability(doctor_id):
-    """Get doctor availability"""
-    date = request.args.get("date")
-    return jsonify(
-        {
+    """Get doctor availability (free slots from ?date= for ?days= days)"""
+    try:
+        date = request.args.get("date")
+        start = datetime.date.fromisoformat(date) if date else datetime.date.today()
+        days = min(max(int(request.args.get("days", 7)), 1), 90)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date or days"}), 400
+
+    return response_cache.respond(
+        ("availability", doctor_id, start.toordinal(), days),
+        schedule_engine.version(doctor_id),
+        lambda: {
             "success": True,
             "data": {
-                "availableDays": [
-                    "Monday",
-                    "Tuesday",
-                    "Wednesday",
-                    "Thursday",
-                    "Friday",
-                ],
-                "availableSlots": [
-                    "09:00 AM",
-                    "10:00 AM",
-                    "11:00 AM",
-                    "02:00 PM",
-                    "03:00 PM",
-                    "04:00 PM",
-                ],
+                "availableDays": schedule_engine.working_days(doctor_id),
+                "availableSlots": schedule_engine.working_slots(doctor_id),
+                "freeSlots": schedule_engine.free_slots(doctor_id, start, days),
             },
-        }
+        },
     )
 
 
@@ -1011,36 +1297,13 @@ def search():
     """Search for doctors, symptoms, medicines"""
     query = request.args.get("q", "").lower()
     search_type = request.args.get("type", "all")
+    limit = min(request.args.get("limit", 5, type=int), 20)
 
-    results = {"doctors": [], "symptoms": [], "medicines": [], "articles": []}
+    current_kb_version()
 
-    # Search doctors
-    if search_type in ["all", "doctors"]:
-        doctors = DOCTORS_DB.get("doctors", [])
-        results["doctors"] = [
-            doc
-            for doc in doctors
-            if query in doc.get("name", "").lower()
-            or query in doc.get("specialty", "").lower()
-        ][:5]
-
-    # Search symptoms
-    if search_type in ["all", "symptoms"]:
-        symptoms = MEDICAL_KB.get("symptoms", {})
-        results["symptoms"] = [
-            {"name": symptom, "info": info}
-            for symptom, info in symptoms.items()
-            if query in symptom.lower()
-        ][:5]
-
-    # Search medicines
-    if search_type in ["all", "medicines"]:
-        medicines = MEDICAL_KB.get("medicines", {})
-        results["medicines"] = [
-            {"name": med, "info": info}
-            for med, info in medicines.items()
-            if query in med.lower()
-        ][:5]
+    kinds = search_index.KINDS if search_type == "all" else (search_type,)
+    results = {"doctors": [], "symptoms": [], "medicines": [], "articles": []}
+    results.update(search_index.search(query, kinds, limit))
 
     return jsonify({"success": True, "query": query, "results": results})
 
@@ -1143,72 +1406,6 @@ def resend_otp():
 # ================================
 
 
-def send_whatsapp_notification(appointment):
-    """Send WhatsApp notification to doctor"""
-    try:
-        from dotenv import load_dotenv
-
-        load_dotenv()
-
-        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        whatsapp_number = os.getenv("TWILIO_WHATSAPP_NUMBER")
-
-        # Check if Twilio is configured
-        if not account_sid or not auth_token or not whatsapp_number:
-            print("⚠️  Twilio not configured. Add credentials to .env file")
-            return {"success": False, "message": "Twilio not configured"}
-
-        try:
-            from twilio.rest import Client
-        except ImportError:
-            print("⚠️  Twilio SDK not installed. Run: pip install twilio")
-            return {"success": False, "message": "Twilio SDK not installed"}
-
-        # Doctor WhatsApp number
-        doctor_whatsapp = "+919770064169"  # Dr. Aakash Singh Rajput
-
-        # Format message
-        try:
-            date_str = datetime.datetime.fromisoformat(appointment["date"]).strftime(
-                "%B %d, %Y"
-            )
-        except:
-            date_str = appointment["date"]
-
-        message = f"""🏥 *New Appointment Booking*
-
-👤 *Patient Details:*
-Name: {appointment['name']}
-Phone: {appointment['phone']}
-Email: {appointment.get('email', 'Not provided')}
-
-📅 *Appointment Details:*
-Date: {date_str}
-Time: {appointment['time']}
-Type: {appointment.get('type', 'In-Person')}
-
-📝 *Reason:*
-{appointment.get('reason', 'Not specified')}
-
-🆔 Appointment ID: {appointment['id']}
-
-Please confirm this appointment."""
-
-        # Send WhatsApp message
-        client = Client(account_sid, auth_token)
-        message_obj = client.messages.create(
-            body=message, from_=whatsapp_number, to=f"whatsapp:{doctor_whatsapp}"
-        )
-
-        print(f"✅ WhatsApp notification sent to Dr. Aakash: {message_obj.sid}")
-        return {"success": True, "message_sid": message_obj.sid}
-
-    except Exception as e:
-        print(f"❌ WhatsApp notification error: {e}")
-        return {"success": False, "error": str(e)}
-
-
 @app.route("/api/whatsapp/send", methods=["POST"])
 def send_whatsapp():
     """Send WhatsApp message via Twilio"""
@@ -1229,15 +1426,7 @@ def send_whatsapp():
                 400,
             )
 
-        from dotenv import load_dotenv
-
-        load_dotenv()
-
-        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        whatsapp_number = os.getenv("TWILIO_WHATSAPP_NUMBER")
-
-        if not account_sid or not auth_token or not whatsapp_number:
+        if not whatsapp_broadcaster.configured:
             return (
                 jsonify(
                     {
@@ -1249,34 +1438,20 @@ def send_whatsapp():
                 500,
             )
 
-        try:
-            from twilio.rest import Client
-        except ImportError:
-            return (
-                jsonify(
-                    {
-                        "success": False,
-                        "message": "Twilio SDK not installed. Run: pip install twilio",
-                    }
-                ),
-                500,
-            )
-
         # Format phone number (ensure it starts with whatsapp:)
         if not to_number.startswith("whatsapp:"):
             to_number = f"whatsapp:{to_number}"
 
-        # Send message
-        client = Client(account_sid, auth_token)
-        message = client.messages.create(
-            body=message_text, from_=whatsapp_number, to=to_number
+        # Send message over the shared kept-alive client
+        message = whatsapp_broadcaster.client.send_message(
+            to_number, whatsapp_broadcaster.from_number, message_text
         )
 
         return jsonify(
             {
                 "success": True,
                 "message": "WhatsApp notification sent successfully",
-                "message_sid": message.sid,
+                "message_sid": message.get("sid"),
                 "to": to_number,
             }
         )
@@ -1293,6 +1468,54 @@ def send_whatsapp():
         )
 
 
+@app.route("/api/whatsapp/broadcast", methods=["POST"])
+def broadcast_whatsapp():
+    """Send a templated WhatsApp message to many recipients (background job)"""
+    data = request.get_json(silent=True) or {}
+
+    if not whatsapp_broadcaster.configured:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "message": "Twilio not configured. Please add credentials to .env file",
+                    "setup_required": True,
+                }
+            ),
+            500,
+        )
+
+    try:
+        job = whatsapp_broadcaster.start(
+            data.get("template") or data.get("message", ""),
+            data.get("recipients") or [],
+            {"doctor_name": data.get("doctor_name", "Doctor")},
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return (
+        jsonify(
+            {
+                "success": True,
+                "job_id": job.id,
+                "total": len(job.recipients),
+                "status_url": f"/api/whatsapp/broadcast/{job.id}",
+            }
+        ),
+        202,
+    )
+
+
+@app.route("/api/whatsapp/broadcast/<job_id>", methods=["GET"])
+def broadcast_whatsapp_status(job_id):
+    """Progress of a WhatsApp broadcast job"""
+    job = whatsapp_broadcaster.get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Broadcast job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+
 if __name__ == "__main__":
     print("🚀 MedicSense AI Backend Starting...")
     print("📡 Server running at http://localhost:5000")
@@ -0,0 +1,130 @@
+"""
+Appointment Store for MedicSense AI
+Keeps appointments.json in memory as compact Appointment records
+
+Records are indexed by id and by user, so listing a user's appointments
+no longer parses the whole file. Writes are atomic (temp file + rename)
+under an exclusive file lock, and the in-memory copy is reloaded when
+another worker has changed the file.
+
+A booking's notifications are saved in its row ("outbox") by the same
+write as the appointment, so one can't be kept without the other. The
+notification outbox then copies them into its own table and clears them
+here (unsent_notifications / clear_notifications).
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from json_file_store import file_signature, locked, read_rows, write_rows
+from records import Appointment
+
+
+class AppointmentStore:
+    """In-memory appointment records backed by a JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records: Dict[str, Appointment] = {}
+        self._by_user: Dict[str, List[str]] = {}
+        self._outbox: Dict[str, List[Dict]] = {}  # appointment id -> notifications not yet handed over
+        self._signature = None  # (mtime_ns, size) of the file we last loaded
+        self._lock = threading.RLock()
+
+    def _refresh(self):
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return
+
+        rows = read_rows(self.path)
+        records: Dict[str, Appointment] = {}
+        by_user: Dict[str, List[str]] = {}
+        outbox: Dict[str, List[Dict]] = {}
+        for row in rows:
+            appointment = Appointment.from_dict(row)
+            records[appointment.id] = appointment
+            by_user.setdefault(appointment.user_id, []).append(appointment.id)
+            if row.get("outbox"):
+                outbox[appointment.id] = row["outbox"]
+
+        self._records, self._by_user, self._outbox, self._signature = records, by_user, outbox, signature
+
+    def _write(self):
+        rows = []
+        for apt in self._records.values():
+            row = apt.to_dict()
+            if apt.id in self._outbox:
+                row["outbox"] = self._outbox[apt.id]
+            rows.append(row)
+        self._signature = write_rows(self.path, rows)
+
+    def add(self, appointment: Appointment, notifications: Iterable[Dict] = ()) -> Appointment:
+        """Persist a new appointment, and in the same write the notifications it triggers"""
+        notifications = list(notifications)
+        with self._lock, locked(self.path):
+            self._refresh()
+            self._records[appointment.id] = appointment
+            self._by_user.setdefault(appointment.user_id, []).append(appointment.id)
+            if notifications:
+                self._outbox[appointment.id] = notifications
+            try:
+                self._write()
+            except BaseException:
+                # Not on disk, so not booked; the next reload would drop it anyway
+                self._signature = None
+                raise
+        return appointment
+
+    def unsent_notifications(self) -> List[Dict]:
+        """Notifications saved with their appointments and not yet cleared"""
+        with self._lock:
+            self._refresh()
+            return [notification for pending in self._outbox.values() for notification in pending]
+
+    def clear_notifications(self, notification_ids: Iterable[str]) -> int:
+        """Drop notifications another store has taken over; how many were dropped"""
+        ids = set(notification_ids)
+        with self._lock, locked(self.path):
+            self._refresh()
+            dropped = 0
+            for appointment_id, pending in list(self._outbox.items()):
+                kept = [notification for notification in pending if notification["id"] not in ids]
+                dropped += len(pending) - len(kept)
+                if kept:
+                    self._outbox[appointment_id] = kept
+                else:
+                    del self._outbox[appointment_id]
+            if dropped:
+                self._write()
+        return dropped
+
+    def update(self, appointment_id: str, **fields) -> Optional[Appointment]:
+        """Change fields of an existing appointment (None if unknown)"""
+        with self._lock, locked(self.path):
+            self._refresh()
+            appointment = self._records.get(appointment_id)
+            if appointment is None:
+                return None
+            for name, value in fields.items():
+                setattr(appointment, name, value)
+            self._write()
+        return appointment
+
+    def get(self, appointment_id: str) -> Optional[Appointment]:
+        with self._lock:
+            self._refresh()
+            return self._records.get(appointment_id)
+
+    def for_user(self, user_id: str) -> List[Appointment]:
+        with self._lock:
+            self._refresh()
+            return [self._records[apt_id] for apt_id in self._by_user.get(user_id, ())]
+
+    def all(self) -> List[Appointment]:
+        with self._lock:
+            self._refresh()
+            return list(self._records.values())
+
+
+# Global instance
+appointment_store = AppointmentStore("appointments.json")
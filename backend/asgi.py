@@ -0,0 +1,372 @@
+"""
+ASGI Entry Point for MedicSense AI
+`uvicorn asgi:application` next to the WSGI `app:app`
+
+Under sync workers a chat request holds its worker for the whole Gemini
+round trip, so the worker count is the concurrency limit. Here the
+LLM-bound routes - /api/chat, /api/chat/message and
+/api/analyze-injury-image - are coroutines: Gemini is awaited through its
+async client (at most LLM_CONCURRENCY calls in flight per process) and the
+CPU-bound image work - classifier, decoding, encoding for Gemini - runs
+in a bounded thread pool. Every other route, including the Twilio sends
+whose client is synchronous, is the unchanged Flask app called in that
+same pool.
+
+Coroutine handlers run inside a Flask request context (context variables
+are per task), so they use request/jsonify like any view, and rate
+limiting, CORS and compression apply exactly as under gunicorn. When the
+pool's queue is full requests get a 503 instead of waiting without bound.
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import ClosingIterator
+
+from app import (
+    CHAT_MESSAGE_ERROR,
+    analyzer,
+    app,
+    chat_error_reply,
+    chat_message_reply,
+    chat_precheck,
+    chat_reply,
+    chat_thinking_time,
+    classifier,
+    compression,
+)
+from auth_manager import auth_manager
+from camera_analyzer import camera_analyzer
+from gemini_service import gemini_service
+
+# Threads for blocking work (Flask routes, image classifier, Twilio)
+THREADS = int(os.getenv("ASGI_THREADS", "32"))
+# Blocking calls running or queued before new ones are refused with a 503
+MAX_PENDING = int(os.getenv("ASGI_MAX_PENDING", "256"))
+# Gemini calls in flight at once; later ones wait their turn
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "256"))
+# Request bodies are read into memory; anything larger gets a 413
+MAX_BODY_BYTES = app.config.get("MAX_CONTENT_LENGTH") or 64 * 1024 * 1024
+
+
+class Overloaded(Exception):
+    """The blocking pool's queue is full"""
+
+
+class BoundedExecutor:
+    """Thread pool that refuses work past max_pending instead of queueing it"""
+
+    def __init__(self, threads: int, max_pending: int):
+        self.threads = threads
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    async def run(self, fn: Callable, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+        if self._pool is None:
+            # Created lazily so each server worker builds its own after fork
+            self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="asgi")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class LLMLimiter:
+    """Caps concurrent awaited Gemini calls; callers past the cap wait"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def call(self, fn: Callable, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        async with self._semaphore:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                return await fn(*args)
+            finally:
+                self.in_flight -= 1
+
+
+executor = BoundedExecutor(THREADS, MAX_PENDING)
+llm = LLMLimiter(LLM_CONCURRENCY)
+
+
+async def chat():
+    """/api/chat without holding a thread while Gemini answers"""
+    try:
+        data = request.json
+
+        # Simulate thinking time (like LLM processing)
+        await asyncio.sleep(chat_thinking_time())
+
+        payload, analysis = chat_precheck(data)
+        if payload is None:
+            user_message, symptoms, severity, _ = analysis
+            ai_response = await llm.call(gemini_service.chat_medical_async, user_message, symptoms, severity)
+            payload = chat_reply(analysis, ai_response)
+        return jsonify(payload)
+
+    except Exception:
+        return jsonify(chat_error_reply())
+
+
+async def chat_message():
+    """/api/chat/message without holding a thread while Gemini answers"""
+    data = request.json
+    message = data.get("message", "")
+
+    try:
+        symptoms = analyzer.extract_symptoms(message)
+        severity = classifier.classify(message, symptoms)
+        ai_response = await llm.call(gemini_service.chat_medical_async, message, symptoms, severity)
+        return jsonify(chat_message_reply(symptoms, severity, ai_response))
+    except Exception:
+        return jsonify(CHAT_MESSAGE_ERROR), 500
+
+
+def triage_or_vision_request(image_data, authorization):
+    """Pool half of an image analysis: (analysis, None), or (None, Gemini request)"""
+    analysis = camera_analyzer.triage_injury_image(image_data)
+    if analysis is not None:
+        return analysis, None
+    # The Gemini cache only matches near-duplicate photos of the same user
+    return gemini_service.vision_request(image_data, auth_manager.user_from_authorization(authorization))
+
+
+async def analyze_injury_image():
+    """/api/analyze-injury-image: decoding and classifier in the pool, only Gemini Vision awaited"""
+    try:
+        data = request.json
+        image_data = data.get("image")
+        user_notes = data.get("notes", "")
+
+        if not image_data:
+            return jsonify({"success": False, "error": "No image data provided"})
+
+        analysis, vision = await executor.run(
+            triage_or_vision_request, image_data, request.headers.get("Authorization")
+        )
+        if analysis is None:
+            analysis = await llm.call(gemini_service.analyze_injury_image_async, vision)
+
+        if user_notes and analysis.get("success"):
+            analysis["user_notes"] = user_notes
+
+        return jsonify(analysis)
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        return jsonify(
+            {
+                "success": False,
+                "error": str(e),
+                "message": "Analysis failed. Please try again.",
+            }
+        )
+
+
+# (method, path) -> coroutine view; everything else goes to the Flask app
+COROUTINE_ROUTES: Dict[Tuple[str, str], Callable] = {
+    ("POST", "/api/chat"): chat,
+    ("POST", "/api/chat/message"): chat_message,
+    ("POST", "/api/analyze-injury-image"): analyze_injury_image,
+}
+
+
+def build_environ(scope: Dict, body: bytes) -> Dict:
+    """WSGI environ for an ASGI HTTP scope and its (already read) body"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def run_wsgi(wsgi_app: Callable, environ: Dict) -> Tuple[str, List, List[bytes], Optional[ClosingIterator]]:
+    """
+    Call a WSGI app: (status, headers, body chunks, rest)
+
+    Bodies with a Content-Length are read completely; otherwise rest is the
+    still-open iterator, to be streamed and closed by the caller.
+    """
+    started = {}
+    written: List[bytes] = []
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+        return written.append
+
+    result = wsgi_app(environ, start_response)
+    rest = ClosingIterator(result)
+    if "status" not in started:
+        # Some apps only start the response on the first iteration
+        first = next(rest, b"")
+        if first:
+            written.append(first)
+    headers = started["headers"]
+    if any(name.lower() == "content-length" for name, _ in headers):
+        try:
+            return started["status"], headers, written + list(rest), None
+        finally:
+            rest.close()
+    return started["status"], headers, written, rest
+
+
+async def read_body(receive) -> Optional[bytes]:
+    """The request body; None if the client left, ValueError if too large"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_plain(send, status: int, message: str, extra_headers: List[Tuple[bytes, bytes]] = ()):
+    body = app.json.dumps({"success": False, "message": message}).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+               (b"access-control-allow-origin", b"*"), *extra_headers]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def dispatch_coroutine(view: Callable, environ: Dict):
+    """Run a coroutine view through Flask's request handling; returns the Response"""
+    ctx = app.request_context(environ)
+    ctx.push()
+    try:
+        rv = app.preprocess_request()  # before_request hooks: rate limiting
+        if rv is None:
+            try:
+                rv = await view()
+            except HTTPException as e:
+                rv = app.handle_user_exception(e)
+            except Overloaded:
+                raise
+            except Exception as e:
+                rv = app.handle_exception(e)
+        return app.finalize_request(rv)  # after_request hooks: CORS
+    finally:
+        ctx.pop()
+
+
+async def http(scope, receive, send):
+    try:
+        body = await read_body(receive)
+    except ValueError as e:
+        await send_plain(send, 413, str(e))
+        return
+    if body is None:
+        return
+    environ = build_environ(scope, body)
+
+    view = COROUTINE_ROUTES.get((scope["method"], scope["path"]))
+    try:
+        if view is not None:
+            response = await dispatch_coroutine(view, environ)
+            status, headers, chunks, rest = run_wsgi(
+                lambda env, start: compression.apply(response, env, start), environ
+            )
+        else:
+            status, headers, chunks, rest = await executor.run(run_wsgi, app, environ)
+    except Overloaded:
+        await send_plain(send, 503, "Server is busy. Please try again shortly.", [(b"retry-after", b"1")])
+        return
+
+    await send({
+        "type": "http.response.start",
+        "status": int(status.split(" ", 1)[0]),
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    })
+    if rest is None:
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+        return
+
+    # Streaming body: pull each chunk in the pool, send it as it comes
+    try:
+        for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        while True:
+            chunk = await executor.run(next, rest, None)
+            if chunk is None:
+                break
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        rest.close()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            print(f"⚡ ASGI mode: {THREADS} threads, {LLM_CONCURRENCY} concurrent Gemini calls")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """The ASGI callable"""
+    if scope["type"] == "http":
+        await http(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await lifespan(receive, send)
@@ -3,83 +3,378 @@ Enhanced Authentication Module for MedicSense AI
 Handles user sessions, tokens, and authentication
 """
 
+import base64
 import hashlib
+import hmac
+import os
 import secrets
-from datetime import datetime, timedelta
-from typing import Optional, Dict
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from records import Session
+from shared_store import ReadThroughCache, SharedStore, shared_store
+
+load_dotenv()
+
+
+def _now() -> int:
+    """Whole seconds on the monotonic clock"""
+    return int(time.monotonic())
+
+
+class RevocationSet:
+    """Revoked signed-token ids, each kept only until its token would expire"""
 
-class AuthManager:
-    """Manage user authentication and sessions"""
-    
     def __init__(self):
-        self.sessions = {}  # Store active sessions in memory
+        self._entries: Dict[str, float] = {}  # token id -> expiry (epoch)
+
+    def __contains__(self, token_id: str) -> bool:
+        return token_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, token_id: str, expires_at: float):
+        self._entries[token_id] = expires_at
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        expired = [token_id for token_id, exp in self._entries.items() if exp <= now]
+        for token_id in expired:
+            self._entries.pop(token_id, None)
+        return len(expired)
+
+
+class AuthManager:
+    """
+    Manage user authentication and sessions
+
+    Sessions live in this process by default. With a shared store they are
+    kept there instead (so every worker sees them), read through a short-TTL
+    local cache.
+
+    With token_format="signed" the session itself is the token: user id and
+    expiry signed with HMAC-SHA256, so validation needs no storage at all.
+    Logout adds the token to a revocation set; signed sessions have a fixed
+    expiry and carry no user_data.
+    """
+
+    def __init__(self, store: Optional[SharedStore] = None, cache_ttl: float = 1.0,
+                 token_format: Optional[str] = None, secret: Optional[str] = None):
+        self.sessions: Dict[str, Session] = {}  # Store active sessions in memory
+        self.store = store
+        self.shared = ReadThroughCache(store, ttl=cache_ttl) if store is not None else None
+        self.cache_ttl = cache_ttl
+
+        self.token_format = token_format or os.getenv("SESSION_TOKEN_FORMAT", "opaque")
+        if self.token_format not in ("opaque", "signed"):
+            raise ValueError(f"Unknown session token format: {self.token_format}")
+        secret = secret or os.getenv("SESSION_SECRET")
+        if self.token_format == "signed" and not secret:
+            print("⚠️  SESSION_SECRET not set - signed tokens will only be valid in this process")
+        self.secret = (secret or secrets.token_hex(32)).encode()
+        # Keyed once; each signature copies this instead of re-deriving the pads
+        self._mac = hmac.new(self.secret, digestmod=hashlib.sha256)
+        self.revoked = RevocationSet()
+        # Shared store only: the revocation log is followed from the sequence
+        # number current when this worker first looked; tokens revoked before
+        # that are looked up once each, on first sight
+        self._revocations_seen: Optional[int] = None
+        self._revocations_synced_at = 0.0
+        self._revocation_gap_since: Optional[float] = None
+        self.revocation_gap_timeout = 10.0
+        self._checked: Dict[str, float] = {}  # token id -> expiry (epoch)
         self.session_duration = timedelta(hours=24)  # 24 hour sessions
-    
+        self.session_ttl = int(self.session_duration.total_seconds())
+
+        # Sliding expiry is only pushed forward once this much time has passed
+        self.refresh_granularity = 60
+
+        # Expiry buckets: bucket index -> tokens that expired in that window.
+        # A bucket may hold tokens whose session has since slid forward; the
+        # sweeper re-files those instead of deleting them.
+        self.bucket_seconds = 60
+        self._buckets: Dict[int, List[str]] = {}
+        self._next_bucket = _now() // self.bucket_seconds
+
+        self.sweep_interval = 30
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+
     def generate_token(self) -> str:
         """Generate a secure random token"""
         return secrets.token_urlsafe(32)
-    
+
     def generate_user_id(self, phone: str) -> str:
         """Generate a unique user ID from phone number"""
         # Create hash of phone number
         hash_object = hashlib.sha256(phone.encode())
         return f"user_{hash_object.hexdigest()[:16]}"
-    
+
     def create_session(self, user_id: str, user_data: Dict) -> Dict:
         """Create a new session for user"""
+        if self.token_format == "signed":
+            return self._create_signed(user_id, user_data)
+
         token = self.generate_token()
-        
-        session = {
-            "token": token,
-            "user_id": user_id,
-            "user_data": user_data,
-            "created_at": datetime.now(),
-            "expires_at": datetime.now() + self.session_duration
-        }
-        
-        self.sessions[token] = session
-        return session
-    
-    def validate_session(self, token: str) -> Optional[Dict]:
+        now = _now()
+        session = Session(token, user_id, user_data, now, now + self.session_ttl)
+
+        if self.shared is not None:
+            self.shared.set(self._key(token), self._serialize(session), self.session_ttl)
+            self._ensure_sweeper()
+            return session.to_dict()
+
+        with self._lock:
+            self.sessions[token] = session
+            self._file(token, session.expires_at)
+
+        self._ensure_sweeper()
+        return session.to_dict()
+
+    def validate_session(self, token: str) -> Optional[Session]:
         """Validate a session token"""
+        if self.token_format == "signed":
+            return self._validate_signed(token)
+
+        if self.shared is not None:
+            return self._validate_shared(token)
+
         session = self.sessions.get(token)
-        
+
         if not session:
             return None
-        
+
         # Check if expired
-        if datetime.now() > session["expires_at"]:
-            del self.sessions[token]
+        now = _now()
+        if now >= session.expires_at:
+            self.sessions.pop(token, None)
             return None
-        
-        # Extend session
-        session["expires_at"] = datetime.now() + self.session_duration
+
+        # Extend session (sliding expiry, coarse-grained)
+        if now + self.session_ttl - session.expires_at >= self.refresh_granularity:
+            session.expires_at = now + self.session_ttl
         return session
-    
+
     def get_user_from_token(self, token: str) -> Optional[str]:
         """Get user ID from session token"""
         session = self.validate_session(token)
-        return session["user_id"] if session else None
-    
+        return session.user_id if session else None
+
+    def user_from_authorization(self, header: Optional[str]) -> Optional[str]:
+        """User ID for an "Authorization: Bearer <session token>" header value"""
+        scheme, _, token = (header or "").partition(" ")
+        if scheme.lower() != "bearer" or not token.strip():
+            return None
+        return self.get_user_from_token(token.strip())
+
     def destroy_session(self, token: str) -> bool:
         """Destroy a session (logout)"""
-        if token in self.sessions:
-            del self.sessions[token]
-            return True
-        return False
-    
+        if self.token_format == "signed":
+            return self._revoke_signed(token)
+
+        if self.shared is not None:
+            return self.shared.delete(self._key(token))
+        return self.sessions.pop(token, None) is not None
+
     def cleanup_expired_sessions(self):
         """Remove all expired sessions"""
-        current_time = datetime.now()
-        expired_tokens = [
-            token for token, session in self.sessions.items()
-            if current_time > session["expires_at"]
-        ]
-        
-        for token in expired_tokens:
-            del self.sessions[token]
-        
-        return len(expired_tokens)
+        return self.sweep()
+
+    def sweep(self) -> int:
+        """
+        Reclaim expired sessions from the buckets that have come due
+
+        Only tokens filed in past buckets are examined, so the work is
+        proportional to expirations, not to the number of live sessions.
+        """
+        if self.token_format == "signed":
+            removed = self.revoked.purge_expired()
+            if self.store is not None:
+                now = time.time()
+                for token_id in [t for t, exp in self._checked.items() if exp <= now]:
+                    self._checked.pop(token_id, None)
+                removed += self.store.purge_expired()
+            return removed
+
+        if self.store is not None:
+            return self.store.purge_expired()
+
+        now = _now()
+        current_bucket = now // self.bucket_seconds
+        removed = 0
+
+        with self._lock:
+            while self._next_bucket < current_bucket:
+                tokens = self._buckets.pop(self._next_bucket, None)
+                self._next_bucket += 1
+                if not tokens:
+                    continue
+                for token in tokens:
+                    session = self.sessions.get(token)
+                    if session is None:
+                        continue
+                    if now >= session.expires_at:
+                        del self.sessions[token]
+                        removed += 1
+                    else:
+                        self._file(token, session.expires_at)
+
+        return removed
+
+    def _validate_shared(self, token: str) -> Optional[Session]:
+        data = self.shared.get(self._key(token))
+        if data is None:
+            return None
+
+        session = self._deserialize(token, data)
+        now = _now()
+        if now >= session.expires_at:
+            return None
+
+        if now + self.session_ttl - session.expires_at >= self.refresh_granularity:
+            session.expires_at = now + self.session_ttl
+            self.shared.set(self._key(token), self._serialize(session), self.session_ttl)
+        return session
+
+    def _create_signed(self, user_id: str, user_data: Dict) -> Dict:
+        issued_at = int(time.time())
+        expires_at = issued_at + self.session_ttl
+        payload = f"{expires_at:x}.{issued_at:x}.{secrets.token_hex(4)}.{user_id}"
+        encoded = base64.urlsafe_b64encode(payload.encode()).rstrip(b"=").decode()
+        token = f"{encoded}.{self._signature(encoded)}"
+
+        self._ensure_sweeper()
+        offset = time.time() - _now()
+        session = Session(token, user_id, user_data,
+                          int(issued_at - offset), int(expires_at - offset))
+        return session.to_dict()
+
+    def _validate_signed(self, token: str) -> Optional[Session]:
+        encoded, _, signature = token.rpartition(".")
+        if not encoded or not hmac.compare_digest(signature, self._signature(encoded)):
+            return None
+
+        try:
+            payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+            expires_hex, issued_hex, _, user_id = payload.split(".", 3)
+            expires_at, issued_at = int(expires_hex, 16), int(issued_hex, 16)
+        except ValueError:
+            return None
+
+        wall_now = time.time()
+        if wall_now >= expires_at:
+            return None
+
+        if self.store is not None:
+            if wall_now >= self._revocations_synced_at + self.cache_ttl:
+                self._sync_revocations(wall_now)
+            if signature not in self._checked:
+                # Revoked before this worker started following the log?
+                if self.store.get(f"revoked:token:{signature}") is not None:
+                    self.revoked.add(signature, expires_at)
+                self._checked[signature] = expires_at
+        if signature in self.revoked:
+            return None
+
+        offset = wall_now - _now()
+        return Session(token, user_id, {}, int(issued_at - offset), int(expires_at - offset))
+
+    def _revoke_signed(self, token: str) -> bool:
+        session = self._validate_signed(token)
+        if session is None:
+            return False
+
+        signature = token.rpartition(".")[2]
+        expires_at = session.expires_at + time.time() - _now()
+        self.revoked.add(signature, expires_at)
+
+        if self.store is not None:
+            # Keyed by token id for workers that haven't seen the token yet,
+            # then numbered (log entries outlive any token) for those that have
+            self.store.set(f"revoked:token:{signature}", {"expires_at": expires_at},
+                           max(1.0, expires_at - time.time()))
+            seq = self.store.incr("revoked:seq")
+            self.store.set(f"revoked:{seq}", {"token_id": signature, "expires_at": expires_at},
+                           self.session_ttl)
+        return True
+
+    def _sync_revocations(self, wall_now: float):
+        # One store read per cache_ttl per worker, not one per request
+        self._revocations_synced_at = wall_now
+        latest = int(self.store.get("revoked:seq") or 0)
+        if self._revocations_seen is None:
+            self._revocations_seen = latest
+            return
+
+        seq = self._revocations_seen
+        while seq < latest:
+            entry = self.store.get(f"revoked:{seq + 1}")
+            if entry is None:
+                # Numbered just before it is written; skip it only if it never shows up
+                if self._revocation_gap_since is None:
+                    self._revocation_gap_since = wall_now
+                if wall_now - self._revocation_gap_since < self.revocation_gap_timeout:
+                    break
+            else:
+                self.revoked.add(entry["token_id"], entry["expires_at"])
+            self._revocation_gap_since = None
+            seq += 1
+        self._revocations_seen = max(self._revocations_seen, seq)
+
+    def _signature(self, encoded: str) -> str:
+        mac = self._mac.copy()
+        mac.update(encoded.encode())
+        digest = mac.digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return f"session:{token}"
+
+    @staticmethod
+    def _serialize(session: Session) -> Dict:
+        # Monotonic clocks differ between processes, so shared records use epoch seconds
+        offset = time.time() - _now()
+        return {
+            "user_id": session.user_id,
+            "user_data": session.user_data,
+            "created_at": int(session.created_at + offset),
+            "expires_at": int(session.expires_at + offset),
+        }
+
+    @staticmethod
+    def _deserialize(token: str, data: Dict) -> Session:
+        offset = time.time() - _now()
+        return Session(token, data["user_id"], data["user_data"],
+                       int(data["created_at"] - offset), int(data["expires_at"] - offset))
+
+    def _file(self, token: str, expires_at: int):
+        bucket = max(expires_at // self.bucket_seconds, self._next_bucket)
+        self._buckets.setdefault(bucket, []).append(token)
+
+    def _ensure_sweeper(self):
+        # Started lazily so forked server workers each run their own
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        with self._lock:
+            if self._sweeper is None or not self._sweeper.is_alive():
+                self._sweeper = threading.Thread(
+                    target=self._sweep_loop, name="session-sweeper", daemon=True
+                )
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️  Session sweep failed: {e}")
 
 # Singleton instance
-auth_manager = AuthManager()
+auth_manager = AuthManager(store=shared_store)
@@ -0,0 +1,160 @@
+"""
+Batch Injury Analyzer for MedicSense AI
+Analyzes many injury photos at once (e.g. wound progression series)
+
+The local pass - the offline classifier, then the color/severity analysis
+when the classifier is missing or unsure - runs in a process pool sized to
+the CPU count. Workers are started with forkserver (spawn where that is not
+available): forking the server itself would copy its threads and locks.
+Images the classifier did not answer are escalated to Gemini Vision on a
+small thread pool so only a bounded number of remote calls are in flight;
+without Gemini the color analysis is the answer.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from camera_analyzer import batch_local_pass, camera_analyzer
+from gemini_service import gemini_service
+
+
+def _start_method() -> str:
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class BatchInjuryAnalyzer:
+    """Fan a list of images out across CPU cores and Gemini"""
+
+    def __init__(self, max_workers: Optional[int] = None, remote_concurrency: int = 4,
+                 max_batch_size: int = 50):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.remote_concurrency = remote_concurrency
+        self.max_batch_size = max_batch_size
+        self._process_pool = None
+        self._remote_pool = None
+        self._lock = threading.Lock()
+
+    def _pools(self):
+        # Created lazily so each gunicorn worker builds its own after fork
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(_start_method()),
+                )
+                self._remote_pool = ThreadPoolExecutor(
+                    max_workers=self.remote_concurrency,
+                    thread_name_prefix="gemini-escalation",
+                )
+            return self._process_pool, self._remote_pool
+
+    def analyze(self, images: List[str], cache_scope: Optional[str] = None) -> Dict:
+        """
+        Analyze a batch of base64 images (cache_scope: the signed-in user,
+        for Gemini's image cache)
+
+        Returns:
+            dict with per-image results (in input order) and batch timings
+        """
+        if len(images) > self.max_batch_size:
+            raise ValueError(f"Batch too large (max {self.max_batch_size} images)")
+
+        batch_start = time.perf_counter()
+        process_pool, remote_pool = self._pools()
+
+        results: List[Optional[Dict]] = [None] * len(images)
+        remote_futures = {}
+
+        # Escalate each image the classifier did not answer as soon as its local pass finishes
+        for index, classified, color, local_seconds in self._local_passes(images, process_pool):
+            if camera_analyzer.classifier is not None:
+                camera_analyzer.record_triage(classified is not None)
+
+            result = {
+                "index": index,
+                "analysis": classified,
+                "source": "local",
+                "local_ms": round(local_seconds * 1000, 2),
+                "remote_ms": 0.0,
+            }
+            if classified is None and gemini_service.is_configured:
+                result["source"] = "gemini"
+                result["color_analysis"] = color
+                remote_futures[remote_pool.submit(self._escalate, images[index], cache_scope)] = index
+            elif color is not None:
+                result["source"] = "color"
+                result["analysis"] = color
+            elif classified is None:
+                result["source"] = "error"
+                result["analysis"] = {"success": False, "error": "Could not decode image"}
+            results[index] = result
+
+        for future in as_completed(remote_futures):
+            index = remote_futures[future]
+            analysis, remote_seconds = future.result()
+            results[index]["analysis"] = analysis
+            results[index]["remote_ms"] = round(remote_seconds * 1000, 2)
+
+        for result in results:
+            result["total_ms"] = round(result["local_ms"] + result["remote_ms"], 2)
+
+        elapsed = time.perf_counter() - batch_start
+        return {
+            "results": results,
+            "count": len(images),
+            "local_count": sum(1 for r in results if r["source"] == "local"),
+            "color_count": sum(1 for r in results if r["source"] == "color"),
+            "remote_count": len(remote_futures),
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "images_per_second": round(len(images) / elapsed, 2) if elapsed else None,
+        }
+
+    def _local_passes(self, images: List[str], process_pool):
+        """(index, classifier analysis, color analysis, seconds) per image, as each finishes"""
+        if len(images) == 1 or self.max_workers == 1:
+            # Nothing to run in parallel: skip pickling the image to a worker
+            for index, image in enumerate(images):
+                yield (index, *self._run_local(batch_local_pass, image))
+            return
+
+        futures = {
+            process_pool.submit(batch_local_pass, image): index
+            for index, image in enumerate(images)
+        }
+        for future in as_completed(futures):
+            yield (futures[future], *self._run_local(future.result))
+
+    @staticmethod
+    def _run_local(fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"❌ Local batch analysis error: {e}")
+            return None, None, 0.0
+
+    def _escalate(self, image_data, cache_scope):
+        start = time.perf_counter()
+        try:
+            analysis = gemini_service.analyze_injury_image(image_data, cache_scope)
+        except Exception as e:
+            analysis = {"success": False, "error": str(e)}
+        return analysis, time.perf_counter() - start
+
+    def shutdown(self):
+        """Stop the worker pools"""
+        with self._lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=True)
+                self._remote_pool.shutdown(wait=True)
+                self._process_pool = self._remote_pool = None
+
+
+# Global instance
+batch_analyzer = BatchInjuryAnalyzer(
+    max_workers=int(os.getenv("BATCH_ANALYSIS_WORKERS", "0")) or None,
+    remote_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+)
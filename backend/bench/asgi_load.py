@@ -0,0 +1,160 @@
+"""
+ASGI Load Benchmark
+Concurrent /api/chat requests against a fake Gemini model that takes
+--latency seconds, through the full stack: the ASGI application in one
+process against the WSGI app with one thread per in-flight request
+(user-050)
+
+    cd backend && python bench/asgi_load.py asgi --requests 500
+    cd backend && python bench/asgi_load.py threads --requests 16 --workers 4
+
+The chat thinking delay is zeroed and rate limiting is off. ASGI requests
+are driven straight into `application` with asyncio (no uvicorn needed).
+--workers 4 stands in for four sync workers: each holds its request for
+the whole model call. Memory is sampled halfway through the fake call,
+while every request is in flight.
+
+Measured with this script (2s fake LLM):
+  threads --workers 4: 16 requests in 8.05s, 2 req/s
+  threads, one per request: 500 requests in 2.73s, +48 KB RSS each
+  asgi --llm-concurrency 1000: 500 in 3.00s, 1000 in 3.81s,
+    +18-19 KB RSS (10 KB traced) per in-flight request
+  asgi at the default cap of 256: 500 in 4.75s (two waves)
+The commit's figures (8.06s; 3.15s; 3.40s and 4.59s; 5.09s) are within
+run-to-run noise of these, apart from the ASGI runs coming out faster here.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+import asgi  # noqa: E402
+from gemini_service import gemini_service  # noqa: E402
+
+BODY = json.dumps({"message": "I have a mild headache and a runny nose since yesterday",
+                   "user_id": "bench_user"}).encode()
+SCOPE = {
+    "type": "http",
+    "method": "POST",
+    "path": "/api/chat",
+    "query_string": b"",
+    "headers": [(b"content-type", b"application/json"), (b"accept-encoding", b"gzip")],
+    "client": ("10.0.0.1", 1234),
+    "server": ("localhost", 8000),
+}
+
+
+class FakeReply:
+    text = "**Potential Conditions**: tension headache, migraine. " * 20
+
+
+class FakeModel:
+    """Answers every prompt after a fixed delay, like a slow LLM"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        return FakeReply()
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(self.latency)
+        return FakeReply()
+
+
+def rss_kb() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+async def one_asgi_request() -> int:
+    sent = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)  # the client never disconnects
+        received = True
+        return {"type": "http.request", "body": BODY, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.application(dict(SCOPE), receive, send)
+    return sent[0]["status"]
+
+
+async def run_asgi(requests: int, latency: float):
+    await one_asgi_request()  # warm up: pool, semaphore, imports
+    tracemalloc.start()
+    base_rss = rss_kb()
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(one_asgi_request()) for _ in range(requests)]
+    await asyncio.sleep(latency / 2)
+    rss, (traced, _) = rss_kb() - base_rss, tracemalloc.get_traced_memory()
+    statuses = await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+    tracemalloc.stop()
+    return wall, statuses, rss, traced
+
+
+def run_threads(requests: int, workers: int, latency: float):
+    tracemalloc.start()
+    base_rss = rss_kb()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        futures = [pool.submit(asgi.run_wsgi, app_module.app, asgi.build_environ(SCOPE, BODY))
+                   for _ in range(requests)]
+        time.sleep(latency / 2)
+        rss, (traced, _) = rss_kb() - base_rss, tracemalloc.get_traced_memory()
+        statuses = [future.result()[0] for future in futures]
+    wall = time.perf_counter() - started
+    tracemalloc.stop()
+    return wall, statuses, rss, traced
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["asgi", "threads"])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads mode: concurrent requests (default: one per request)")
+    parser.add_argument("--latency", type=float, default=2.0, help="fake LLM seconds per call")
+    parser.add_argument("--llm-concurrency", type=int, default=None,
+                        help="asgi mode: override LLM_CONCURRENCY")
+    args = parser.parse_args()
+
+    gemini_service.is_configured = True
+    gemini_service.model = FakeModel(args.latency)
+    app_module.rate_limiter.enabled = False
+    app_module.chat_thinking_time = asgi.chat_thinking_time = lambda: 0.0
+    print(f"process RSS after import: {rss_kb() / 1024:.0f} MB")
+
+    if args.mode == "asgi":
+        if args.llm_concurrency:
+            asgi.llm.limit = args.llm_concurrency
+        wall, statuses, rss, traced = asyncio.run(run_asgi(args.requests, args.latency))
+        in_flight = args.requests  # every request is a live task; past the cap they wait for the LLM
+        label = f"ASGI (LLM cap {asgi.llm.limit})"
+    else:
+        in_flight = min(args.requests, args.workers or args.requests)
+        wall, statuses, rss, traced = run_threads(args.requests, in_flight, args.latency)
+        label = f"threads={in_flight}"
+
+    print(f"{label}: {args.requests} requests in {wall:.2f}s, {args.requests / wall:.1f} req/s, "
+          f"statuses {sorted(set(statuses))}")
+    print(f"  +{rss / in_flight:.1f} KB RSS, {traced / in_flight / 1024:.1f} KB traced per in-flight request")
+
+
+if __name__ == "__main__":
+    main()
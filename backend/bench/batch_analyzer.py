@@ -0,0 +1,105 @@
+"""
+Batch Analyzer Benchmark
+Images per second through BatchInjuryAnalyzer's local pass as the process
+pool grows from one worker to the machine's core count (user-028)
+
+    cd backend && python bench/batch_analyzer.py --images 200 --workers 1 2 4 8
+
+The corpus is --images synthetic 400x300 JPEG data URLs: skin with one
+cut, burn, bruise or scrape patch of random size and place. Gemini is
+switched off, so every image ends with the local pass. Each pool is warmed
+up with one batch first (forkserver start, imports), then timed over
+--rounds batches.
+
+workers=1 runs in the calling process (the analyzer skips the pool), so
+it also shows what pickling images to worker processes costs.
+
+Measured with this script (200 images, 3 rounds, two runs; the sandbox
+has a single core, so these show the pool's overhead, not scaling):
+  workers=1   134-155 images/s
+  workers=2   109-111 images/s
+  workers=4   110-138 images/s
+The commit's single-core figures (93 and 75 img/s) show the same drop
+from one worker to two. Run this on a multi-core host for
+the scaling curve.
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from batch_analyzer import BatchInjuryAnalyzer  # noqa: E402
+from gemini_service import gemini_service  # noqa: E402
+
+PATCH_COLORS = [(200, 20, 20), (245, 245, 245), (90, 40, 160), (230, 150, 150)]
+
+
+def corpus(count: int):
+    rng = random.Random(3)
+    images = []
+    for _ in range(count):
+        pixels = np.full((300, 400, 3), (220, 180, 160), dtype=np.uint8)
+        side = rng.randint(30, 200)
+        top, left = rng.randint(0, 300 - side // 2), rng.randint(0, 400 - side)
+        pixels[top:top + side, left:left + side] = rng.choice(PATCH_COLORS)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, "JPEG", quality=85)
+        images.append("data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode())
+    return images
+
+
+@contextlib.contextmanager
+def quiet_stdout():
+    """Send fd 1 to /dev/null; worker processes inherit it and log every image"""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="pool sizes to try (default: 1, 2, 4 ... up to the core count)")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    sizes = args.workers or sorted({1, cores} | {n for n in (2, 4, 8, 16, 32) if n < cores})
+    gemini_service.is_configured = False
+    images = corpus(args.images)
+    print(f"{cores} cores, {args.images} images per batch")
+
+    for workers in sizes:
+        analyzer = BatchInjuryAnalyzer(max_workers=workers, max_batch_size=args.images)
+        with quiet_stdout():
+            analyzer.analyze(images)
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                result = analyzer.analyze(images)
+            wall = time.perf_counter() - started
+        analyzer.shutdown()
+        rate = args.images * args.rounds / wall
+        print(f"workers={workers:<3} {rate:7.1f} images/s  "
+              f"(color {result['color_count']}, local {result['local_count']})")
+
+
+if __name__ == "__main__":
+    main()
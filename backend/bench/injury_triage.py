@@ -0,0 +1,128 @@
+"""
+Injury Triage Benchmark
+Generates a synthetic labeled injury corpus, trains the local classifier
+on it and evaluates a held-out split with `injury_classifier.py evaluate`:
+accuracy, remote-call rate at the threshold and local latency (user-027)
+
+    cd backend && python bench/injury_triage.py --train 500 --holdout 200
+    cd backend && python bench/injury_triage.py --out /tmp/injuries   # keep the corpus
+
+Images are 400x300 JPEGs of skin (random tone and noise) with one injury
+drawn from the colour rules the analyzer uses: thin red lines (cut),
+white/pink blotches (burn), blue-purple or dark ellipses (bruise), grazed
+pink patches (scrape), and scattered red-pink spots (rash). Train and
+holdout come from different seeds. Synthetic images only show that the
+pipeline works end to end; they are no stand-in for the real photo set
+models/README.md asks for.
+
+Measured with this script (500 train / 200 holdout, threshold 0.85):
+  training accuracy 99.8%, holdout accuracy 99.5%
+  local accuracy 100.0%, remote-call rate 7.0% (14/200)
+  local latency p50 10.1 ms, p95 11.5 ms
+These replace the commit's holdout figures (4.5% remote calls, 99.5%
+local accuracy, p50 13.1 ms), whose corpus generator was not committed.
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+import injury_classifier  # noqa: E402
+from injury_classifier import CATEGORIES  # noqa: E402
+
+WIDTH, HEIGHT = 400, 300
+
+
+def jitter(rng: random.Random, color, spread: int = 15):
+    return tuple(max(0, min(255, c + rng.randint(-spread, spread))) for c in color)
+
+
+def random_box(rng: random.Random, low: int, high: int):
+    w, h = rng.randint(low, high), rng.randint(low, high)
+    x, y = rng.randint(0, WIDTH - w), rng.randint(0, HEIGHT - h)
+    return x, y, x + w, y + h
+
+
+def draw_injury(draw: ImageDraw.ImageDraw, rng: random.Random, label: str):
+    if label == "cut":
+        for _ in range(rng.randint(1, 2)):
+            x, y = rng.randint(40, WIDTH - 40), rng.randint(40, HEIGHT - 40)
+            dx, dy = rng.randint(-150, 150), rng.randint(-60, 60)
+            draw.line([(x, y), (x + dx, y + dy)], fill=jitter(rng, (185, 25, 25)),
+                      width=rng.randint(6, 18))
+    elif label == "burn":
+        draw.ellipse(random_box(rng, 90, 220),
+                     fill=jitter(rng, rng.choice([(240, 240, 235), (230, 150, 150)])))
+    elif label == "bruise":
+        draw.ellipse(random_box(rng, 60, 180),
+                     fill=jitter(rng, rng.choice([(90, 50, 150), (70, 60, 70)])))
+    elif label == "scrape":
+        x0, y0, x1, y1 = random_box(rng, 60, 160)
+        for _ in range(rng.randint(80, 200)):
+            x, y = rng.randint(x0, x1), rng.randint(y0, y1)
+            draw.line([(x, y), (x + rng.randint(5, 25), y + rng.randint(-3, 3))],
+                      fill=jitter(rng, (215, 140, 145)), width=2)
+    else:  # rash
+        for _ in range(rng.randint(40, 120)):
+            x, y, r = rng.randint(0, WIDTH), rng.randint(0, HEIGHT), rng.randint(2, 6)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=jitter(rng, (210, 110, 110)))
+
+
+def injury_photo(rng: random.Random, label: str) -> bytes:
+    skin = jitter(rng, (215, 175, 150), 25)
+    img = Image.new("RGB", (WIDTH, HEIGHT), skin)
+    draw_injury(ImageDraw.Draw(img), rng, label)
+    noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, 6, (HEIGHT, WIDTH, 3))
+    pixels = np.clip(np.asarray(img, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=rng.randint(70, 92))
+    return buffer.getvalue()
+
+
+def write_corpus(root: str, per_category: int, seed: int):
+    """root/<category>/<n>.jpg, per_category photos each"""
+    rng = random.Random(seed)
+    for label in CATEGORIES:
+        os.makedirs(os.path.join(root, label), exist_ok=True)
+        for n in range(per_category):
+            with open(os.path.join(root, label, f"{n:04d}.jpg"), "wb") as f:
+                f.write(injury_photo(rng, label))
+
+
+def run(root: str, args):
+    train_dir, holdout_dir = os.path.join(root, "train"), os.path.join(root, "holdout")
+    model_path = os.path.join(root, "injury_classifier.npz")
+    write_corpus(train_dir, args.train // len(CATEGORIES), seed=1)
+    write_corpus(holdout_dir, args.holdout // len(CATEGORIES), seed=2)
+    print(f"Corpus in {root}")
+
+    injury_classifier.main(["train", "--data", train_dir, "--out", model_path])
+    injury_classifier.main(["evaluate", "--data", holdout_dir, "--model", model_path,
+                            "--threshold", str(args.threshold)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train", type=int, default=500, help="training images (split over categories)")
+    parser.add_argument("--holdout", type=int, default=200, help="holdout images")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--out", default=None, help="write the corpus and model here (default: temp dir)")
+    args = parser.parse_args()
+
+    if args.out:
+        run(args.out, args)
+    else:
+        with tempfile.TemporaryDirectory(prefix="injury-corpus-") as root:
+            run(root, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Search Index Benchmark
+Type-ahead queries against SearchIndex and against the substring scan
+/api/search did before it, on a synthetic catalog (user-041)
+
+    cd backend && python bench/search_index.py --doctors 100000 --medicines 50000
+
+Each of 400 catalog names is typed as 1-, 2-, 3- and 5-character prefixes,
+plus a fixed mix of multi-word and no-match queries. The scan is timed on
+every 20th query; it is too slow to run them all.
+
+Measured with this script (two runs): index 1,600-1,900 queries/s, p50
+43us, p99 14-15ms; substring scan 37-38 queries/s (~27ms each); build
+6.5-7.7s. The commit quoted 2,100-3,000 queries/s and a ~5.5s build from
+the ad-hoc run before the typo-correction fallback (user-045) was added.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex  # noqa: E402
+
+FIRST_NAMES = ["Sarah", "Michael", "Priya", "Rahul", "Aakash", "Emily", "James", "Anita",
+               "Vikram", "Li", "Maria", "Omar", "Chen", "Fatima", "David", "Sunita"]
+LAST_NAMES = ["Johnson", "Chen", "Sharma", "Kumar", "Rajput", "Smith", "Patel", "Garcia",
+              "Khan", "Singh", "Brown", "Wong", "Das", "Lee", "Nair", "Gupta"]
+SPECIALIZATIONS = ["General Physician", "Cardiologist", "Dermatologist", "Pediatrician",
+                   "Orthopedic Surgeon", "Neurologist", "Psychiatrist", "Gynecologist",
+                   "ENT Specialist", "Ophthalmologist"]
+CITIES = ["New York", "Mumbai", "Delhi", "Bangalore", "London", "Chennai", "Pune", "Boston",
+          "Kolkata", "Indore"]
+MIXED_QUERIES = ["dr sarah j", "cardio", "new york", "dr s", "mumbai derm", "sarah johnson", "zzzq"]
+
+
+def build_catalog(doctors: int, medicines: int, seed: int):
+    rng = random.Random(seed)
+
+    def word(n):
+        return "".join(rng.choice("abcdefghiklmnoprstuvz") for _ in range(n))
+
+    doctor_rows = [
+        {"id": i, "name": f"Dr. {rng.choice(FIRST_NAMES)} {word(6).title()} {rng.choice(LAST_NAMES)}",
+         "specialization": rng.choice(SPECIALIZATIONS), "city": rng.choice(CITIES)}
+        for i in range(doctors)
+    ]
+    medicine_rows = {}
+    while len(medicine_rows) < medicines:
+        name = word(rng.randint(5, 9)) + rng.choice(["ol", "ine", "mab", "cin", "pril", "statin"])
+        medicine_rows[name] = {"category": rng.choice(["analgesic", "antibiotic", "antihistamine", "statin"]),
+                               "uses": [word(7), word(8)]}
+    symptoms = {f"symptom{i} {word(6)}": {"description": word(8), "keywords": [word(5)]}
+                for i in range(2000)}
+    return {"symptoms": symptoms, "medicines": medicine_rows}, {"doctors": doctor_rows}
+
+
+def substring_scan(query: str, medical_kb, doctors_db, limit: int = 5):
+    """What /api/search did before the index: scan everything on every keystroke"""
+    return {
+        "doctors": [d for d in doctors_db["doctors"]
+                    if query in d["name"].lower() or query in d["specialization"].lower()][:limit],
+        "symptoms": [s for s in medical_kb["symptoms"] if query in s.lower()][:limit],
+        "medicines": [m for m in medical_kb["medicines"] if query in m.lower()][:limit],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doctors", type=int, default=100_000)
+    parser.add_argument("--medicines", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    medical_kb, doctors_db = build_catalog(args.doctors, args.medicines, args.seed)
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.rebuild(medical_kb, doctors_db)
+    print(f"build: {time.perf_counter() - started:.2f}s for {args.doctors} doctors, "
+          f"{args.medicines} medicines, {len(medical_kb['symptoms'])} symptoms")
+
+    names = [d["name"] for d in doctors_db["doctors"][:200]] + list(medical_kb["medicines"])[:200]
+    queries = [name.lower()[:k] for name in names for k in (1, 2, 3, 5)]
+    queries += MIXED_QUERIES * 50
+
+    latencies = []
+    started = time.perf_counter()
+    for query in queries:
+        t = time.perf_counter()
+        index.search(query)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"index: {len(queries)} queries, {len(queries) / elapsed:,.0f} queries/s  "
+          f"p50 {latencies[len(latencies) // 2] * 1e6:.0f}us  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.1f}ms")
+
+    sample = queries[::20]
+    started = time.perf_counter()
+    for query in sample:
+        substring_scan(query, medical_kb, doctors_db)
+    elapsed = time.perf_counter() - started
+    print(f"substring scan: {len(sample)} queries, {len(sample) / elapsed:,.1f} queries/s  "
+          f"({elapsed / len(sample) * 1e3:.1f}ms each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Response Compression for MedicSense AI
+WSGI middleware compressing JSON, markdown and other text responses
+
+The encoding is negotiated from Accept-Encoding: zstd and brotli when the
+`zstandard` / `brotli` packages are installed, gzip always. Responses are
+left alone when they are already encoded (pre-compressed cache and static
+files), not a text-like type, marked no-transform, or smaller than the
+threshold - compressing a few hundred bytes costs more than it saves.
+
+Bodies with a Content-Length are compressed in one go. Bodies without one
+(generators, server-sent events) are compressed chunk by chunk with a
+flush after each, so every event still reaches the client immediately.
+
+Bytes in/out and CPU time per encoding are counted for stats().
+"""
+
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Bodies below this many bytes are sent as they are
+MIN_SIZE = 1024
+
+# Types worth compressing; images, archives and fonts already are
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/manifest+json",
+    "image/svg+xml",
+)
+
+
+class _Encoder:
+    """Incremental compressor with the same interface for every encoding"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=5)
+        else:
+            # wbits=31: gzip container
+            self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        """Everything compressed so far, without ending the stream"""
+        if self.encoding == "zstd":
+            return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "br":
+            return self._obj.flush()
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def available_encodings() -> List[str]:
+    """Encodings this process can produce, in server preference order"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+class CompressionMiddleware:
+    """Wraps a WSGI app (app.wsgi_app) and compresses eligible responses"""
+
+    def __init__(self, app: Callable, min_size: int = MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+        self.encodings = available_encodings()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._skipped: Dict[str, int] = {}
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """Best encoding the client accepts; ties go to server preference"""
+        if not accept_encoding:
+            return None
+        accepted = parse_accept_header(accept_encoding)
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accepted.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def __call__(self, environ, start_response):
+        return self.apply(self.app, environ, start_response)
+
+    def apply(self, wsgi_app: Callable, environ, start_response):
+        """Run any WSGI app (e.g. a finished Response) through the compressor"""
+        encoding = None
+        if environ.get("REQUEST_METHOD") != "HEAD":
+            encoding = self.negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return wsgi_app(environ, start_response)
+
+        captured = {}
+        buffered: List[bytes] = []
+
+        def capture(status, headers, exc_info=None):
+            captured["status"], captured["headers"], captured["exc_info"] = status, headers, exc_info
+            # Legacy write() callers are buffered and sent ahead of the body
+            return buffered.append
+
+        app_iter = wsgi_app(environ, capture)
+        status, headers = captured["status"], captured["headers"]
+        exc_info = captured.get("exc_info")
+
+        reason = self._skip_reason(status, headers)
+        if reason is not None:
+            self._count_skip(reason)
+            if reason == "small":
+                headers = _add_vary(headers)
+            start_response(status, headers, exc_info)
+            return ClosingIterator(_chain(buffered, app_iter), getattr(app_iter, "close", None))
+
+        length = _header(headers, "Content-Length")
+        if length is not None:
+            try:
+                body = b"".join(_chain(buffered, app_iter))
+            finally:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+            if len(body) < self.min_size:
+                self._count_skip("small")
+                start_response(status, _add_vary(headers), exc_info)
+                return [body]
+            started = time.thread_time()
+            encoder = _Encoder(encoding)
+            compressed = encoder.compress(body) + encoder.finish()
+            self._count(encoding, len(body), len(compressed), time.thread_time() - started)
+            start_response(status, _encoded_headers(headers, encoding, len(compressed)), exc_info)
+            return [compressed]
+
+        start_response(status, _encoded_headers(headers, encoding, None), exc_info)
+        return self._stream(encoding, _chain(buffered, app_iter), app_iter)
+
+    def _skip_reason(self, status: str, headers: List[Tuple[str, str]]) -> Optional[str]:
+        code = int(status.split(" ", 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return "status"
+        if _header(headers, "Content-Encoding") is not None:
+            return "encoded"
+        if "no-transform" in (_header(headers, "Cache-Control") or "").lower():
+            return "no-transform"
+        content_type = (_header(headers, "Content-Type") or "").lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return "type"
+        length = _header(headers, "Content-Length")
+        if length is not None and length.isdigit() and int(length) < self.min_size:
+            return "small"
+        return None
+
+    def _stream(self, encoding: str, chunks: Iterable[bytes], app_iter) -> Iterable[bytes]:
+        """Compress a body of unknown length, flushing after every chunk"""
+        encoder = _Encoder(encoding)
+        raw = out = 0
+        cpu = 0.0
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                started = time.thread_time()
+                data = encoder.compress(chunk) + encoder.flush()
+                cpu += time.thread_time() - started
+                raw += len(chunk)
+                out += len(data)
+                yield data
+            tail = encoder.finish()
+            out += len(tail)
+            yield tail
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+            self._count(encoding, raw, out, cpu)
+
+    def _count(self, encoding: str, raw: int, out: int, cpu: float):
+        with self._lock:
+            counter = self._counters.setdefault(
+                encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+            )
+            counter["responses"] += 1
+            counter["bytes_in"] += raw
+            counter["bytes_out"] += out
+            counter["cpu_seconds"] += cpu
+
+    def _count_skip(self, reason: str):
+        with self._lock:
+            self._skipped[reason] = self._skipped.get(reason, 0) + 1
+
+    def stats(self) -> Dict:
+        """Per-encoding bandwidth saved and CPU microseconds per input KB"""
+        with self._lock:
+            encodings = {}
+            for encoding, counter in self._counters.items():
+                bytes_in, bytes_out = counter["bytes_in"], counter["bytes_out"]
+                encodings[encoding] = {
+                    "responses": counter["responses"],
+                    "bytes_in": bytes_in,
+                    "bytes_out": bytes_out,
+                    "bytes_saved": bytes_in - bytes_out,
+                    "ratio": round(bytes_out / bytes_in, 3) if bytes_in else None,
+                    "cpu_us_per_kb": round(counter["cpu_seconds"] * 1e6 / (bytes_in / 1024), 1) if bytes_in else None,
+                }
+            return {
+                "available": list(self.encodings),
+                "min_size": self.min_size,
+                "encodings": encodings,
+                "skipped": dict(self._skipped),
+            }
+
+
+def _header(headers: List[Tuple[str, str]], name: str) -> Optional[str]:
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _add_vary(headers: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """headers with Accept-Encoding in Vary"""
+    vary = _header(headers, "Vary")
+    if vary is not None and "accept-encoding" in vary.lower():
+        return headers
+    headers = [(k, v) for k, v in headers if k.lower() != "vary"]
+    headers.append(("Vary", f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"))
+    return headers
+
+
+def _encoded_headers(headers: List[Tuple[str, str]], encoding: str,
+                     length: Optional[int]) -> List[Tuple[str, str]]:
+    """headers for the compressed body: new length, encoding, weakened ETag"""
+    result = []
+    for key, value in _add_vary(headers):
+        lower = key.lower()
+        if lower == "content-length":
+            continue
+        if lower == "etag" and not value.startswith("W/"):
+            # Same content, different bytes: no longer a strong match
+            value = f"W/{value}"
+        result.append((key, value))
+    result.append(("Content-Encoding", encoding))
+    if length is not None:
+        result.append(("Content-Length", str(length)))
+    return result
+
+
+def _chain(first: List[bytes], rest: Iterable[bytes]) -> Iterable[bytes]:
+    yield from first
+    yield from rest
@@ -0,0 +1,157 @@
+"""
+Doctor Directory for MedicSense AI
+City / specialization lookups for /api/find-doctors
+
+Built once per knowledge-base version. Doctors are kept sorted by id and
+referred to by their position in that order; every (city, specialization)
+pair maps to the ascending positions of its doctors, with per-city,
+per-specialization and all-doctors lists alongside. A query resolves each
+field by prefix - of the whole value or of any later word in it, so "york"
+finds "New York" - into a handful of lists, and k-way merges them to
+return the first k doctors after a cursor without looking at the rest.
+
+Cursors hold the last doctor id returned, so they stay valid when the
+directory is rebuilt.
+"""
+
+import base64
+import heapq
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+
+def normalize(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def _id_key(doctor_id) -> Tuple:
+    # Numeric ids sort numerically, ahead of any string ids
+    if isinstance(doctor_id, (int, float)) and not isinstance(doctor_id, bool):
+        return (0, doctor_id)
+    return (1, str(doctor_id))
+
+
+def encode_cursor(key: Tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key), separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """Raises ValueError for anything encode_cursor did not produce"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, value = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if (rank, type(value)) not in ((0, int), (0, float), (1, str)):
+        raise ValueError("Invalid cursor")
+    return rank, value
+
+
+class _FieldIndex:
+    """Sorted word-suffixes of a field's distinct values, for prefix lookups"""
+
+    def __init__(self, values: Set[str]):
+        pairs = sorted(
+            {(" ".join(words[i:]), value) for value in values
+             for words in [value.split()] for i in range(len(words))}
+        )
+        self.keys = [key for key, _ in pairs]
+        self.values = [value for _, value in pairs]
+
+    def matching(self, prefix: str) -> Optional[Set[str]]:
+        """Values with a word run starting with prefix; None means no filter"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return None
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo)
+        return set(self.values[lo:hi])
+
+
+class DoctorDirectory:
+    """Composite (city, specialization) index over the doctors list"""
+
+    def __init__(self):
+        self._build([])
+        self.version = 0
+
+    def rebuild(self, doctors: List[Dict]):
+        self._build(doctors)
+        self.version += 1
+
+    def _build(self, doctors: List[Dict]):
+        ordered = sorted(doctors, key=lambda doctor: _id_key(doctor.get("id")))
+        composite: Dict[Tuple[str, str], List[int]] = {}
+        by_city: Dict[str, List[int]] = {}
+        by_specialization: Dict[str, List[int]] = {}
+        for position, doctor in enumerate(ordered):
+            city = normalize(doctor.get("city", ""))
+            specialization = normalize(doctor.get("specialization", ""))
+            composite.setdefault((city, specialization), []).append(position)
+            by_city.setdefault(city, []).append(position)
+            by_specialization.setdefault(specialization, []).append(position)
+
+        # Swapped in as one tuple so readers never see a half-built directory
+        self._state = (
+            ordered,
+            [_id_key(doctor.get("id")) for doctor in ordered],
+            {key: array("I", ids) for key, ids in composite.items()},
+            {key: array("I", ids) for key, ids in by_city.items()},
+            {key: array("I", ids) for key, ids in by_specialization.items()},
+            array("I", range(len(ordered))),
+            _FieldIndex(set(by_city)),
+            _FieldIndex(set(by_specialization)),
+        )
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def matching(self, city: str = "", specialization: str = "") -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+        """Normalized (cities, specializations) the prefixes select; None means no filter"""
+        state = self._state
+        return state[6].matching(city), state[7].matching(specialization)
+
+    def find(self, city: str = "", specialization: str = "", limit: int = 5,
+             cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Up to limit doctors (by id) matching both prefixes, after cursor
+
+        Returns (doctors, next_cursor); next_cursor is None on the last page.
+        Raises ValueError for a malformed cursor.
+        """
+        (ordered, keys, composite, by_city, by_specialization,
+         everyone, city_index, specialization_index) = self._state
+
+        cities = city_index.matching(city)
+        specializations = specialization_index.matching(specialization)
+        if cities is None and specializations is None:
+            lists = [everyone]
+        elif specializations is None:
+            lists = [by_city[c] for c in cities]
+        elif cities is None:
+            lists = [by_specialization[s] for s in specializations]
+        else:
+            lists = [composite[(c, s)] for c in cities for s in specializations
+                     if (c, s) in composite]
+
+        start = bisect_right(keys, decode_cursor(cursor)) if cursor else 0
+        merged = heapq.merge(*(self._from(ids, start) for ids in lists))
+        page = list(islice(merged, limit + 1))
+
+        doctors = [ordered[position] for position in page[:limit]]
+        has_more = len(page) > limit
+        next_cursor = encode_cursor(keys[page[limit - 1]]) if has_more and limit > 0 else None
+        return doctors, next_cursor
+
+    @staticmethod
+    def _from(ids: array, start: int) -> Iterator[int]:
+        """Positions >= start, without copying the list"""
+        for i in range(bisect_left(ids, start), len(ids)):
+            yield ids[i]
+
+
+# Global instance
+doctor_directory = DoctorDirectory()
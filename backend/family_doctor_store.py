@@ -0,0 +1,72 @@
+"""
+Family Doctor Store for MedicSense AI
+Keeps family_doctor.json in memory, keyed by user id
+
+Lookups are a dict access. The file stays the shared storage between
+workers: writes take an exclusive file lock, fold in any other worker's
+changes and replace the file atomically (temp file + rename), and readers
+re-check the file's signature at most once per RECHECK_SECONDS - so the
+chat path does no disk I/O per request, and a doctor saved in another
+worker shows up here within that interval.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+from json_file_store import file_signature, locked, read_rows, write_rows
+
+# How stale another worker's write may look to this one
+RECHECK_SECONDS = 1.0
+
+
+class FamilyDoctorStore:
+    """In-memory user id -> family doctor index backed by a JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._doctors: Dict[str, Dict] = {}
+        self._signature = None  # (mtime_ns, size) of the file we last loaded
+        self._checked = float("-inf")
+        self._lock = threading.RLock()
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked < RECHECK_SECONDS:
+            return
+        self._checked = now
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return
+
+        rows = read_rows(self.path)
+        doctors: Dict[str, Dict] = {}
+        for row in rows:
+            if "user_id" in row:
+                # A user listed twice keeps the first entry, as lookups always did
+                doctors.setdefault(row["user_id"], row)
+        self._doctors = doctors
+        self._signature = signature
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        """The user's family doctor, or None"""
+        with self._lock:
+            self._refresh()
+            return self._doctors.get(user_id)
+
+    def save(self, doctor: Dict) -> Dict:
+        """Add or replace the family doctor for doctor["user_id"]"""
+        with self._lock, locked(self.path):
+            self._refresh(force=True)
+            self._doctors[doctor["user_id"]] = doctor
+            self._signature = write_rows(self.path, list(self._doctors.values()))
+        return doctor
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._doctors)
+
+
+# Global instance
+family_doctor_store = FamilyDoctorStore("family_doctor.json")
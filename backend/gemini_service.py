@@ -3,21 +3,60 @@ Gemini AI Service for MedicSense AI
 Handles AI-powered responses for chatbot and image analysis
 """
 
-import base64
-import io
 import os
 
 import google.generativeai as genai
+from google.generativeai.types import content_types
 from dotenv import load_dotenv
-from PIL import Image
+
+from image_cache import ImageAnalysisCache
+from image_processing import decode_data_url, open_header
 
 load_dotenv()
 
+INJURY_IMAGE_PROMPT = """You are a medical AI assistant specializing in disease recognition and medical image analysis.
+
+Analyze this medical image and provide comprehensive disease recognition:
+
+1. **Disease/Condition Recognition**: Identify potential diseases, conditions, or medical issues visible in the image (e.g., skin conditions, injuries, rashes, infections, etc.)
+2. **Primary Condition**: The most likely condition based on visual analysis
+3. **Secondary Possibilities**: 2-3 alternative conditions that could match
+4. **Severity**: mild, moderate, or severe
+5. **Visual Description**: Detailed description of what you observe in the image
+6. **Disease Characteristics**: Key features that help identify the condition
+7. **Care Instructions**: Step-by-step treatment/care instructions (5-6 steps)
+8. **Warning Signs**: List 3-4 signs that would require immediate medical attention
+9. **What NOT to do**: List 3-4 things to avoid
+10. **Estimated Healing Time**: Approximate recovery period
+11. **Medical Advice**: Whether to see a doctor and when
+12. **Recommended Specialist**: Type of doctor/specialist to consult if needed
+
+Format your response as JSON:
+{
+  "injury_type": "Primary condition/disease name",
+  "possible_conditions": ["condition 1", "condition 2", "condition 3"],
+  "severity": "mild/moderate/severe",
+  "confidence": 85,
+  "description": "Detailed visual description",
+  "disease_characteristics": ["characteristic 1", "characteristic 2", ...],
+  "cure_steps": ["step 1", "step 2", ...],
+  "warning_signs": ["sign 1", "sign 2", ...],
+  "do_not": ["action 1", "action 2", ...],
+  "healing_time": "...",
+  "medical_advice": "...",
+  "recommended_specialist": "..."
+}
+
+IMPORTANT: This is for informational purposes only. Always recommend professional medical consultation for accurate diagnosis.
+"""
+
 
 class GeminiService:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY", "")
         self.is_configured = False
+        # Analyses describe the user's photo: near duplicates only match the same user
+        self.image_cache = ImageAnalysisCache(scoped=True)
 
         if self.api_key and self.api_key != "your_api_key_here":
             try:
@@ -70,7 +109,31 @@ class GeminiService:
             return self._fallback_response(symptoms, severity)
 
         try:
-            prompt = f"""You are MedicSense AI, a compassionate and knowledgeable medical assistant with expertise in disease recognition and symptom analysis.
+            response = self.model.generate_content(self._chat_prompt(user_message, symptoms, severity))
+            return response.text
+
+        except Exception as e:
+            print(f"❌ Gemini API error: {e}")
+            return self._fallback_response(symptoms, severity)
+
+    async def chat_medical_async(self, user_message, symptoms, severity):
+        """chat_medical without blocking a thread for the Gemini round trip"""
+        if not self.is_configured:
+            return self._fallback_response(symptoms, severity)
+
+        try:
+            response = await self.model.generate_content_async(
+                self._chat_prompt(user_message, symptoms, severity)
+            )
+            return response.text
+
+        except Exception as e:
+            print(f"❌ Gemini API error: {e}")
+            return self._fallback_response(symptoms, severity)
+
+    @staticmethod
+    def _chat_prompt(user_message, symptoms, severity):
+        return f"""You are MedicSense AI, a compassionate and knowledgeable medical assistant with expertise in disease recognition and symptom analysis.
 
 User's message: "{user_message}"
 Detected symptoms: {', '.join(symptoms) if symptoms else 'None specific'}
@@ -93,87 +156,77 @@ Keep the response conversational, warm, informative, and around 200-250 words.
 IMPORTANT: Always state this is NOT a diagnosis and encourage professional medical consultation.
 """
 
-            response = self.model.generate_content(prompt)
-            return response.text
-
-        except Exception as e:
-            print(f"❌ Gemini API error: {e}")
-            return self._fallback_response(symptoms, severity)
-
-    def analyze_injury_image(self, image_data_url):
-        """Analyze injury image using Gemini Vision"""
-        if not self.is_configured:
-            return self._fallback_image_analysis()
+    def analyze_injury_image(self, image_data_url, cache_scope=None):
+        """Analyze injury image using Gemini Vision (cache_scope: the signed-in user)"""
+        analysis, vision = self.vision_request(image_data_url, cache_scope)
+        if analysis is not None:
+            return analysis
 
+        cache_key, blob = vision
         try:
-            # Extract base64 data from data URL
-            if "," in image_data_url:
-                image_data = image_data_url.split(",")[1]
-            else:
-                image_data = image_data_url
-
-            # Decode base64 to bytes
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-
-            prompt = """You are a medical AI assistant specializing in disease recognition and medical image analysis.
-
-Analyze this medical image and provide comprehensive disease recognition:
+            response = self.vision_model.generate_content([INJURY_IMAGE_PROMPT, blob])
+            return self._vision_result(response.text, cache_key)
 
-1. **Disease/Condition Recognition**: Identify potential diseases, conditions, or medical issues visible in the image (e.g., skin conditions, injuries, rashes, infections, etc.)
-2. **Primary Condition**: The most likely condition based on visual analysis
-3. **Secondary Possibilities**: 2-3 alternative conditions that could match
-4. **Severity**: mild, moderate, or severe
-5. **Visual Description**: Detailed description of what you observe in the image
-6. **Disease Characteristics**: Key features that help identify the condition
-7. **Care Instructions**: Step-by-step treatment/care instructions (5-6 steps)
-8. **Warning Signs**: List 3-4 signs that would require immediate medical attention
-9. **What NOT to do**: List 3-4 things to avoid
-10. **Estimated Healing Time**: Approximate recovery period
-11. **Medical Advice**: Whether to see a doctor and when
-12. **Recommended Specialist**: Type of doctor/specialist to consult if needed
+        except Exception as e:
+            print(f"❌ Gemini Vision API error: {e}")
+            return self._fallback_image_analysis()
 
-Format your response as JSON:
-{
-  "injury_type": "Primary condition/disease name",
-  "possible_conditions": ["condition 1", "condition 2", "condition 3"],
-  "severity": "mild/moderate/severe",
-  "confidence": 85,
-  "description": "Detailed visual description",
-  "disease_characteristics": ["characteristic 1", "characteristic 2", ...],
-  "cure_steps": ["step 1", "step 2", ...],
-  "warning_signs": ["sign 1", "sign 2", ...],
-  "do_not": ["action 1", "action 2", ...],
-  "healing_time": "...",
-  "medical_advice": "...",
-  "recommended_specialist": "..."
-}
+    def vision_request(self, image_data_url, cache_scope=None):
+        """
+        The CPU-bound half of an image analysis: decode, cache lookup and
+        encoding the image for upload (cache_scope: the signed-in user)
 
-IMPORTANT: This is for informational purposes only. Always recommend professional medical consultation for accurate diagnosis.
-"""
+        Returns (analysis, None) when no Gemini call is needed - cached,
+        not configured or undecodable - else (None, request) for
+        analyze_injury_image_async.
+        """
+        if not self.is_configured:
+            return self._fallback_image_analysis(), None
 
-            response = self.vision_model.generate_content([prompt, image])
+        try:
+            # Decode base64 (data URL) to bytes
+            image_bytes = decode_data_url(image_data_url)
 
-            # Parse JSON from response
-            import json
-            import re
+            # Resubmitted or retaken photos reuse the earlier analysis
+            cached, cache_key = self.image_cache.lookup(image_bytes, cache_scope)
+            if cached is not None:
+                return cached, None
 
-            # Extract JSON from markdown code blocks if present
-            text = response.text
-            json_match = re.search(r"```json\n(.*?)\n```", text, re.DOTALL)
-            if json_match:
-                text = json_match.group(1)
-            elif "```" in text:
-                text = text.replace("```", "")
+            # Encoded here rather than inside the Gemini call, which may run on an event loop
+            blob = content_types.to_blob(open_header(image_bytes))
+        except Exception as e:
+            print(f"❌ Gemini Vision API error: {e}")
+            return self._fallback_image_analysis(), None
+        return None, (cache_key, blob)
 
-            result = json.loads(text)
-            result["success"] = True
-            return result
+    async def analyze_injury_image_async(self, vision):
+        """Gemini Vision for a vision_request() result, without blocking a thread"""
+        cache_key, blob = vision
+        try:
+            response = await self.vision_model.generate_content_async([INJURY_IMAGE_PROMPT, blob])
+            return self._vision_result(response.text, cache_key)
 
         except Exception as e:
             print(f"❌ Gemini Vision API error: {e}")
             return self._fallback_image_analysis()
 
+    def _vision_result(self, text, cache_key):
+        # Parse JSON from response
+        import json
+        import re
+
+        # Extract JSON from markdown code blocks if present
+        json_match = re.search(r"```json\n(.*?)\n```", text, re.DOTALL)
+        if json_match:
+            text = json_match.group(1)
+        elif "```" in text:
+            text = text.replace("```", "")
+
+        result = json.loads(text)
+        result["success"] = True
+        self.image_cache.store(cache_key, result)
+        return result
+
     def _fallback_response(self, symptoms, severity):
         """Fallback response when API is not available"""
         if severity == 1:
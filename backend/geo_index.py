@@ -0,0 +1,266 @@
+"""
+Geospatial Index for MedicSense AI
+Nearest and within-radius lookups for hospitals and doctors
+
+Facilities are placed on the unit sphere as 3D points and bucketed into a
+grid of cubes. Straight-line (chord) distance between unit vectors orders
+points exactly like great-circle distance, so a search can grow shells of
+cubes around the query point and stop once no unvisited cube can be closer
+than the k-th best hit - with no special cases at the poles or the date
+line. The cube size is chosen from the number of points so a cell holds a
+few facilities on average.
+
+Each tag ("hospital", "hospital:emergency", "doctor:cardiologist", ...)
+has its own grid, so a filtered search never wades through facilities it
+would discard.
+"""
+
+import heapq
+import math
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Average facilities per occupied cell the grid size aims for
+POINTS_PER_CELL = 4
+
+
+def to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lon)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+
+def chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    x1, y1, z1 = to_unit_vector(lat1, lon1)
+    x2, y2, z2 = to_unit_vector(lat2, lon2)
+    return chord_to_km(math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2 + (z1 - z2) ** 2))
+
+
+def parse_coordinates(lat, lon) -> Optional[Tuple[float, float]]:
+    """(lat, lon) as floats, or None if missing or out of range"""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class GeoGrid:
+    """Cube grid over unit-sphere points, answering nearest and radius queries"""
+
+    def __init__(self, ids: List[int], xs: array, ys: array, zs: array):
+        self.ids = ids
+        self.xs, self.ys, self.zs = xs, ys, zs
+        # Cell edge: area per point on the sphere (4*pi/n) times the target fill
+        self.cell = min(2.0, math.sqrt(4 * math.pi * POINTS_PER_CELL / max(1, len(ids))))
+        self.max_ring = int(2 / self.cell) + 2  # a ring this wide covers the sphere
+
+        cells: Dict[Tuple[int, int, int], List[int]] = {}
+        for slot in range(len(ids)):
+            cells.setdefault(self._cell_of(xs[slot], ys[slot], zs[slot]), []).append(slot)
+        self.cells = {key: array("I", slots) for key, slots in cells.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell_of(self, x: float, y: float, z: float) -> Tuple[int, int, int]:
+        cell = self.cell
+        return math.floor(x / cell), math.floor(y / cell), math.floor(z / cell)
+
+    def _shell(self, center: Tuple[int, int, int], r: int) -> Iterable[Tuple[int, int, int]]:
+        """Cells whose Chebyshev distance from center is exactly r"""
+        cx, cy, cz = center
+        if r == 0:
+            yield center
+            return
+        span = range(-r, r + 1)
+        for dx in span:
+            for dy in span:
+                if abs(dx) == r or abs(dy) == r:
+                    for dz in span:
+                        yield cx + dx, cy + dy, cz + dz
+                else:
+                    yield cx + dx, cy + dy, cz - r
+                    yield cx + dx, cy + dy, cz + r
+
+    def _block_margin(self, point: Tuple[float, float, float],
+                      center: Tuple[int, int, int], r: int) -> float:
+        """Distance from point to the outside of the (2r+1)^3 block around center"""
+        cell = self.cell
+        return min(
+            min(p - (c - r) * cell, (c + r + 1) * cell - p) for p, c in zip(point, center)
+        )
+
+    def nearest(self, lat: float, lon: float, k: int = 3, max_km: Optional[float] = None,
+                accept: Optional[Callable[[int], bool]] = None) -> List[Tuple[float, int]]:
+        """Up to k (distance_km, id) pairs, closest first; ids failing accept are skipped"""
+        if k <= 0 or not self.ids:
+            return []
+        point = to_unit_vector(lat, lon)
+        qx, qy, qz = point
+        center = self._cell_of(qx, qy, qz)
+        limit = km_to_chord(max_km) ** 2 if max_km is not None else 5.0
+        xs, ys, zs, cells = self.xs, self.ys, self.zs, self.cells
+
+        best: List[Tuple[float, int]] = []  # max-heap of (-squared chord, slot)
+        for r in range(self.max_ring + 1):
+            for key in self._shell(center, r):
+                slots = cells.get(key)
+                if slots is None:
+                    continue
+                for slot in slots:
+                    d2 = (xs[slot] - qx) ** 2 + (ys[slot] - qy) ** 2 + (zs[slot] - qz) ** 2
+                    if d2 > limit:
+                        continue
+                    if accept is not None and not accept(self.ids[slot]):
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, slot))
+                    elif d2 < -best[0][0]:
+                        heapq.heapreplace(best, (-d2, slot))
+            # Everything unvisited lies outside the block searched so far
+            margin = self._block_margin(point, center, r) ** 2
+            if margin >= limit or (len(best) == k and margin >= -best[0][0]):
+                break
+
+        return [(chord_to_km(math.sqrt(-d2)), self.ids[slot]) for d2, slot in sorted(best, reverse=True)]
+
+    def within(self, lat: float, lon: float, km: float,
+               accept: Optional[Callable[[int], bool]] = None) -> List[Tuple[float, int]]:
+        """Every (distance_km, id) within km, closest first; ids failing accept are skipped"""
+        if km < 0 or not self.ids:
+            return []
+        point = to_unit_vector(lat, lon)
+        qx, qy, qz = point
+        chord = km_to_chord(km)
+        limit = chord ** 2
+        lo = self._cell_of(qx - chord, qy - chord, qz - chord)
+        hi = self._cell_of(qx + chord, qy + chord, qz + chord)
+        block = (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1) * (hi[2] - lo[2] + 1)
+
+        if block > len(self.cells):
+            # A wide radius: cheaper to check the occupied cells than the block
+            keys = [key for key in self.cells
+                    if all(l <= c <= h for l, c, h in zip(lo, key, hi))]
+        else:
+            keys = [(x, y, z) for x in range(lo[0], hi[0] + 1)
+                    for y in range(lo[1], hi[1] + 1) for z in range(lo[2], hi[2] + 1)]
+
+        xs, ys, zs, cells = self.xs, self.ys, self.zs, self.cells
+        hits = []
+        for key in keys:
+            for slot in cells.get(key, ()):
+                d2 = (xs[slot] - qx) ** 2 + (ys[slot] - qy) ** 2 + (zs[slot] - qz) ** 2
+                if d2 <= limit and (accept is None or accept(self.ids[slot])):
+                    hits.append((d2, slot))
+        hits.sort()
+        return [(chord_to_km(math.sqrt(d2)), self.ids[slot]) for d2, slot in hits]
+
+
+class GeoIndex:
+    """Tagged facilities (dicts with lat/lon) with one grid per tag"""
+
+    def __init__(self):
+        self.records: List[Dict] = []
+        self.grids: Dict[str, GeoGrid] = {}
+        self.cities: Dict[str, Tuple[float, float]] = {}
+
+    def rebuild(self, facilities: Iterable[Tuple[Dict, Iterable[str]]]):
+        """facilities: (record, tags); records without valid coordinates are skipped"""
+        records, xs, ys, zs = [], array("d"), array("d"), array("d")
+        by_tag: Dict[str, List[int]] = {}
+        city_points: Dict[str, List[Tuple[float, float]]] = {}
+        for record, tags in facilities:
+            coordinates = parse_coordinates(record.get("lat"), record.get("lon"))
+            if coordinates is None:
+                continue
+            x, y, z = to_unit_vector(*coordinates)
+            record_id = len(records)
+            records.append(record)
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+            for tag in tags:
+                by_tag.setdefault(tag, []).append(record_id)
+            city = str(record.get("city", "")).strip().lower()
+            if city:
+                city_points.setdefault(city, []).append(coordinates)
+
+        grids = {}
+        for tag, ids in by_tag.items():
+            grids[tag] = GeoGrid(ids, array("d", (xs[i] for i in ids)),
+                                 array("d", (ys[i] for i in ids)), array("d", (zs[i] for i in ids)))
+        cities = {
+            city: (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+            for city, points in city_points.items()
+        }
+        self.records, self.grids, self.cities = records, grids, cities
+
+    def nearest(self, lat: float, lon: float, tags: Iterable[str], k: int = 3,
+                max_km: Optional[float] = None,
+                where: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """k closest records carrying any of the tags (and passing where), each with distance_km"""
+        records, grids = self.records, self.grids
+        accept = _accept(records, where)
+        hits = {}
+        for tag in tags:
+            grid = grids.get(tag)
+            if grid is not None:
+                for km, record_id in grid.nearest(lat, lon, k, max_km, accept):
+                    hits[record_id] = km
+        ranked = heapq.nsmallest(k, hits.items(), key=lambda hit: hit[1])
+        return [dict(records[record_id], distance_km=round(km, 2)) for record_id, km in ranked]
+
+    def within(self, lat: float, lon: float, km: float, tags: Iterable[str],
+               limit: Optional[int] = None,
+               where: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """Records carrying any of the tags (and passing where) within km, closest first"""
+        records, grids = self.records, self.grids
+        accept = _accept(records, where)
+        hits = {}
+        for tag in tags:
+            grid = grids.get(tag)
+            if grid is not None:
+                for distance, record_id in grid.within(lat, lon, km, accept):
+                    hits[record_id] = distance
+        ranked = sorted(hits.items(), key=lambda hit: hit[1])[:limit]
+        return [dict(records[record_id], distance_km=round(distance, 2)) for record_id, distance in ranked]
+
+    def city_center(self, city: str) -> Optional[Tuple[float, float]]:
+        """Mean position of the records in a city, to search around a named city"""
+        return self.cities.get(city.strip().lower())
+
+
+def _accept(records: List[Dict], where: Optional[Callable[[Dict], bool]]):
+    """where(record) as a test on record ids, for GeoGrid"""
+    if where is None:
+        return None
+    return lambda record_id: where(records[record_id])
+
+
+def facility_tags(doctors_db: Dict) -> List[Tuple[Dict, List[str]]]:
+    """Tag hospitals and doctors from doctors_db.json for GeoIndex.rebuild"""
+    facilities = []
+    for hospital in doctors_db.get("hospitals", []):
+        tags = ["hospital"] + (["hospital:emergency"] if hospital.get("emergency") else [])
+        facilities.append((hospital, tags))
+    for doctor in doctors_db.get("doctors", []):
+        specialization = doctor.get("specialization", "").lower()
+        facilities.append((doctor, ["doctor", f"doctor:{specialization}"]))
+    return facilities
+
+
+# Global instance
+geo_index = GeoIndex()
@@ -0,0 +1,115 @@
+"""
+Image Analysis Cache for MedicSense AI
+Reuses injury analyses for identical or near-identical photos
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from image_processing import hamming_distance, image_dhash
+
+
+class ImageAnalysisCache:
+    """
+    LRU cache of analysis results keyed by image content
+
+    - Exact duplicates are found by a digest of the raw bytes (no decoding)
+    - Near duplicates (retakes of the same wound) are found by comparing
+      64-bit dHashes within a Hamming distance threshold
+
+    A scoped cache is for results that describe one user's photo (Gemini's
+    free-text analysis): entries are keyed by (scope, digest), near
+    duplicates only match within the same scope, and a None scope (not
+    signed in) gets exact hits only. Unscoped caches hold results computed
+    from the pixels alone and match across everyone.
+    """
+
+    def __init__(self, capacity: int = 256, max_distance: int = 5, scoped: bool = False):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.scoped = scoped
+        self._entries: "OrderedDict[Tuple[Optional[str], bytes], Tuple[Optional[int], Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, image_bytes: bytes, scope: Optional[str] = None) -> Tuple[Optional[Dict], Tuple]:
+        """
+        Find a cached result for an image (scope: the user, for scoped caches)
+
+        Returns:
+            (result or None, key) - pass the key to `store` on a miss
+        """
+        if not self.scoped:
+            scope = None
+        digest = (scope, hashlib.blake2b(image_bytes, digest_size=16).digest())
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.exact_hits += 1
+                return dict(entry[1]), (digest, entry[0])
+
+        if self.scoped and scope is None:
+            with self._lock:
+                self.misses += 1
+            return None, (digest, None)
+
+        try:
+            phash = image_dhash(image_bytes)
+        except Exception:
+            phash = None
+
+        with self._lock:
+            if phash is not None and self.max_distance > 0:
+                best_key, best_distance = None, self.max_distance + 1
+                for key, (cached_hash, _) in self._entries.items():
+                    if cached_hash is None or key[0] != scope:
+                        continue
+                    distance = hamming_distance(phash, cached_hash)
+                    if distance < best_distance:
+                        best_key, best_distance = key, distance
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.near_hits += 1
+                    return dict(self._entries[best_key][1]), (digest, phash)
+
+            self.misses += 1
+
+        return None, (digest, phash)
+
+    def store(self, key: Tuple, result: Dict):
+        """Cache a result under the key returned by `lookup`"""
+        digest, phash = key
+        with self._lock:
+            self._entries[digest] = (phash, dict(result))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached results"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit counters and occupancy"""
+        with self._lock:
+            lookups = self.exact_hits + self.near_hits + self.misses
+            hits = self.exact_hits + self.near_hits
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
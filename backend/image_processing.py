@@ -0,0 +1,220 @@
+"""
+Image Processing Helpers for MedicSense AI
+Shared decoding and hashing used by the injury analyzers
+"""
+
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+# Analysis resolution used by the color-based injury detection
+ANALYSIS_SIZE = (200, 200)
+
+# dHash grid (9x8 gradients -> 64-bit hash)
+HASH_SIZE = 8
+
+# Upload limits for file-based analysis
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_PIXELS = 50_000_000
+
+# Magic-byte signatures of the formats we accept
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+)
+
+
+class ImageUploadError(ValueError):
+    """Uploaded file is not an image we can analyze"""
+
+
+class ImageTooLargeError(ImageUploadError):
+    """Uploaded file exceeds the size or pixel limit"""
+
+
+def decode_data_url(image_data: str) -> bytes:
+    """Decode a base64 image (optionally a data: URL) into raw bytes"""
+    if "," in image_data:
+        image_data = image_data.split(",")[1]
+    return base64.b64decode(image_data)
+
+
+def sniff_image_format(header: bytes):
+    """Image format from the leading magic bytes, or None if unrecognized"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def read_image_upload(stream, max_bytes: int = MAX_UPLOAD_BYTES,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """
+    Read an uploaded image stream in chunks
+
+    The format is sniffed from the first bytes so non-images are rejected
+    before the rest of the body is read, and reading stops as soon as the
+    size cap is exceeded.
+
+    Returns:
+        (image bytes, format name)
+    """
+    buffer = bytearray()
+    image_format = None
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise ImageTooLargeError(f"Image exceeds {max_bytes // (1024 * 1024)} MB limit")
+        if image_format is None and len(buffer) >= 12:
+            image_format = sniff_image_format(bytes(buffer[:12]))
+            if image_format is None:
+                raise ImageUploadError("Unsupported file type. Upload a JPEG, PNG, GIF, BMP or WebP image")
+
+    if not buffer:
+        raise ImageUploadError("Empty file")
+    if image_format is None:
+        image_format = sniff_image_format(bytes(buffer))
+        if image_format is None:
+            raise ImageUploadError("Unsupported file type. Upload a JPEG, PNG, GIF, BMP or WebP image")
+
+    return bytes(buffer), image_format
+
+
+def open_header(image_bytes: bytes) -> Image.Image:
+    """Open image bytes without decoding pixels, rejecting too many pixels"""
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+    except Image.DecompressionBombError as e:
+        # Pillow's own, much higher, limit trips first on huge headers
+        raise ImageTooLargeError(str(e)) from e
+    if img.width * img.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"Image has too many pixels ({img.width}x{img.height})")
+    return img
+
+
+def open_image(image_bytes: bytes, size=None, mode: str = "RGB") -> Image.Image:
+    """
+    Open image bytes, decoding at reduced resolution when possible
+
+    For JPEGs, `draft` lets the decoder scale down by 1/2..1/8 while
+    decoding, so a 12MP photo never gets fully decompressed.
+    """
+    img = open_header(image_bytes)
+    if size:
+        img.draft(mode, size)
+    img = img.convert(mode)
+    if size and img.size != tuple(size):
+        img = img.resize(size)
+    return img
+
+
+def dhash(img: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: compares horizontally adjacent pixels of a tiny grayscale copy"""
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def image_dhash(image_bytes: bytes) -> int:
+    """Perceptual hash of raw image bytes, decoded at thumbnail size"""
+    # Same pixel cap as open_image: non-JPEGs are decoded in full here
+    img = open_header(image_bytes)
+    img.draft("L", (64, 64))
+    return dhash(img)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return (a ^ b).bit_count()
+
+
+def color_masks(pixels: np.ndarray) -> dict:
+    """
+    Boolean mask per injury color category for an (H, W, 3) RGB array
+
+    Vectorized version of the per-pixel rules; categories are exclusive and
+    checked in order (red, white, pink, blue/purple, dark).
+    """
+    rgb = pixels.astype(np.int16)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+
+    red = (r > 150) & (g < 100) & (b < 100)
+    remaining = ~red
+    white = remaining & (r > 200) & (g > 200) & (b > 200)
+    remaining &= ~white
+    pink = remaining & (r > 180) & (g > 120) & (g < 180) & (b > 120) & (b < 180)
+    remaining &= ~pink
+    blue_purple = remaining & (b > 120) & (g < 120) & (r < 150)
+    remaining &= ~blue_purple
+    dark = remaining & (r < 100) & (g < 100) & (b < 100)
+
+    return {
+        "red": red,
+        "white": white,
+        "pink": pink,
+        "blue_purple": blue_purple,
+        "dark": dark,
+    }
+
+
+def color_percentages(pixels: np.ndarray) -> dict:
+    """Percentage of pixels in each injury color category"""
+    total = max(pixels.shape[0] * pixels.shape[1], 1)
+    return {
+        name: np.count_nonzero(mask) * 100.0 / total
+        for name, mask in color_masks(pixels).items()
+    }
+
+
+def integral_images(masks: dict, cell: int = 1) -> np.ndarray:
+    """
+    Summed-area tables for a dict of (H, W) boolean masks
+
+    With cell > 1 the masks are first summed into cell x cell blocks, so the
+    table is built on a coarser grid (window positions snap to cells).
+    Returns an array of shape (len(masks), rows + 1, cols + 1) with a zero
+    first row/column, so any rectangle sum is four lookups.
+    """
+    stacked = np.stack([mask for mask in masks.values()])
+    if cell > 1:
+        channels, height, width = stacked.shape
+        height, width = height // cell * cell, width // cell * cell
+        stacked = stacked[:, :height, :width].reshape(
+            channels, height // cell, cell, width // cell, cell
+        ).sum(axis=(2, 4), dtype=np.int32)
+
+    sat = np.zeros((stacked.shape[0], stacked.shape[1] + 1, stacked.shape[2] + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(stacked, axis=1, dtype=np.int32), axis=2, out=sat[:, 1:, 1:])
+    return sat
+
+
+def window_sums(sat: np.ndarray, size: int, stride: int) -> np.ndarray:
+    """
+    Sums over every size x size window (top-left on a stride grid)
+
+    Returns shape (channels, rows, cols); each window costs O(1).
+    """
+    height, width = sat.shape[1] - 1, sat.shape[2] - 1
+    ys = np.arange(0, height - size + 1, stride)
+    xs = np.arange(0, width - size + 1, stride)
+    top, bottom = ys[:, None], ys[:, None] + size
+    left, right = xs[None, :], xs[None, :] + size
+    return (sat[:, bottom, right] - sat[:, top, right]
+            - sat[:, bottom, left] + sat[:, top, left])
@@ -0,0 +1,266 @@
+"""
+Local Injury Classifier for MedicSense AI
+Small NumPy softmax model over color-histogram and texture features,
+trained offline from a labeled image folder
+
+Usage:
+    python injury_classifier.py train --data photos/
+    python injury_classifier.py evaluate --data holdout/
+
+Both default to backend/models/injury_classifier.npz (INJURY_MODEL_PATH
+overrides it for the server); models/README.md describes the artifact.
+
+The data folder holds one sub-folder per injury type (cut, burn, bruise,
+scrape, rash) containing that type's photos.
+"""
+
+import argparse
+import base64
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from image_processing import ANALYSIS_SIZE, color_percentages, open_image
+
+# Same categories as CameraInjuryAnalyzer.injury_database
+CATEGORIES = ["cut", "burn", "bruise", "scrape", "rash"]
+
+# Next to this file, not the working directory, so it is found however the server starts
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "injury_classifier.npz")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
+
+
+def extract_features(pixels: np.ndarray, percentages: Optional[Dict] = None) -> np.ndarray:
+    """
+    Feature vector for an (H, W, 3) uint8 RGB array
+
+    - 64-bin joint RGB histogram (4 levels per channel)
+    - injury color category fractions
+    - per-channel mean / std
+    - texture: gradient magnitude mean / std, edge density, Laplacian variance
+    """
+    if percentages is None:
+        percentages = color_percentages(pixels)
+
+    quantized = (pixels >> 6).astype(np.int32)
+    bins = quantized[..., 0] * 16 + quantized[..., 1] * 4 + quantized[..., 2]
+    histogram = np.bincount(bins.ravel(), minlength=64) / bins.size
+
+    categories = np.array([percentages[name] for name in
+                           ("red", "white", "pink", "blue_purple", "dark")]) / 100.0
+
+    rgb = pixels.reshape(-1, 3).astype(np.float32) / 255.0
+    channel_stats = np.concatenate([rgb.mean(axis=0), rgb.std(axis=0)])
+
+    gray = pixels.astype(np.float32).mean(axis=2) / 255.0
+    gx = np.diff(gray, axis=1)[:-1, :]
+    gy = np.diff(gray, axis=0)[:, :-1]
+    magnitude = np.sqrt(gx * gx + gy * gy)
+    laplacian = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1]
+                 + gray[2:, 1:-1] - 4 * gray[1:-1, 1:-1])
+    texture = np.array([
+        magnitude.mean(),
+        magnitude.std(),
+        (magnitude > 0.1).mean(),
+        laplacian.var(),
+    ])
+
+    return np.concatenate([histogram, categories, channel_stats, texture]).astype(np.float32)
+
+
+class InjuryClassifier:
+    """Multinomial logistic regression over standardized image features"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray,
+                 mean: np.ndarray, scale: np.ndarray, labels: List[str]):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+        self.labels = list(labels)
+
+    @classmethod
+    def fit(cls, features: np.ndarray, targets: np.ndarray, labels: List[str],
+            epochs: int = 500, learning_rate: float = 0.5,
+            l2: float = 1e-3) -> "InjuryClassifier":
+        """Train with full-batch gradient descent on cross-entropy"""
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale < 1e-6] = 1.0
+        x = (features - mean) / scale
+
+        n, d = x.shape
+        k = len(labels)
+        one_hot = np.eye(k)[targets]
+        weights = np.zeros((d, k))
+        bias = np.zeros(k)
+
+        for _ in range(epochs):
+            probabilities = _softmax(x @ weights + bias)
+            error = (probabilities - one_hot) / n
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        return cls(weights, bias, mean, scale, labels)
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Class probabilities for one feature vector or a batch"""
+        x = (np.atleast_2d(features) - self.mean) / self.scale
+        probabilities = _softmax(x @ self.weights + self.bias)
+        return probabilities[0] if features.ndim == 1 else probabilities
+
+    def predict(self, features: np.ndarray) -> Tuple[str, float]:
+        """Most likely label and its probability"""
+        probabilities = self.predict_proba(features)
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
+
+    def save(self, path: str):
+        """Write the model to an .npz file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean,
+                 scale=self.scale, labels=np.array(self.labels))
+
+    @classmethod
+    def load(cls, path: str) -> "InjuryClassifier":
+        """Read a model written by `save`"""
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"], data["mean"],
+                       data["scale"], [str(label) for label in data["labels"]])
+
+    @classmethod
+    def load_if_present(cls, path: str) -> Optional["InjuryClassifier"]:
+        """Load the model if it exists, otherwise None (reported once)"""
+        if not os.path.exists(path):
+            if multiprocessing.parent_process() is not None:
+                # Pool workers (batch analysis) would repeat the parent's notice
+                return None
+            print(f"⚠️  No injury classifier at {path} - every injury image goes to Gemini")
+            print("   Train one with: python injury_classifier.py train --data <labeled photos>"
+                  " (see models/README.md)")
+            return None
+        try:
+            model = cls.load(path)
+            print(f"✅ Local injury classifier loaded from {path}")
+            return model
+        except Exception as e:
+            print(f"⚠️  Could not load injury classifier {path}: {e}")
+            return None
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_labeled_folder(root: str) -> List[Tuple[str, str]]:
+    """(path, label) pairs from a folder with one sub-folder per category"""
+    samples = []
+    for label in CATEGORIES:
+        directory = os.path.join(root, label)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(directory, name), label))
+    return samples
+
+
+def _features_for_file(path: str) -> np.ndarray:
+    with open(path, "rb") as f:
+        img = open_image(f.read(), ANALYSIS_SIZE)
+    return extract_features(np.asarray(img))
+
+
+def train(args):
+    samples = load_labeled_folder(args.data)
+    if not samples:
+        raise SystemExit(f"No labeled images found under {args.data}")
+
+    labels = [label for label in CATEGORIES if any(s[1] == label for s in samples)]
+    features = np.stack([_features_for_file(path) for path, _ in samples])
+    targets = np.array([labels.index(label) for _, label in samples])
+
+    model = InjuryClassifier.fit(features, targets, labels, epochs=args.epochs,
+                                 learning_rate=args.lr, l2=args.l2)
+    accuracy = float((model.predict_proba(features).argmax(axis=1) == targets).mean())
+    model.save(args.out)
+
+    print(f"Trained on {len(samples)} images ({', '.join(labels)})")
+    print(f"Training accuracy: {accuracy:.1%}")
+    print(f"Model written to {args.out}")
+
+
+def evaluate(args):
+    samples = load_labeled_folder(args.data)
+    if not samples:
+        raise SystemExit(f"No labeled images found under {args.data}")
+
+    model = InjuryClassifier.load(args.model)
+    gemini = None
+    if args.remote:
+        from gemini_service import gemini_service as gemini
+
+    latencies, correct, local_correct, local_count, remote_count = [], 0, 0, 0, 0
+    for path, label in samples:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+
+        start = time.perf_counter()
+        img = open_image(image_bytes, ANALYSIS_SIZE)
+        predicted, probability = model.predict(extract_features(np.asarray(img)))
+        if probability >= args.threshold:
+            local_count += 1
+            local_correct += predicted == label
+        else:
+            remote_count += 1
+            if gemini is not None:
+                gemini.analyze_injury_image(base64.b64encode(image_bytes).decode())
+        latencies.append(time.perf_counter() - start)
+        correct += predicted == label
+
+    latencies_ms = np.array(latencies) * 1000
+    total = len(samples)
+    print(f"Images:            {total}")
+    print(f"Threshold:         {args.threshold:.2f}")
+    print(f"Overall accuracy:  {correct / total:.1%}")
+    print(f"Local accuracy:    {local_correct / local_count:.1%}" if local_count
+          else "Local accuracy:    n/a")
+    print(f"Remote-call rate:  {remote_count / total:.1%} ({remote_count}/{total})")
+    print(f"Latency p50:       {np.percentile(latencies_ms, 50):.2f} ms"
+          + ("" if args.remote else " (local only)"))
+    print(f"Latency p95:       {np.percentile(latencies_ms, 95):.2f} ms")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Train or evaluate the local injury classifier")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="Train from a labeled folder")
+    train_parser.add_argument("--data", required=True)
+    train_parser.add_argument("--out", default=DEFAULT_MODEL_PATH)
+    train_parser.add_argument("--epochs", type=int, default=500)
+    train_parser.add_argument("--lr", type=float, default=0.5)
+    train_parser.add_argument("--l2", type=float, default=1e-3)
+    train_parser.set_defaults(func=train)
+
+    eval_parser = commands.add_parser("evaluate", help="Report accuracy, remote-call rate and latency")
+    eval_parser.add_argument("--data", required=True)
+    eval_parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    eval_parser.add_argument("--threshold", type=float, default=0.85)
+    eval_parser.add_argument("--remote", action="store_true",
+                             help="Call Gemini for escalated images to measure end-to-end latency")
+    eval_parser.set_defaults(func=evaluate)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+JSON File Store helpers for MedicSense AI
+The file handling shared by stores that keep a JSON list in memory and
+use the file as storage between workers (appointments, family doctors)
+
+- file_signature: (mtime_ns, size), to notice another worker's write
+- read_rows: the list in the file; [] when it is missing or unreadable
+- write_rows: temp file + rename, so readers never see half a file; the
+  file keeps its permissions (new files get 0644)
+- locked: exclusive lock on <path>.lock around a read-modify-write
+"""
+
+import fcntl
+import json
+import os
+import stat
+import tempfile
+from typing import IO, List, Optional, Tuple
+
+# Mode for a file written for the first time (mkstemp alone would give 0600)
+DEFAULT_MODE = 0o644
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def read_rows(path: str) -> List:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def write_rows(path: str, rows: List) -> Optional[Tuple[int, int]]:
+    """Atomically replace the file with rows; returns its new signature"""
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = DEFAULT_MODE
+    directory = os.path.dirname(os.path.abspath(path))
+    name = os.path.splitext(os.path.basename(path))[0]
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            os.fchmod(f.fileno(), mode)
+            json.dump(rows, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return file_signature(path)
+
+
+def locked(path: str) -> IO:
+    """Open lock file holding an exclusive lock; use as `with locked(path):`"""
+    # Serializes read-modify-write across worker processes
+    lock_file = open(f"{path}.lock", "w")
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
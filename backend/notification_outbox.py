@@ -0,0 +1,338 @@
+"""
+WhatsApp Notification Outbox for MedicSense AI
+Delivers appointment notifications after the booking has returned
+
+A booking saves its notification together with the appointment, in the
+same appointments.json write (AppointmentStore.add), so a crash can't keep
+one and lose the other. relay() then copies it into a row of the outbox's
+own SQLite table (WAL mode, shared by every worker on the host) and clears
+it from the appointment; a notification id already in the table is left
+alone, so a relay interrupted between the two steps just runs again - after
+the booking, at startup and whenever a worker is idle. Background workers claim a due row with a lease - one UPDATE ... RETURNING,
+so two workers never claim the same row - send it through the kept-alive
+Twilio client and record the outcome with another single-row UPDATE;
+transient failures are retried with exponential backoff. Claims and acks
+touch one row, never appointments.json.
+
+The notification id is its idempotency key: enqueueing the same id twice
+is a no-op, a "sent" notification is never resent, and the Twilio client
+checks the id against its send log before sending. A worker that dies
+after Twilio accepted a message but before recording it lets the lease
+expire; the next claim finds the message in the send log and records it
+without sending again. A request whose response was lost may or may not
+have created a message, so it is marked dead rather than resent - the
+doctor gets at most one WhatsApp per booking.
+"""
+
+import datetime
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from appointment_store import AppointmentStore, appointment_store
+from records import Appointment
+from twilio_client import TwilioClient, TwilioError
+
+load_dotenv()
+
+# Doctor WhatsApp number
+DOCTOR_WHATSAPP = {"dr_aakash": "+919770064169"}  # Dr. Aakash Singh Rajput
+
+
+def format_appointment_message(appointment: Dict) -> str:
+    """WhatsApp text telling the doctor about a new booking"""
+    try:
+        date_str = datetime.datetime.fromisoformat(appointment["date"]).strftime("%B %d, %Y")
+    except (TypeError, ValueError):
+        date_str = appointment["date"]
+
+    return f"""🏥 *New Appointment Booking*
+
+👤 *Patient Details:*
+Name: {appointment['name']}
+Phone: {appointment['phone']}
+Email: {appointment.get('email') or 'Not provided'}
+
+📅 *Appointment Details:*
+Date: {date_str}
+Time: {appointment['time']}
+Type: {appointment.get('type', 'In-Person')}
+
+📝 *Reason:*
+{appointment.get('reason') or 'Not specified'}
+
+🆔 Appointment ID: {appointment['id']}
+
+Please confirm this appointment."""
+
+
+def doctor_notification(appointment: Appointment) -> Optional[Dict]:
+    """Outbox entry for the booked doctor, or None if they get no WhatsApp"""
+    number = DOCTOR_WHATSAPP.get(appointment.doctor_id)
+    if number is None:
+        return None
+    return {
+        "id": f"{appointment.id}:whatsapp:doctor",  # idempotency key
+        "appointment_id": appointment.id,
+        "channel": "whatsapp",
+        "to": f"whatsapp:{number}",
+        "body": format_appointment_message(appointment.to_dict()),
+    }
+
+
+class OutboxStore:
+    """Notification rows in a SQLite table; every state change is one statement"""
+
+    COLUMNS = ("id", "appointment_id", "channel", "to_address", "body", "status", "attempts",
+               "next_attempt_at", "lease_until", "sid", "last_error")
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS notifications ("
+            " id TEXT PRIMARY KEY,"
+            " appointment_id TEXT NOT NULL,"
+            " channel TEXT NOT NULL,"
+            " to_address TEXT NOT NULL,"
+            " body TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " lease_until REAL,"
+            " sid TEXT,"
+            " last_error TEXT)"
+        )
+        # Only undelivered rows are indexed, so polling cost doesn't grow with history
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS notifications_due ON notifications (next_attempt_at)"
+            " WHERE status IN ('pending', 'sending')"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections aren't thread-safe
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, notification: Dict) -> bool:
+        """Store a pending notification unless its id exists; True if stored"""
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO notifications"
+            " (id, appointment_id, channel, to_address, body, next_attempt_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (notification["id"], notification["appointment_id"], notification["channel"],
+             notification["to"], notification["body"], time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, lease_seconds: float) -> Optional[Dict]:
+        """Lease the next due notification (pending, or with a lapsed lease)"""
+        now = time.time()
+        row = self._conn().execute(
+            "UPDATE notifications SET status = 'sending', lease_until = ?, attempts = attempts + 1"
+            " WHERE id = (SELECT id FROM notifications"
+            "             WHERE status IN ('pending', 'sending')"
+            "               AND CASE status WHEN 'pending' THEN next_attempt_at ELSE lease_until END <= ?"
+            "             ORDER BY next_attempt_at LIMIT 1)"
+            f" RETURNING {', '.join(self.COLUMNS)}",
+            (now + lease_seconds, now),
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def finish(self, notification: Dict, status: str, sid: Optional[str] = None,
+               last_error: Optional[str] = None, next_attempt_at: Optional[float] = None) -> bool:
+        """
+        Record the outcome of a claim; False if the claim was lost
+
+        A claim is identified by its attempt number, so a worker whose lease
+        ran out can't overwrite the result of the worker that took over.
+        """
+        cursor = self._conn().execute(
+            "UPDATE notifications SET status = ?, lease_until = NULL, sid = COALESCE(?, sid),"
+            " last_error = COALESCE(?, last_error),"
+            " next_attempt_at = COALESCE(?, next_attempt_at)"
+            " WHERE id = ? AND status = 'sending' AND attempts = ?",
+            (status, sid, last_error, next_attempt_at, notification["id"], notification["attempts"]),
+        )
+        return cursor.rowcount == 1
+
+    def get(self, notification_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM notifications WHERE id = ?", (notification_id,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def has_pending(self) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM notifications WHERE status IN ('pending', 'sending') LIMIT 1"
+        ).fetchone() is not None
+
+    def _to_dict(self, row) -> Dict:
+        data = dict(zip(self.COLUMNS, row))
+        data["to"] = data.pop("to_address")
+        return data
+
+
+class NotificationOutbox:
+    """Background delivery of the notifications in an OutboxStore"""
+
+    def __init__(self, store: OutboxStore, client: Optional[TwilioClient],
+                 from_number: Optional[str], workers: int = 2, max_attempts: int = 6,
+                 base_delay: float = 2.0, max_delay: float = 300.0,
+                 lease_seconds: float = 60.0, poll_interval: float = 2.0,
+                 source: Optional[AppointmentStore] = None):
+        self.store = store
+        self.source = source  # where bookings leave their notifications
+        self.client = client
+        self.from_number = from_number
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+        self._wakeup = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._warned = False
+        self.stats = {"sent": 0, "retries": 0, "dead": 0}
+
+    @property
+    def configured(self) -> bool:
+        return self.client is not None and bool(self.from_number)
+
+    def enqueue(self, notification: Dict) -> bool:
+        """Queue a notification and wake the workers; False if its id was already queued"""
+        added = self.store.add(notification)
+        if added:
+            self.wake()
+        return added
+
+    def relay(self) -> int:
+        """Move notifications saved with appointments into the outbox; how many were new"""
+        if self.source is None:
+            return 0
+        notifications = self.source.unsent_notifications()
+        if not notifications:
+            return 0
+        added = sum(1 for notification in notifications if self.store.add(notification))
+        self.source.clear_notifications(notification["id"] for notification in notifications)
+        if added:
+            self.wake()
+        return added
+
+    def wake(self):
+        """Start workers if needed and tell them there is new work"""
+        if not self.configured:
+            if not self._warned:
+                print("⚠️  Twilio not configured - WhatsApp notifications stay queued in the outbox")
+                self._warned = True
+            return
+        self._ensure_workers()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _ensure_workers(self):
+        # Started lazily so each forked server worker gets its own threads
+        if len(self._threads) == self.workers and all(t.is_alive() for t in self._threads):
+            return
+        with self._wakeup:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._work, name=f"whatsapp-outbox-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Stop the workers once their current message is recorded"""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._stopping = False
+
+    def _work(self):
+        while not self._stopping:
+            try:
+                notification = self.store.claim(self.lease_seconds)
+            except Exception as e:
+                print(f"❌ Outbox claim failed: {e}")
+                notification = None
+
+            if notification is None:
+                try:
+                    # Picks up bookings whose relay was cut short
+                    if self.relay():
+                        continue
+                except Exception as e:
+                    print(f"❌ Outbox relay failed: {e}")
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(self.poll_interval)
+                continue
+
+            try:
+                result = self.client.send_message(notification["to"], self.from_number,
+                                                  notification["body"],
+                                                  idempotency_key=notification["id"])
+                outcome, detail = "sent", result.get("sid")
+            except TwilioError as e:
+                outcome, detail = ("retry" if e.retryable else "dead"), str(e)
+            except Exception as e:
+                outcome, detail = "retry", str(e)
+
+            try:
+                self._record(notification, outcome, detail)
+            except Exception as e:
+                # The lease runs out and the notification is picked up again
+                print(f"❌ Outbox update failed: {e}")
+
+    def _record(self, notification: Dict, outcome: str, detail: Optional[str]):
+        appointment_id = notification["appointment_id"]
+        if outcome == "retry" and notification["attempts"] >= self.max_attempts:
+            outcome = "dead"
+
+        if outcome == "sent":
+            if self.store.finish(notification, "sent", sid=detail):
+                self.stats["sent"] += 1
+                print(f"✅ WhatsApp notification sent for {appointment_id}: {detail}")
+        elif outcome == "retry":
+            if self.store.finish(notification, "pending", last_error=detail,
+                                 next_attempt_at=time.time() + self._backoff(notification["attempts"])):
+                self.stats["retries"] += 1
+        elif self.store.finish(notification, "dead", last_error=detail):
+            self.stats["dead"] += 1
+            print(f"❌ WhatsApp notification for {appointment_id} failed for good: {detail}")
+
+    def _backoff(self, attempts: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+
+
+# Global instance
+whatsapp_outbox = NotificationOutbox(
+    OutboxStore(os.getenv("WHATSAPP_OUTBOX_PATH", "data/notification_outbox.db")),
+    TwilioClient.from_env(),
+    os.getenv("TWILIO_WHATSAPP_NUMBER"),
+    workers=int(os.getenv("WHATSAPP_WORKERS", "2")),
+    source=appointment_store,
+)
@@ -4,14 +4,25 @@ Handles OTP generation, verification, and SMS delivery
 """
 
 import hashlib
+import heapq
+import math
 import os
 import random
+import threading
 import time
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
+
+from records import OTPRecord
+from shared_store import SharedStore, shared_store
+from sms_dispatcher import sms_dispatcher
 
 # OTP Storage (In production, use Redis or database)
-otp_store: Dict[str, Dict] = {}
+otp_store: Dict[str, OTPRecord] = {}
+
+# TTL index over otp_store: min-heap of (expires_at, phone). Entries are
+# never removed in place; a popped entry is stale if the phone has since
+# been re-issued with a later expiry.
+otp_expiry_heap: List[Tuple[float, str]] = []
 
 
 class OTPService:
@@ -20,14 +31,23 @@ class OTPService:
     - Generates secure 6-digit OTPs
     - Handles OTP verification
     - Rate limiting
-    - Expiration management
+    - Expiration management (incremental, via a min-heap TTL index)
+
+    Timestamps are time.monotonic() seconds, so wall-clock changes can't
+    extend or cut short an OTP's lifetime.
+
+    With a shared store, OTPs, send times and attempt counters live there
+    instead so rate limits and attempt caps hold across all workers.
     """
 
-    def __init__(self):
+    def __init__(self, store: Optional[SharedStore] = None):
+        self.store = store
         self.otp_length = 6
         self.otp_expiry_minutes = 5
         self.max_attempts = 3
         self.rate_limit_seconds = 60  # 1 OTP per minute
+        self.clock = time.monotonic
+        self._lock = threading.RLock()
 
     def generate_otp(self, phone: str) -> Dict:
         """
@@ -40,47 +60,82 @@ class OTPService:
             dict with status and message
         """
         try:
-            # Check rate limiting
-            if phone in otp_store:
-                last_sent = otp_store[phone].get("sent_at")
-                if last_sent:
-                    time_diff = (datetime.now() - last_sent).seconds
+            if self.store is not None:
+                return self._generate_shared(phone)
+
+            with self._lock:
+                now = self.clock()
+                self.purge_expired(now)
+
+                # Check rate limiting
+                if phone in otp_store:
+                    time_diff = now - otp_store[phone].sent_at
                     if time_diff < self.rate_limit_seconds:
-                        remaining = self.rate_limit_seconds - time_diff
+                        remaining = math.ceil(self.rate_limit_seconds - time_diff)
                         return {
                             "success": False,
                             "message": f"Please wait {remaining} seconds before requesting new OTP",
+                            "retry_after": remaining,
                         }
 
-            # Generate 6-digit OTP
-            otp = "".join([str(random.randint(0, 9)) for _ in range(self.otp_length)])
+                # Generate 6-digit OTP
+                otp = "".join([str(random.randint(0, 9)) for _ in range(self.otp_length)])
 
-            # Calculate expiry time
-            expiry_time = datetime.now() + timedelta(minutes=self.otp_expiry_minutes)
+                # Calculate expiry time
+                expiry_time = now + self.otp_expiry_minutes * 60
 
-            # Store OTP with metadata
-            otp_store[phone] = {
-                "otp": self._hash_otp(otp),
-                "plain_otp": otp,  # For demo - Remove in production
-                "sent_at": datetime.now(),
-                "expires_at": expiry_time,
-                "attempts": 0,
-                "verified": False,
-            }
+                # Store OTP with metadata
+                otp_store[phone] = OTPRecord(self._hash_otp(otp), otp, now, expiry_time)
+                heapq.heappush(otp_expiry_heap, (expiry_time, phone))
+
+            return self._deliver(phone, otp)
 
-            # In production, send SMS here
-            sms_sent = self._send_sms(phone, otp)
+        except Exception as e:
+            return {"success": False, "message": f"Failed to generate OTP: {str(e)}"}
 
+    def _deliver(self, phone: str, otp: str) -> Dict:
+        # Queued, not sent: delivery happens off the request thread
+        sms_sent = self._send_sms(phone, otp)
+
+        return {
+            "success": True,
+            "message": "OTP sent successfully",
+            "otp": otp,  # For demo - Remove in production
+            "expires_in": self.otp_expiry_minutes * 60,  # seconds
+            "phone": phone,
+        }
+
+    def _generate_shared(self, phone: str) -> Dict:
+        now = time.time()
+
+        # Rate limit: the send marker only exists for rate_limit_seconds
+        if not self.store.add(f"otp_sent:{phone}", {"sent_at": now}, self.rate_limit_seconds):
+            marker = self.store.get(f"otp_sent:{phone}")
+            time_diff = now - marker["sent_at"] if marker else 0
+            remaining = max(1, math.ceil(self.rate_limit_seconds - time_diff))
             return {
-                "success": True,
-                "message": "OTP sent successfully",
-                "otp": otp,  # For demo - Remove in production
-                "expires_in": self.otp_expiry_minutes * 60,  # seconds
-                "phone": phone,
+                "success": False,
+                "message": f"Please wait {remaining} seconds before requesting new OTP",
+                "retry_after": remaining,
             }
 
-        except Exception as e:
-            return {"success": False, "message": f"Failed to generate OTP: {str(e)}"}
+        otp = "".join([str(random.randint(0, 9)) for _ in range(self.otp_length)])
+        expiry_seconds = self.otp_expiry_minutes * 60
+
+        self.store.set(
+            f"otp:{phone}",
+            {
+                "otp": self._hash_otp(otp),
+                "plain_otp": otp,  # For demo - Remove in production
+                "sent_at": now,
+                "expires_at": now + expiry_seconds,
+            },
+            expiry_seconds,
+        )
+        self.store.delete(f"otp_attempts:{phone}")
+        self.store.delete(f"otp_used:{phone}")
+
+        return self._deliver(phone, otp)
 
     def verify_otp(self, phone: str, otp: str) -> Dict:
         """
@@ -94,69 +149,124 @@ class OTPService:
             dict with verification status
         """
         try:
-            # Check if OTP exists
-            if phone not in otp_store:
-                return {
-                    "success": False,
-                    "message": "No OTP found. Please request a new one.",
-                }
-
-            otp_data = otp_store[phone]
+            if self.store is not None:
+                return self._verify_shared(phone, otp)
+
+            with self._lock:
+                now = self.clock()
+                self.purge_expired(now)
+
+                # Check if OTP exists
+                if phone not in otp_store:
+                    return {
+                        "success": False,
+                        "message": "No OTP found. Please request a new one.",
+                    }
+
+                otp_data = otp_store[phone]
+
+                # Check if already verified
+                if otp_data.verified:
+                    return {
+                        "success": False,
+                        "message": "OTP already used. Please request a new one.",
+                    }
+
+                # Check attempts
+                if otp_data.attempts >= self.max_attempts:
+                    # Delete OTP after max attempts
+                    del otp_store[phone]
+                    return {
+                        "success": False,
+                        "message": "Maximum attempts exceeded. Please request a new OTP.",
+                    }
+
+                # Check expiry
+                if now > otp_data.expires_at:
+                    del otp_store[phone]
+                    return {
+                        "success": False,
+                        "message": "OTP expired. Please request a new one.",
+                    }
+
+                # Increment attempts
+                otp_data.attempts += 1
+
+                # Verify OTP
+                if self._hash_otp(otp) == otp_data.otp_hash:
+                    # Mark as verified
+                    otp_data.verified = True
+                    return {
+                        "success": True,
+                        "message": "OTP verified successfully",
+                        "phone": phone,
+                    }
+                else:
+                    remaining_attempts = self.max_attempts - otp_data.attempts
+                    return {
+                        "success": False,
+                        "message": f"Invalid OTP. {remaining_attempts} attempts remaining.",
+                    }
 
-            # Check if already verified
-            if otp_data.get("verified"):
-                return {
-                    "success": False,
-                    "message": "OTP already used. Please request a new one.",
-                }
+        except Exception as e:
+            return {"success": False, "message": f"Verification failed: {str(e)}"}
 
-            # Check attempts
-            if otp_data["attempts"] >= self.max_attempts:
-                # Delete OTP after max attempts
-                del otp_store[phone]
-                return {
-                    "success": False,
-                    "message": "Maximum attempts exceeded. Please request a new OTP.",
-                }
+    def _verify_shared(self, phone: str, otp: str) -> Dict:
+        otp_data = self.store.get(f"otp:{phone}")
+        if otp_data is None:
+            return {
+                "success": False,
+                "message": "No OTP found. Please request a new one.",
+            }
 
-            # Check expiry
-            if datetime.now() > otp_data["expires_at"]:
-                del otp_store[phone]
-                return {
-                    "success": False,
-                    "message": "OTP expired. Please request a new one.",
-                }
+        if self.store.get(f"otp_used:{phone}") is not None:
+            return {
+                "success": False,
+                "message": "OTP already used. Please request a new one.",
+            }
 
-            # Increment attempts
-            otp_store[phone]["attempts"] += 1
+        # Atomic counter so concurrent guesses on different workers all count
+        remaining_ttl = max(1.0, otp_data["expires_at"] - time.time())
+        attempts = self.store.incr(f"otp_attempts:{phone}", remaining_ttl)
+        if attempts > self.max_attempts:
+            self.store.delete(f"otp:{phone}")
+            return {
+                "success": False,
+                "message": "Maximum attempts exceeded. Please request a new OTP.",
+            }
 
-            # Verify OTP
-            if self._hash_otp(otp) == otp_data["otp"]:
-                # Mark as verified
-                otp_store[phone]["verified"] = True
-                return {
-                    "success": True,
-                    "message": "OTP verified successfully",
-                    "phone": phone,
-                }
-            else:
-                remaining_attempts = self.max_attempts - otp_data["attempts"]
+        if self._hash_otp(otp) == otp_data["otp"]:
+            # Only one worker can claim the OTP
+            if not self.store.add(f"otp_used:{phone}", {"used_at": time.time()}, remaining_ttl):
                 return {
                     "success": False,
-                    "message": f"Invalid OTP. {remaining_attempts} attempts remaining.",
+                    "message": "OTP already used. Please request a new one.",
                 }
+            return {
+                "success": True,
+                "message": "OTP verified successfully",
+                "phone": phone,
+            }
 
-        except Exception as e:
-            return {"success": False, "message": f"Verification failed: {str(e)}"}
+        remaining_attempts = self.max_attempts - attempts
+        return {
+            "success": False,
+            "message": f"Invalid OTP. {remaining_attempts} attempts remaining.",
+        }
 
     def resend_otp(self, phone: str) -> Dict:
         """Resend OTP to phone number"""
-        # Delete old OTP
-        if phone in otp_store:
-            del otp_store[phone]
+        if self.store is not None:
+            for prefix in ("otp", "otp_sent", "otp_attempts", "otp_used"):
+                self.store.delete(f"{prefix}:{phone}")
+            return self.generate_otp(phone)
 
-        # Generate new OTP
-        return self.generate_otp(phone)
+        with self._lock:
+            # Delete old OTP (its heap entry is dropped lazily)
+            otp_store.pop(phone, None)
+
+            # Generate new OTP
+            return self.generate_otp(phone)
 
     def _hash_otp(self, otp: str) -> str:
         """Hash OTP for secure storage"""
@@ -164,44 +274,47 @@ class OTPService:
 
     def _send_sms(self, phone: str, otp: str) -> bool:
         """
-        Send SMS with OTP
+        Queue the OTP SMS for background delivery
 
-        In production, integrate with:
-        - Twilio
-        - MSG91
-        - AWS SNS
-        - Firebase Cloud Messaging
+        Returns as soon as the message is queued; the dispatcher's workers
+        talk to the provider (console, Twilio, ...) with retries.
         """
         try:
-            # Demo mode - just print
-            print(
-                f"📱 SMS to {phone}: Your MedicSense AI OTP is {otp}. Valid for {self.otp_expiry_minutes} minutes."
+            sms_dispatcher.send(
+                phone,
+                f"Your MedicSense AI OTP is {otp}. Valid for {self.otp_expiry_minutes} minutes.",
             )
-
-            # Production code example (Twilio):
-            # from twilio.rest import Client
-            # client = Client(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
-            # message = client.messages.create(
-            #     body=f"Your MedicSense AI OTP is {otp}. Valid for {self.otp_expiry_minutes} minutes.",
-            #     from_=os.getenv('TWILIO_PHONE_NUMBER'),
-            #     to=phone
-            # )
-
             return True
         except Exception as e:
             print(f"❌ SMS send failed: {e}")
             return False
 
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """
+        Remove OTPs whose expiry has passed
+
+        Pops the TTL heap only while its head is expired, so each call does
+        O(expired) work instead of scanning the whole store.
+        """
+        if self.store is not None:
+            return self.store.purge_expired()
+
+        if now is None:
+            now = self.clock()
+        removed = 0
+        with self._lock:
+            while otp_expiry_heap and otp_expiry_heap[0][0] <= now:
+                expires_at, phone = heapq.heappop(otp_expiry_heap)
+                entry = otp_store.get(phone)
+                if entry is not None and entry.expires_at <= now:
+                    del otp_store[phone]
+                    removed += 1
+        return removed
+
     def cleanup_expired(self):
         """Clean up expired OTPs"""
-        now = datetime.now()
-        expired_phones = [
-            phone for phone, data in otp_store.items() if now > data["expires_at"]
-        ]
-        for phone in expired_phones:
-            del otp_store[phone]
-        return len(expired_phones)
+        return self.purge_expired()
 
 
 # Global instance
-otp_service = OTPService()
+otp_service = OTPService(store=shared_store)
@@ -0,0 +1,237 @@
+"""
+Rate Limiter for MedicSense AI
+Token buckets keyed by session / phone / IP with per-route policies
+
+Each policy refills `rate` tokens per second up to `burst`; a request
+spends one token or is rejected with the seconds until one is available.
+Abuse limits are keyed on what a client can't choose freely - its signed-in
+session or its IP - never on request body fields; the per-phone OTP limits,
+which do read the body, always sit next to a per-IP ceiling.
+
+Backends:
+- MemoryBuckets        dict of buckets in this process (default)
+- SharedMemoryBuckets  fixed-size table in an mmap'd file, shared by every
+                       worker on the host (set RATE_LIMIT_SHM_PATH)
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from auth_manager import auth_manager
+
+load_dotenv()
+
+
+class RatePolicy:
+    """Refill rate (tokens/second), bucket size and how to key a request"""
+
+    __slots__ = ("name", "rate", "burst", "key_func")
+
+    def __init__(self, name: str, per_minute: float, burst: int, key_func: Callable):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.key_func = key_func
+
+
+class MemoryBuckets:
+    """In-process token buckets: O(1) dict lookup and arithmetic per hit"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, list] = {}  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Spend one token; returns (allowed, seconds until retry)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                self._buckets[key] = [burst - 1.0, now]
+                return True, 0.0
+
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1.0:
+                bucket[0] = tokens - 1.0
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (1.0 - tokens) / rate
+
+    def _prune(self, now: float):
+        # A bucket idle long enough to be full again is the same as no bucket.
+        # Refill time is bounded by the slowest policy, so an hour is safe.
+        idle = [key for key, (_, updated_at) in self._buckets.items() if now - updated_at > 3600]
+        for key in idle:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+
+class SharedMemoryBuckets:
+    """
+    Token buckets in a shared mmap'd file
+
+    The table is split into groups of GROUP_SIZE slots; a key hashes to one
+    group and takes a free, matching or idle slot in it. Each group has its
+    own byte-range lock, so workers only contend on the same group. Uses
+    time.monotonic(), which is host-wide on Linux.
+    """
+
+    SLOT = struct.Struct("<Qdd")  # key fingerprint, tokens, updated_at
+    GROUP_SIZE = 4
+    GROUP = struct.Struct("<" + "Qdd" * GROUP_SIZE)
+
+    def __init__(self, path: str, slots: int = 65_536):
+        self.path = path
+        self.groups = max(1, slots // self.GROUP_SIZE)
+        size = self.groups * self.GROUP_SIZE * self.SLOT.size
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # fcntl locks are per process, so threads also need a local lock
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Spend one token; returns (allowed, seconds until retry)"""
+        now = time.monotonic() if now is None else now
+        # Stable across processes (unlike hash()); cheap enough for every request
+        data = key.encode()
+        fingerprint = (zlib.crc32(data) << 32 | zlib.adler32(data)) or 1
+        group_bytes = self.GROUP.size
+        base = (fingerprint % self.groups) * group_bytes
+
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, group_bytes, base, os.SEEK_SET)
+            try:
+                slot, tokens = self._find_slot(base, fingerprint, burst, now, rate)
+                if tokens >= 1.0:
+                    self.SLOT.pack_into(self._map, slot, fingerprint, tokens - 1.0, now)
+                    return True, 0.0
+                self.SLOT.pack_into(self._map, slot, fingerprint, tokens, now)
+                return False, (1.0 - tokens) / rate
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, group_bytes, base, os.SEEK_SET)
+
+    def _find_slot(self, base: int, fingerprint: int, burst: int, now: float, rate: float):
+        # Prefer this key's slot, else an empty one, else the longest idle
+        fields = self.GROUP.unpack_from(self._map, base)
+        owners = fields[0::3]
+        if fingerprint in owners:
+            i = owners.index(fingerprint)
+            tokens, updated_at = fields[3 * i + 1], fields[3 * i + 2]
+            return base + i * self.SLOT.size, min(burst, tokens + (now - updated_at) * rate)
+        if 0 in owners:
+            return base + owners.index(0) * self.SLOT.size, float(burst)
+        updated = fields[2::3]
+        return base + updated.index(min(updated)) * self.SLOT.size, float(burst)
+
+
+def client_ip(req) -> str:
+    return req.remote_addr or "unknown"
+
+
+def session_or_ip(req) -> str:
+    """The signed-in user (Authorization: Bearer <session token>), else the client IP"""
+    user_id = auth_manager.user_from_authorization(req.headers.get("Authorization"))
+    return f"user:{user_id}" if user_id is not None else f"ip:{client_ip(req)}"
+
+
+def phone_or_ip(req) -> str:
+    # Body field, so only for protecting the phone itself; pair with an IP policy
+    data = req.get_json(silent=True) or {}
+    phone = data.get("phone") if isinstance(data, dict) else None
+    return f"phone:{phone}" if isinstance(phone, str) and phone else f"ip:{client_ip(req)}"
+
+
+def ip_only(req) -> str:
+    return f"ip:{client_ip(req)}"
+
+
+# A phone gets one OTP a minute; one client gets a few, whatever phones it names
+OTP_SEND = (
+    RatePolicy("otp-send", per_minute=1, burst=1, key_func=phone_or_ip),
+    RatePolicy("otp-send-ip", per_minute=5, burst=5, key_func=ip_only),
+)
+OTP_VERIFY = (
+    RatePolicy("otp-verify", per_minute=10, burst=5, key_func=phone_or_ip),
+    RatePolicy("otp-verify-ip", per_minute=20, burst=10, key_func=ip_only),
+)
+CHAT = (RatePolicy("chat", per_minute=20, burst=5, key_func=session_or_ip),)
+IMAGE = (RatePolicy("image", per_minute=6, burst=3, key_func=session_or_ip),)
+
+# Route rule -> policies; a request must pass all of them. Routes not listed
+# here are not limited. Send and resend share buckets, as do both OTP APIs.
+DEFAULT_POLICIES: Dict[str, Tuple[RatePolicy, ...]] = {
+    "/api/chat": CHAT,
+    "/api/chat/message": CHAT,
+    "/api/analyze-injury-image": IMAGE,
+    "/api/image/analyze": IMAGE,
+    "/api/analyze-injury-images/batch": (
+        RatePolicy("image-batch", per_minute=2, burst=1, key_func=session_or_ip),
+    ),
+    "/api/auth/send-otp": OTP_SEND,
+    "/api/auth/otp/send": OTP_SEND,
+    "/api/auth/otp/resend": OTP_SEND,
+    "/api/auth/verify-otp": OTP_VERIFY,
+    "/api/auth/otp/verify": OTP_VERIFY,
+    "/api/whatsapp/broadcast": (
+        RatePolicy("broadcast", per_minute=2, burst=2, key_func=session_or_ip),
+    ),
+}
+
+
+class RateLimiter:
+    """Per-route token-bucket limiting for Flask requests"""
+
+    def __init__(self, backend=None, policies: Optional[Dict[str, Tuple[RatePolicy, ...]]] = None,
+                 enabled: bool = True):
+        self.backend = backend or MemoryBuckets()
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.enabled = enabled
+        self.rejected = 0
+
+    def check(self, req) -> Tuple[bool, float]:
+        """Returns (allowed, retry_after_seconds) for a Flask request"""
+        if not self.enabled or req.url_rule is None:
+            return True, 0.0
+        policies = self.policies.get(req.url_rule.rule)
+        if not policies:
+            return True, 0.0
+
+        # Every policy is charged, so rejected attempts still count against the IP
+        allowed, retry_after = True, 0.0
+        for policy in policies:
+            key = f"{policy.name}:{policy.key_func(req)}"
+            ok, wait = self.backend.hit(key, policy.rate, policy.burst)
+            if not ok:
+                allowed, retry_after = False, max(retry_after, wait)
+        if not allowed:
+            self.rejected += 1
+        return allowed, retry_after
+
+
+def create_rate_limiter() -> RateLimiter:
+    enabled = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+    shm_path = os.getenv("RATE_LIMIT_SHM_PATH")
+    if shm_path:
+        print(f"🚦 Rate limiter: shared memory at {shm_path}")
+        return RateLimiter(SharedMemoryBuckets(shm_path), enabled=enabled)
+    return RateLimiter(MemoryBuckets(), enabled=enabled)
+
+
+# Global instance
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,212 @@
+"""
+Compact Record Types for MedicSense AI
+__slots__ classes for the hot in-memory structures (sessions, OTPs,
+appointments)
+
+A slotted record has no per-instance __dict__ and shares its field names
+with the class, so it costs a fraction of an equivalent dict. Timestamps
+are plain numbers; records turn into dicts only at the JSON boundary
+(to_dict).
+
+Memory report: python records.py [--count N]
+"""
+
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+
+def _mono_now() -> int:
+    """Whole seconds on the monotonic clock"""
+    return int(time.monotonic())
+
+
+class Session:
+    """Compact in-memory session (integer monotonic timestamps)"""
+
+    __slots__ = ("token", "user_id", "user_data", "created_at", "expires_at")
+
+    def __init__(self, token: str, user_id: str, user_data: Dict,
+                 created_at: int, expires_at: int):
+        self.token = token
+        self.user_id = user_id
+        self.user_data = user_data
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+    def __getitem__(self, key):
+        # Dict-style access for callers written against the old session dicts
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly view; timestamps are wall-clock epoch seconds"""
+        offset = int(time.time()) - _mono_now()
+        return {
+            "token": self.token,
+            "user_id": self.user_id,
+            "user_data": self.user_data,
+            "created_at": self.created_at + offset,
+            "expires_at": self.expires_at + offset,
+        }
+
+
+class OTPRecord:
+    """
+    One issued OTP (time.monotonic() timestamps)
+
+    Kept as floats rather than whole seconds so the resend window is exact.
+    """
+
+    __slots__ = ("otp_hash", "plain_otp", "sent_at", "expires_at", "attempts", "verified")
+
+    def __init__(self, otp_hash: str, plain_otp: str, sent_at: float, expires_at: float):
+        self.otp_hash = otp_hash
+        self.plain_otp = plain_otp  # For demo - Remove in production
+        self.sent_at = sent_at
+        self.expires_at = expires_at
+        self.attempts = 0
+        self.verified = False
+
+
+class Appointment:
+    """A booked appointment (created_at in integer epoch seconds)"""
+
+    __slots__ = ("id", "user_id", "name", "phone", "email", "doctor_id", "date",
+                 "time", "reason", "type", "status", "created_at")
+
+    def __init__(self, id: str, user_id: str, name: str = "", phone: str = "",
+                 email: str = "", doctor_id: str = "", date: str = "", time: str = "",
+                 reason: str = "", type: str = "in-person", status: str = "confirmed",
+                 created_at: Optional[int] = None):
+        self.id = id
+        self.user_id = user_id
+        self.name = name
+        self.phone = phone
+        self.email = email
+        self.doctor_id = doctor_id
+        self.date = date
+        self.time = time
+        self.reason = reason
+        self.type = type
+        self.status = status
+        self.created_at = int(datetime.now().timestamp()) if created_at is None else created_at
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Appointment":
+        """Build from the JSON shape stored in appointments.json"""
+        created_at = data.get("created_at")
+        if isinstance(created_at, str):
+            try:
+                created_at = int(datetime.fromisoformat(created_at).timestamp())
+            except ValueError:
+                created_at = None
+        return cls(
+            id=data["id"],
+            user_id=data.get("userId", "anonymous"),
+            name=data.get("name", ""),
+            phone=data.get("phone", ""),
+            email=data.get("email", ""),
+            doctor_id=data.get("doctorId", ""),
+            date=data.get("date", ""),
+            time=data.get("time", ""),
+            reason=data.get("reason", ""),
+            type=data.get("type", "in-person"),
+            status=data.get("status", "confirmed"),
+            created_at=created_at,
+        )
+
+    def to_dict(self) -> Dict:
+        """JSON shape used by the API and appointments.json"""
+        return {
+            "id": self.id,
+            "userId": self.user_id,
+            "name": self.name,
+            "phone": self.phone,
+            "email": self.email,
+            "doctorId": self.doctor_id,
+            "date": self.date,
+            "time": self.time,
+            "reason": self.reason,
+            "type": self.type,
+            "status": self.status,
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+        }
+
+
+def _measure(build, count: int) -> float:
+    """Bytes allocated per entry while holding `count` built entries"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entries = {str(i): build(i) for i in range(count)}
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del entries
+    return (after - before) / count
+
+
+def memory_report(count: int = 100_000) -> Dict[str, Dict[str, float]]:
+    """Bytes per entry (dict vs record), keyed storage included"""
+    now_dt, now = datetime.now(), time.monotonic()
+
+    def session_dict(i):
+        return {"token": f"tok{i}", "user_id": f"user_{i:016x}", "user_data": {},
+                "created_at": now_dt, "expires_at": now_dt + timedelta(hours=24)}
+
+    def session_record(i):
+        mono = int(now)
+        return Session(f"tok{i}", f"user_{i:016x}", {}, mono, mono + 86400)
+
+    def otp_dict(i):
+        return {"otp": "a" * 64, "plain_otp": f"{i % 1000000:06d}", "sent_at": now + i,
+                "expires_at": now + i + 300, "attempts": 0, "verified": False}
+
+    def otp_record(i):
+        return OTPRecord("a" * 64, f"{i % 1000000:06d}", now + i, now + i + 300)
+
+    def appointment_dict(i):
+        return {"id": f"APT{i:08X}", "userId": f"user_{i % 5000}", "name": "Patient",
+                "phone": "+910000000000", "email": "", "doctorId": "dr_kumar",
+                "date": "2025-01-01", "time": "10:00", "reason": "Checkup",
+                "type": "in-person", "status": "confirmed",
+                "created_at": now_dt.isoformat()}
+
+    def appointment_record(i):
+        return Appointment(f"APT{i:08X}", f"user_{i % 5000}", "Patient", "+910000000000",
+                           "", "dr_kumar", "2025-01-01", "10:00", "Checkup",
+                           created_at=int(now_dt.timestamp()))
+
+    report = {}
+    for name, as_dict, as_record in (
+        ("session", session_dict, session_record),
+        ("otp", otp_dict, otp_record),
+        ("appointment", appointment_dict, appointment_record),
+    ):
+        dict_bytes = _measure(as_dict, count)
+        record_bytes = _measure(as_record, count)
+        report[name] = {
+            "dict_bytes": round(dict_bytes, 1),
+            "record_bytes": round(record_bytes, 1),
+            "dict_mb_per_million": round(dict_bytes * 1e6 / 2**20, 1),
+            "record_mb_per_million": round(record_bytes * 1e6 / 2**20, 1),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dict vs slotted record memory report")
+    parser.add_argument("--count", type=int, default=100_000, help="entries per measurement")
+    args = parser.parse_args()
+
+    print(f"{'record':<12} {'dict B':>8} {'slots B':>8} {'dict MB/1M':>11} {'slots MB/1M':>12}")
+    for name, row in memory_report(args.count).items():
+        print(f"{name:<12} {row['dict_bytes']:>8} {row['record_bytes']:>8} "
+              f"{row['dict_mb_per_million']:>11} {row['record_mb_per_million']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Response Cache for MedicSense AI
+Pre-serialized JSON for endpoints whose data rarely changes
+
+A cached response is serialized once per data version and kept as JSON
+bytes, gzip bytes and a strong ETag for each. Serving it builds no JSON:
+a request whose If-None-Match matches gets a bodyless 304, anything else
+gets the stored bytes (gzipped when the client accepts it). Cache-Control
+is no-cache, so browsers revalidate on every poll and mostly receive 304s.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from flask import Response, current_app, request
+
+# Smaller bodies are sent uncompressed; gzip would barely help
+MIN_GZIP_BYTES = 512
+
+
+class CachedResponse:
+    """One serialized response in identity and gzip form"""
+
+    __slots__ = ("body", "gzipped", "etag", "gzip_etag", "status")
+
+    def __init__(self, payload: Any, status: int = 200):
+        # Exactly the bytes jsonify() would send
+        self.body = current_app.json.response(payload).get_data()
+        digest = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self.etag = digest
+        self.status = status
+        if len(self.body) >= MIN_GZIP_BYTES:
+            # mtime=0 keeps the bytes (and so the ETag) identical across workers
+            self.gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+            self.gzip_etag = f"{digest}-gzip"
+        else:
+            self.gzipped = None
+            self.gzip_etag = None
+
+    def to_response(self) -> Response:
+        """304, gzip or identity response for the current request"""
+        use_gzip = self.gzipped is not None and request.accept_encodings.quality("gzip") > 0
+        etag = self.gzip_etag if use_gzip else self.etag
+
+        if request.if_none_match and (
+            request.if_none_match.contains_weak(self.etag)
+            or (self.gzip_etag and request.if_none_match.contains_weak(self.gzip_etag))
+        ):
+            response = Response(status=304)
+        else:
+            response = Response(self.gzipped if use_gzip else self.body, status=self.status,
+                                mimetype="application/json")
+            if use_gzip:
+                response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+class ResponseCache:
+    """Versioned CachedResponse entries, least recently used evicted first"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()  # key -> (version, CachedResponse)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], Any]) -> CachedResponse:
+        """The cached response for key, rebuilt from build() when version moved on"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        cached = CachedResponse(build())
+        with self._lock:
+            self._entries[key] = (version, cached)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def respond(self, key: Hashable, version: Hashable, build: Callable[[], Any]) -> Response:
+        return self.get(key, version, build).to_response()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Global instance
+response_cache = ResponseCache()
@@ -0,0 +1,396 @@
+"""
+Schedule Engine for MedicSense AI
+Per-doctor slot bitmaps and conflict-free slot reservations
+
+Each doctor's day is a bitmask over SLOT_TIMES: bit i set = slot i taken.
+Free slots for a day are `template & ~booked`, so a date-range query is a
+few integer ops per day. Masks are kept in 64-day pages (array of uint32),
+allocated only for periods that have bookings.
+
+Reservations live in SQLite (SCHEDULE_DB) with PRIMARY KEY
+(doctor_id, day, slot): when two workers race for the same slot exactly
+one INSERT succeeds. Every change is also appended to reservation_log;
+a worker notices other workers' commits through PRAGMA data_version and
+replays just the new log entries into its bitmaps. Each worker trims the
+log every TRIM_EVERY of its own writes.
+
+Only known doctors (set_doctors) can be booked, and never in the past.
+"""
+
+import datetime
+import os
+from array import array
+from functools import lru_cache
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 30-minute slots, 09:00-16:30
+SLOT_TIMES = [f"{hour:02d}:{minute:02d}" for hour in range(9, 17) for minute in (0, 30)]
+SLOT_INDEX = {slot: i for i, slot in enumerate(SLOT_TIMES)}
+
+# Default hours: mornings 09:00-11:30 and afternoons 14:00-16:30, Mon-Fri
+DEFAULT_SLOTS = ["09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
+                 "14:00", "14:30", "15:00", "15:30", "16:00", "16:30"]
+PAGE_DAYS = 64
+_EMPTY_PAGE = bytes(array("I", [0]).itemsize * PAGE_DAYS)
+
+# Doctors on the booking form (frontend/index.html); doctors_db ids are added at load
+BOOKING_FORM_DOCTORS = ["dr_tushar", "dr_aakash", "dr_sharma", "dr_patel",
+                        "dr_verma", "dr_singh", "dr_kumar"]
+
+# Log entries kept for lagging workers, and how often each worker trims
+LOG_KEEP = 10_000
+TRIM_EVERY = 1000
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class SlotUnavailableError(Exception):
+    """The slot is outside the doctor's hours or already reserved"""
+
+
+class InvalidBookingError(ValueError):
+    """Unknown doctor, or a slot that has already passed"""
+
+def slot_mask(slots: Iterable[str]) -> int:
+    mask = 0
+    for slot in slots:
+        mask |= 1 << SLOT_INDEX[slot]
+    return mask
+
+
+def mask_slots(mask: int) -> List[str]:
+    """Slot times for the set bits of a mask, in order"""
+    return list(_mask_slots(mask))
+
+
+@lru_cache(maxsize=4096)
+def _mask_slots(mask: int) -> Tuple[str, ...]:
+    # Days share a handful of distinct masks, so this is nearly always a hit
+    slots = []
+    while mask:
+        low = mask & -mask
+        slots.append(SLOT_TIMES[low.bit_length() - 1])
+        mask ^= low
+    return tuple(slots)
+
+
+def parse_slot(value: str) -> Optional[str]:
+    """Normalize "14:00" / "02:00 PM" to a SLOT_TIMES entry (None if invalid)"""
+    value = (value or "").strip().upper()
+    for fmt in ("%H:%M", "%I:%M %p", "%I:%M%p"):
+        try:
+            slot = datetime.datetime.strptime(value, fmt).strftime("%H:%M")
+        except ValueError:
+            continue
+        return slot if slot in SLOT_INDEX else None
+    return None
+
+
+class ScheduleEngine:
+    """Availability bitmaps backed by an SQLite reservation table"""
+
+    def __init__(self, path: str, default_weekdays: Iterable[int] = range(5),
+                 default_slots: Iterable[str] = DEFAULT_SLOTS,
+                 doctors: Optional[Iterable[str]] = None):
+        self.path = path
+        # None accepts any doctor id
+        self.doctors = None if doctors is None else set(doctors)
+        default_mask = slot_mask(default_slots)
+        weekdays = set(default_weekdays)
+        self.default_template = [default_mask if day in weekdays else 0 for day in range(7)]
+        self.templates: Dict[str, List[int]] = {}  # doctor_id -> per-weekday mask
+        self.booked: Dict[str, Dict[int, array]] = {}  # doctor_id -> {page: day masks}
+
+        self._lock = threading.RLock()
+        self._conn, self.created = self._connect()
+        self._data_version = None
+        self._last_seq = 0
+        self._generation = 0  # bumped on every full reload
+        self._changes: Dict[str, int] = {}  # doctor_id -> bitmap/template change count
+        self._writes = 0  # log entries written by this worker
+        self._load_all()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        created = not os.path.exists(self.path)
+        # One connection per process: data_version only reports other connections' commits
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservations ("
+            " doctor_id TEXT NOT NULL, day INTEGER NOT NULL, slot INTEGER NOT NULL,"
+            " appointment_id TEXT NOT NULL,"
+            " PRIMARY KEY (doctor_id, day, slot)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservation_log ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " doctor_id TEXT NOT NULL, day INTEGER NOT NULL, slot INTEGER NOT NULL,"
+            " reserved INTEGER NOT NULL)"
+        )
+        return conn, created
+
+    # ------------------------------------------------------------------
+    # Keeping the bitmaps in sync with other workers
+
+    def _load_all(self):
+        with self._lock:
+            self.booked = {}
+            self._generation += 1
+            for doctor_id, day, slot in self._conn.execute(
+                "SELECT doctor_id, day, slot FROM reservations"
+            ):
+                self._apply(doctor_id, day, slot, True)
+            self._last_seq = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM reservation_log"
+            ).fetchone()[0]
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def refresh(self):
+        """Apply reservations committed by other workers since the last call"""
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return
+            self._data_version = version
+            self._replay()
+
+    def _replay(self):
+        # Caller holds self._lock
+        rows = self._conn.execute(
+            "SELECT seq, doctor_id, day, slot, reserved FROM reservation_log "
+            "WHERE seq > ? ORDER BY seq",
+            (self._last_seq,),
+        ).fetchall()
+        if rows and rows[0][0] != self._last_seq + 1:
+            # The log was trimmed past our position; start over from the table
+            self._load_all()
+            return
+        for seq, doctor_id, day, slot, reserved in rows:
+            self._apply(doctor_id, day, slot, bool(reserved))
+            self._last_seq = seq
+
+    def _log(self, doctor_id: str, day: int, slot: int, reserved: bool) -> int:
+        """
+        Append a log entry inside the caller's write transaction; its seq
+
+        Entries from other workers are applied first, so once the caller
+        commits it can move _last_seq to this seq and refresh() won't replay
+        our own change.
+        """
+        self._replay()
+        return self._conn.execute(
+            "INSERT INTO reservation_log (doctor_id, day, slot, reserved) VALUES (?, ?, ?, ?)",
+            (doctor_id, day, slot, int(reserved)),
+        ).lastrowid
+
+    def _apply(self, doctor_id: str, day: int, slot: int, reserved: bool):
+        self._changes[doctor_id] = self._changes.get(doctor_id, 0) + 1
+        page_number, offset = divmod(day, PAGE_DAYS)
+        pages = self.booked.setdefault(doctor_id, {})
+        page = pages.get(page_number)
+        if page is None:
+            if not reserved:
+                return
+            page = pages[page_number] = array("I", _EMPTY_PAGE)
+        if reserved:
+            page[offset] |= 1 << slot
+        else:
+            page[offset] &= ~(1 << slot)
+
+    def _logged(self, seq: int, entries: int = 1):
+        # Caller holds self._lock and has committed the entries up to seq
+        self._last_seq = seq
+        before, self._writes = self._writes, self._writes + entries
+        if before // TRIM_EVERY != self._writes // TRIM_EVERY:
+            try:
+                self.trim_log()
+            except sqlite3.Error as e:
+                print(f"⚠️  Reservation log trim failed, will retry: {e}")
+
+    def trim_log(self, keep: int = LOG_KEEP):
+        """Drop old log entries (lagging workers fall back to a full reload)"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM reservation_log WHERE seq <= "
+                "(SELECT COALESCE(MAX(seq), 0) FROM reservation_log) - ?",
+                (keep,),
+            )
+
+    # ------------------------------------------------------------------
+    # Queries
+
+    def set_doctors(self, doctor_ids: Iterable[str]):
+        """Replace the set of doctors that can be booked"""
+        self.doctors = set(doctor_ids)
+
+    def set_template(self, doctor_id: str, weekdays: Iterable[int], slots: Iterable[str]):
+        """Working hours for one doctor (defaults otherwise)"""
+        mask = slot_mask(slots)
+        weekdays = set(weekdays)
+        self.templates[doctor_id] = [mask if day in weekdays else 0 for day in range(7)]
+        self._changes[doctor_id] = self._changes.get(doctor_id, 0) + 1
+
+    def version(self, doctor_id: str) -> Tuple[int, int]:
+        """Changes whenever the doctor's availability may have (for response caches)"""
+        self.refresh()
+        return self._generation, self._changes.get(doctor_id, 0)
+
+    def free_masks(self, doctor_id: str, start: datetime.date, days: int) -> List[int]:
+        """Free-slot bitmask for each day in [start, start + days)"""
+        self.refresh()
+        template = self.templates.get(doctor_id, self.default_template)
+        weekday = start.weekday()
+        week = template[weekday:] + template[:weekday]
+        masks = (week * (days // 7 + 1))[:days]
+
+        pages = self.booked.get(doctor_id)
+        if not pages:
+            return masks
+
+        first = start.toordinal()
+        position = 0
+        while position < days:
+            page_number, offset = divmod(first + position, PAGE_DAYS)
+            count = min(PAGE_DAYS - offset, days - position)
+            page = pages.get(page_number)
+            if page is not None:
+                for i, taken in enumerate(page[offset:offset + count], position):
+                    if taken:
+                        masks[i] &= ~taken
+            position += count
+        return masks
+
+    def free_slots(self, doctor_id: str, start: datetime.date, days: int = 1) -> Dict[str, List[str]]:
+        """{"YYYY-MM-DD": ["09:00", ...]} for days with at least one free slot"""
+        first = start.toordinal()
+        return {
+            datetime.date.fromordinal(first + i).isoformat(): mask_slots(mask)
+            for i, mask in enumerate(self.free_masks(doctor_id, start, days))
+            if mask
+        }
+
+    def working_days(self, doctor_id: str) -> List[str]:
+        template = self.templates.get(doctor_id, self.default_template)
+        return [WEEKDAY_NAMES[day] for day in range(7) if template[day]]
+
+    def working_slots(self, doctor_id: str) -> List[str]:
+        template = self.templates.get(doctor_id, self.default_template)
+        combined = 0
+        for mask in template:
+            combined |= mask
+        return mask_slots(combined)
+
+    # ------------------------------------------------------------------
+    # Reservations
+
+    def reserve(self, doctor_id: str, date: datetime.date, slot_time: str, appointment_id: str):
+        """
+        Atomically take a slot; raises SlotUnavailableError if it can't be
+        had, InvalidBookingError for an unknown doctor or a past slot
+        """
+        if self.doctors is not None and doctor_id not in self.doctors:
+            raise InvalidBookingError(f"Unknown doctor {doctor_id!r}")
+        slot = SLOT_INDEX.get(slot_time)
+        if slot is not None and datetime.datetime.combine(
+            date, datetime.time.fromisoformat(slot_time)
+        ) <= datetime.datetime.now():
+            raise InvalidBookingError(f"{slot_time} on {date.isoformat()} has already passed")
+        template = self.templates.get(doctor_id, self.default_template)
+        if slot is None or not template[date.weekday()] >> slot & 1:
+            raise SlotUnavailableError(f"{slot_time} on {date.isoformat()} is outside the doctor's hours")
+
+        day = date.toordinal()
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                seq = self._log(doctor_id, day, slot, True)
+                self._conn.execute(
+                    "INSERT INTO reservations (doctor_id, day, slot, appointment_id) VALUES (?, ?, ?, ?)",
+                    (doctor_id, day, slot, appointment_id),
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.IntegrityError:
+                self._conn.execute("ROLLBACK")
+                # Someone else holds it; make sure our bitmap knows
+                self._apply(doctor_id, day, slot, True)
+                raise SlotUnavailableError(f"{slot_time} on {date.isoformat()} is already booked")
+            except Exception:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._apply(doctor_id, day, slot, True)
+            self._logged(seq)
+
+    def release(self, doctor_id: str, date: datetime.date, slot_time: str,
+                appointment_id: Optional[str] = None) -> bool:
+        """Free a slot (only if held by appointment_id, when given)"""
+        slot = SLOT_INDEX.get(slot_time)
+        if slot is None:
+            return False
+
+        day = date.toordinal()
+        query = "DELETE FROM reservations WHERE doctor_id = ? AND day = ? AND slot = ?"
+        params: tuple = (doctor_id, day, slot)
+        if appointment_id is not None:
+            query += " AND appointment_id = ?"
+            params += (appointment_id,)
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                released = self._conn.execute(query, params).rowcount == 1
+                if released:
+                    seq = self._log(doctor_id, day, slot, False)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if released:
+                self._apply(doctor_id, day, slot, False)
+                self._logged(seq)
+        return released
+
+    def backfill(self, appointments: Iterable[Tuple[str, datetime.date, str, str]]) -> int:
+        """Record already-booked (doctor_id, date, slot, appointment_id) rows"""
+        added = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            seq = None
+            try:
+                for doctor_id, date, slot_time, appointment_id in appointments:
+                    slot = SLOT_INDEX.get(slot_time)
+                    if slot is None:
+                        continue
+                    day = date.toordinal()
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO reservations (doctor_id, day, slot, appointment_id) "
+                        "VALUES (?, ?, ?, ?)",
+                        (doctor_id, day, slot, appointment_id),
+                    )
+                    if cursor.rowcount:
+                        seq = self._log(doctor_id, day, slot, True)
+                        self._apply(doctor_id, day, slot, True)
+                        added += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if seq is not None:
+                self._logged(seq, added)
+        return added
+
+
+# Global instance
+schedule_engine = ScheduleEngine(os.getenv("SCHEDULE_DB", os.path.join("data", "schedule.db")),
+                                 doctors=BOOKING_FORM_DOCTORS)
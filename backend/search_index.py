@@ -0,0 +1,460 @@
+"""
+Search Index for MedicSense AI
+Type-ahead search over doctors, symptoms and medicines
+
+Built once when the knowledge bases are loaded instead of substring-scanning
+every catalog entry per keystroke. Each collection keeps:
+
+- an inverted index: token -> sorted doc ids, for the complete words of a
+  query
+- two sorted-prefix arrays of (token, doc id) occurrences, one for name
+  tokens and one for every other field; the entries starting with a prefix
+  are one contiguous bisect range
+
+Ranking is by how the last (still being typed) query token matches: a name
+word exactly, a name word by prefix, another field exactly, another field
+by prefix. The prefix arrays are already in that order, so a lookup walks
+them and stops as soon as it has `limit` results.
+
+Misspelled words ("pediatrition") fall back to a trigram index over the
+vocabulary: candidates sharing enough trigrams with the word are reranked
+by edit distance (bounded, so hopeless candidates exit early) and the
+best correction is searched in its place.
+
+Misspelling recall report: python search_index.py --eval [corpus.json]
+"""
+
+import argparse
+import heapq
+import json
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Rank of the last query token's match, best first
+NAME_EXACT, NAME_PREFIX, OTHER_EXACT, OTHER_PREFIX = range(4)
+
+# Ranking one candidate costs about this many prefix-range steps
+RANK_COST = 4
+
+# Vocabulary words scored by edit distance per misspelled query word
+FUZZY_CANDIDATES = 64
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def max_edits(word: str) -> int:
+    """Typos tolerated for a word of this length"""
+    return 1 if len(word) <= 4 else 2 if len(word) <= 10 else 3
+
+
+def trigrams(word: str, prefix: bool = False) -> Set[str]:
+    """Padded trigrams; a prefix has no end marker since the word goes on"""
+    padded = f"$${word}" if prefix else f"$${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_levenshtein(a: str, b: str, bound: int, prefix: bool = False) -> int:
+    """
+    Edit distance from a to b (or to the closest prefix of b), counting a
+    swap of neighbouring letters as one edit; bound + 1 once it is certain
+    to exceed bound
+    """
+    if not prefix and abs(len(a) - len(b)) > bound:
+        return bound + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > bound:
+            return bound + 1
+        before, previous = previous, current
+    distance = min(previous) if prefix else previous[-1]
+    return distance if distance <= bound else bound + 1
+
+
+def _contains(ids: array, doc: int) -> bool:
+    """Membership test on a sorted posting list"""
+    i = bisect_left(ids, doc)
+    return i < len(ids) and ids[i] == doc
+
+
+def _strings(value) -> Iterable[str]:
+    """Every string inside a KB value (str, list, or nested dict)"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item)
+
+
+class _PrefixArray:
+    """Sorted (token, doc id) occurrences; a prefix is one contiguous range"""
+
+    __slots__ = ("tokens", "docs")
+
+    def __init__(self, pairs: List[Tuple[str, int]]):
+        pairs.sort()
+        self.tokens = [token for token, _ in pairs]
+        self.docs = array("I", (doc for _, doc in pairs))
+
+    def range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect_left(self.tokens, prefix)
+        # "\uffff" sorts after every character a token can contain
+        return lo, bisect_left(self.tokens, prefix + "\uffff", lo)
+
+
+class Collection:
+    """Index over one kind of catalog entry"""
+
+    def __init__(self, entries: List[Tuple[str, Iterable[str], object]]):
+        """entries: (name, other searchable strings, result payload)"""
+        intern: Dict[str, str] = {}
+        self.payloads = []
+        self.fields: List[Tuple[frozenset, frozenset]] = []  # (name, other) tokens per doc
+        postings: Dict[str, List[int]] = {}
+        name_pairs, other_pairs = [], []
+
+        for doc_id, (name, others, payload) in enumerate(entries):
+            name_tokens = frozenset(intern.setdefault(t, t) for t in tokenize(name))
+            other_tokens = frozenset(
+                intern.setdefault(t, t) for text in others for t in tokenize(text)
+            ) - name_tokens
+            self.payloads.append(payload)
+            self.fields.append((name_tokens, other_tokens))
+            for token in name_tokens:
+                name_pairs.append((token, doc_id))
+                postings.setdefault(token, []).append(doc_id)
+            for token in other_tokens:
+                other_pairs.append((token, doc_id))
+                postings.setdefault(token, []).append(doc_id)
+
+        self.postings = {token: array("I", sorted(ids)) for token, ids in postings.items()}
+        self.names = _PrefixArray(name_pairs)
+        self.others = _PrefixArray(other_pairs)
+
+        # Trigram -> vocabulary word ids, for correcting misspellings
+        self.vocab = sorted(self.postings)
+        grams: Dict[str, List[int]] = {}
+        for word_id, word in enumerate(self.vocab):
+            for gram in trigrams(word):
+                grams.setdefault(gram, []).append(word_id)
+        self.trigrams = {gram: array("I", ids) for gram, ids in grams.items()}
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def search(self, query: str, limit: int = 5, fuzzy: bool = True) -> List:
+        tokens = tokenize(query)
+        if not tokens or limit <= 0:
+            return []
+        results = self._search(tokens, limit)
+        if len(results) < limit and fuzzy:
+            corrected = self._correct_tokens(tokens, found=bool(results))
+            if corrected != tokens:
+                seen = {id(payload) for payload in results}
+                for payload in self._search(corrected, limit):
+                    if id(payload) not in seen and len(results) < limit:
+                        results.append(payload)
+        return results
+
+    def correct(self, word: str, prefix: bool = False) -> Optional[str]:
+        """Closest vocabulary word (or word starting like it, for a prefix), if any"""
+        bound = max_edits(word)
+        grams = trigrams(word, prefix)
+        counts = Counter()
+        for gram in grams:
+            ids = self.trigrams.get(gram)
+            if ids is not None:
+                counts.update(ids)
+
+        # Each edit destroys at most 3 trigrams (q-gram lemma), so anything
+        # sharing fewer cannot be within the bound. Short words would accept
+        # the whole vocabulary that way; they need two shared trigrams.
+        needed = max(len(grams) - 3 * bound, min(2, len(grams)))
+        candidates = heapq.nlargest(
+            FUZZY_CANDIDATES, [(shared, word_id) for word_id, shared in counts.items() if shared >= needed]
+        )
+        best, best_key = None, None
+        for shared, word_id in candidates:
+            if shared < max(len(grams) - 3 * bound, needed):
+                break
+            candidate = self.vocab[word_id]
+            distance = bounded_levenshtein(word, candidate, bound, prefix)
+            if distance > bound:
+                continue
+            # For a prefix, a whole-word match ("kimm" -> "kim") beats a longer word
+            whole = bounded_levenshtein(word, candidate, bound) if prefix else distance
+            key = (distance, whole, -shared, candidate)
+            if best_key is None or key < best_key:
+                best, best_key = candidate, key
+                bound = distance  # later candidates must do at least as well
+        if best is None:
+            # A swap in a short word ("pian") leaves too few trigrams to match on
+            for i in range(len(word) - 1):
+                swapped = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+                if swapped in self.postings:
+                    return swapped
+        return best
+
+    def _correct_tokens(self, tokens: List[str], found: bool) -> List[str]:
+        """
+        Tokens with unknown words corrected; the prefix too if it matches
+        nothing, or nothing was found (it may be a finished, misspelled word)
+        """
+        *words, prefix = tokens
+        corrected = []
+        i = 0
+        while i < len(words):
+            word = words[i]
+            following = words[i + 1] if i + 1 < len(words) else prefix
+            if word in self.postings:
+                corrected.append(word)
+            elif word + following in self.postings:
+                # "ortho pedic": one word typed as two
+                if i + 1 == len(words):
+                    return corrected + [word + following]
+                corrected.append(word + following)
+                i += 1
+            else:
+                corrected.append(self.correct(word) or word)
+            i += 1
+
+        lo, hi = self.names.range(prefix)
+        other_lo, other_hi = self.others.range(prefix)
+        if lo == hi and other_lo == other_hi:
+            prefix = self.correct(prefix, prefix=True) or prefix
+        elif not found and prefix not in self.postings:
+            prefix = self.correct(prefix) or prefix
+        return corrected + [prefix]
+
+    def _search(self, tokens: List[str], limit: int) -> List:
+        *words, prefix = tokens
+
+        # Earlier words must be complete tokens of the entry (any field)
+        required: List[array] = []
+        for word in set(words):
+            ids = self.postings.get(word)
+            if ids is None:
+                return []
+            required.append(ids)
+        required.sort(key=len)
+
+        name_range = self.names.range(prefix)
+        other_range = self.others.range(prefix)
+        prefix_hits = (name_range[1] - name_range[0]) + (other_range[1] - other_range[0])
+
+        if required and self._drive_from_postings(required, prefix_hits, limit):
+            ranked = self._rank_candidates(required, prefix, limit)
+            return [self.payloads[doc] for _, doc in ranked]
+
+        seen: Set[int] = set()
+        results = []
+        for prefix_array, (lo, hi) in ((self.names, name_range), (self.others, other_range)):
+            docs = prefix_array.docs
+            for i in range(lo, hi):
+                doc = docs[i]
+                if doc in seen or not all(_contains(ids, doc) for ids in required):
+                    continue
+                seen.add(doc)
+                results.append(self.payloads[doc])
+                if len(results) == limit:
+                    return results
+        return results
+
+    def _drive_from_postings(self, required: List[array], prefix_hits: int, limit: int) -> bool:
+        """
+        Whether ranking every entry of the rarest word beats walking the prefix range
+
+        The walk stops after `limit` hits, so with the words' documents
+        assumed independent it visits about limit / selectivity entries.
+        """
+        selectivity = 1.0
+        for ids in required:
+            selectivity *= len(ids) / len(self.payloads)
+        walk = min(prefix_hits, limit / selectivity)
+        return len(required[0]) * RANK_COST < walk
+
+    def _rank_candidates(self, required: List[array], prefix: str,
+                         limit: int) -> List[Tuple[Tuple, int]]:
+        ranked = []
+        for doc in required[0]:
+            if not all(_contains(ids, doc) for ids in required[1:]):
+                continue
+            rank = self._prefix_rank(doc, prefix)
+            if rank is not None:
+                ranked.append((rank, doc))
+        return heapq.nsmallest(limit, ranked)
+
+    def _prefix_rank(self, doc: int, prefix: str) -> Optional[Tuple]:
+        # Same order the prefix arrays are walked in: tier, then matched token
+        name_tokens, other_tokens = self.fields[doc]
+        for exact, by_prefix, tokens in ((NAME_EXACT, NAME_PREFIX, name_tokens),
+                                         (OTHER_EXACT, OTHER_PREFIX, other_tokens)):
+            if prefix in tokens:
+                return exact, prefix
+            matches = [t for t in tokens if t.startswith(prefix)]
+            if matches:
+                return by_prefix, min(matches)
+        return None
+
+
+class SearchIndex:
+    """Doctors, symptoms and medicines collections, rebuilt with the KB"""
+
+    KINDS = ("doctors", "symptoms", "medicines")
+
+    def __init__(self):
+        self.collections: Dict[str, Collection] = {kind: Collection([]) for kind in self.KINDS}
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def rebuild(self, medical_kb: Dict, doctors_db: Dict):
+        """Index fresh copies of the knowledge bases and swap them in atomically"""
+        synonyms = medical_kb.get("symptom_synonyms", {})
+        doctors = [
+            (
+                doc.get("name", ""),
+                (doc.get("specialization") or doc.get("specialty", ""), doc.get("city", "")),
+                doc,
+            )
+            for doc in doctors_db.get("doctors", [])
+        ]
+        symptoms = [
+            (name, list(_strings(info)) + synonyms.get(name, []), {"name": name, "info": info})
+            for name, info in medical_kb.get("symptoms", {}).items()
+        ]
+        medicines = [
+            (name, list(_strings(info)), {"name": name, "info": info})
+            for name, info in medical_kb.get("medicines", {}).items()
+        ]
+
+        collections = {
+            "doctors": Collection(doctors),
+            "symptoms": Collection(symptoms),
+            "medicines": Collection(medicines),
+        }
+        with self._lock:
+            self.collections = collections
+            self.version += 1
+
+    def search(self, query: str, kinds: Iterable[str] = KINDS, limit: int = 5,
+               fuzzy: bool = True) -> Dict[str, List]:
+        collections = self.collections  # one consistent snapshot across a rebuild
+        kinds = [kind for kind in kinds if kind in collections]
+        results = {kind: collections[kind].search(query, limit, fuzzy=False) for kind in kinds}
+        if fuzzy and not any(results.values()):
+            # Only a query that finds nothing anywhere pays for typo correction
+            results = {kind: collections[kind].search(query, limit) for kind in kinds}
+        return results
+
+    def correct(self, kind: str, text: str) -> str:
+        """text (lowercased) with words unknown to a collection replaced by their correction"""
+        collection = self.collections[kind]
+        return " ".join(
+            word if word in collection.postings else (collection.correct(word) or word)
+            for word in tokenize(text)
+        )
+
+    def stats(self) -> Dict:
+        collections = self.collections
+        return {
+            "version": self.version,
+            **{kind: len(collection) for kind, collection in collections.items()},
+        }
+
+
+def evaluate(index: SearchIndex, cases: List[Dict], limit: int = 5) -> Dict:
+    """Recall@1 / recall@limit and latency for (query, kind, expected name) cases"""
+    hits_at_1 = hits_at_k = 0
+    latencies, misses = [], []
+    for case in cases:
+        started = time.perf_counter()
+        results = index.search(case["query"], (case["kind"],), limit)[case["kind"]]
+        latencies.append(time.perf_counter() - started)
+        names = [r.get("name") for r in results]
+        if names[:1] == [case["expected"]]:
+            hits_at_1 += 1
+        if case["expected"] in names:
+            hits_at_k += 1
+        else:
+            misses.append(case["query"])
+
+    latencies.sort()
+    total = len(cases) or 1
+    return {
+        "cases": len(cases),
+        "recall_at_1": round(hits_at_1 / total, 3),
+        f"recall_at_{limit}": round(hits_at_k / total, 3),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else 0,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3) if latencies else 0,
+        "misses": misses,
+    }
+
+
+def _pad_catalog(medical_kb: Dict, doctors_db: Dict, count: int):
+    """Add `count` random doctors and medicines as distractors"""
+    import random
+
+    rng = random.Random(42)
+    letters = "abcdefghiklmnoprstuvyz"
+
+    def word(n):
+        return "".join(rng.choice(letters) for _ in range(n))
+
+    specializations = doctors_db.get("specializations") or ["General Physician"]
+    doctors = list(doctors_db.get("doctors", []))
+    for i in range(count):
+        doctors.append({"id": f"pad{i}", "name": f"Dr. {word(6).title()} {word(8).title()}",
+                        "specialization": rng.choice(specializations),
+                        "city": word(7).title()})
+    medicines = dict(medical_kb.get("medicines", {}))
+    for _ in range(count // 2):
+        medicines[word(rng.randint(6, 10))] = {"uses": [word(7), word(9)]}
+    return dict(medical_kb, medicines=medicines), dict(doctors_db, doctors=doctors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search misspelling recall report")
+    parser.add_argument("--eval", nargs="?", const="search_misspellings.json", metavar="CORPUS",
+                        required=True, help="corpus of misspelled queries")
+    parser.add_argument("--pad", type=int, default=0,
+                        help="add this many random doctors (and half as many medicines)")
+    args = parser.parse_args()
+
+    with open("medical_kb.json", "r") as f:
+        medical_kb = json.load(f)
+    with open("doctors_db.json", "r") as f:
+        doctors_db = json.load(f)
+    with open(args.eval, "r") as f:
+        cases = json.load(f)["cases"]
+    if args.pad:
+        medical_kb, doctors_db = _pad_catalog(medical_kb, doctors_db, args.pad)
+
+    index = SearchIndex()
+    index.rebuild(medical_kb, doctors_db)
+    report = evaluate(index, cases)
+    for key, value in report.items():
+        print(f"{key:<12} {value}")
+
+
+# Global instance
+search_index = SearchIndex()
+
+if __name__ == "__main__":
+    main()
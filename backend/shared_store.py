@@ -0,0 +1,308 @@
+"""
+Shared Key-Value Store for MedicSense AI
+Lets sessions and OTPs be seen by every server worker, not just the one
+that created them
+
+Backends (chosen by SHARED_STORE_URL):
+- sqlite:///path/to/store.db   single node, WAL mode, any number of workers
+- redis://host:6379/0          any Redis-protocol server
+- unset                        no shared store; each worker keeps its own state
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class SharedStore(ABC):
+    """
+    Interface for the shared backends
+
+    Values are JSON-serializable dicts; ttl is in seconds (None = no expiry).
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Dict, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def add(self, key: str, value: Dict, ttl: Optional[float] = None) -> bool:
+        """Set only if the key is absent (or expired); True if stored"""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        """Atomically increment a counter, creating it with ttl if absent"""
+
+    def purge_expired(self) -> int:
+        """Drop expired keys (no-op for backends that expire on their own)"""
+        return 0
+
+
+class SQLiteStore(SharedStore):
+    """SQLite (WAL) store shared by all workers on one machine"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections aren't thread-safe
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl is not None else None
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Dict, ttl: Optional[float] = None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), self._expiry(ttl)),
+        )
+
+    def add(self, key: str, value: Dict, ttl: Optional[float] = None) -> bool:
+        cursor = self._conn().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+            (key, json.dumps(value), self._expiry(ttl), time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str) -> bool:
+        return self._conn().execute("DELETE FROM kv WHERE key = ?", (key,)).rowcount == 1
+
+    def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        row = self._conn().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, '1', ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            " value = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? THEN '1'"
+            "              ELSE CAST(CAST(kv.value AS INTEGER) + 1 AS TEXT) END,"
+            " expires_at = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? THEN excluded.expires_at"
+            "                   ELSE kv.expires_at END "
+            "RETURNING value",
+            (key, self._expiry(ttl), now, now),
+        ).fetchone()
+        return int(row[0])
+
+    def purge_expired(self) -> int:
+        return self._conn().execute(
+            "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        ).rowcount
+
+
+class RedisStore(SharedStore):
+    """Minimal RESP2 client for Redis 7+ (or any Redis-protocol server)"""
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            if self.password:
+                self._command("AUTH", self.password)
+            if self.db:
+                self._command("SELECT", str(self.db))
+        return conn
+
+    def _command(self, *args):
+        return self._pipeline(args)[0]
+
+    def _pipeline(self, *commands):
+        """Send several commands in one write; returns their replies in order"""
+        sock, reader = self._connection()
+        parts = []
+        for args in commands:
+            parts.append(f"*{len(args)}\r\n".encode())
+            for arg in args:
+                data = arg if isinstance(arg, bytes) else str(arg).encode()
+                parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        try:
+            sock.sendall(b"".join(parts))
+            # Every reply is read, errors included, so the connection stays in step
+            replies = [self._read_reply(reader) for _ in commands]
+        except (OSError, ConnectionError):
+            # Drop the broken connection; the next call reconnects
+            self._local.conn = None
+            sock.close()
+            raise
+        for reply in replies:
+            if isinstance(reply, RuntimeError):
+                raise reply
+        return replies
+
+    def _read_reply(self, reader):
+        """One decoded reply; error replies come back as RuntimeError instances"""
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RuntimeError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self._read_reply(reader) for _ in range(count)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    @staticmethod
+    def _ttl_args(ttl: Optional[float]):
+        return ("PX", max(1, int(ttl * 1000))) if ttl is not None else ()
+
+    def get(self, key: str) -> Optional[Dict]:
+        data = self._command("GET", key)
+        return json.loads(data) if data is not None else None
+
+    def set(self, key: str, value: Dict, ttl: Optional[float] = None):
+        self._command("SET", key, json.dumps(value), *self._ttl_args(ttl))
+
+    def add(self, key: str, value: Dict, ttl: Optional[float] = None) -> bool:
+        return self._command("SET", key, json.dumps(value), *self._ttl_args(ttl), "NX") == "OK"
+
+    def delete(self, key: str) -> bool:
+        return self._command("DEL", key) == 1
+
+    def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        if ttl is None:
+            return self._command("INCR", key)
+        # One transaction, so no client sees the counter without its expiry;
+        # NX keeps the expiry of a counter that already has one
+        replies = self._pipeline(
+            ("MULTI",),
+            ("INCR", key),
+            ("PEXPIRE", key, self._ttl_args(ttl)[1], "NX"),
+            ("EXEC",),
+        )
+        count = replies[-1][0]  # EXEC's replies: INCR, PEXPIRE
+        if isinstance(count, RuntimeError):
+            raise count
+        return count
+
+
+class ReadThroughCache:
+    """
+    Short-TTL per-worker cache in front of a SharedStore
+
+    Reads hit local memory for up to `ttl` seconds; writes go through to the
+    backend and refresh the local copy. Another worker's change (e.g. a
+    logout) becomes visible here within `ttl` seconds.
+    """
+
+    def __init__(self, store: SharedStore, ttl: float = 1.0, max_entries: int = 100_000):
+        self.store = store
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        value = self.store.get(key)
+        if value is not None:
+            self._remember(key, value, now)
+        else:
+            self._entries.pop(key, None)
+        return value
+
+    def set(self, key: str, value: Dict, ttl: Optional[float] = None):
+        self.store.set(key, value, ttl)
+        self._remember(key, value, time.monotonic())
+
+    def delete(self, key: str) -> bool:
+        self._entries.pop(key, None)
+        return self.store.delete(key)
+
+    def _remember(self, key: str, value: Dict, now: float):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (value, now + self.ttl)
+
+
+def create_shared_store(url: Optional[str]) -> Optional[SharedStore]:
+    """Build a backend from a sqlite:// or redis:// URL (None if unset)"""
+    if not url:
+        return None
+
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        path = parsed.path[1:] if url.startswith("sqlite:///") else parsed.netloc + parsed.path
+        print(f"🗄️  Shared store: SQLite at {path}")
+        return SQLiteStore(path)
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        print(f"🗄️  Shared store: Redis at {parsed.hostname}:{parsed.port or 6379}/{db}")
+        return RedisStore(parsed.hostname or "localhost", parsed.port or 6379, db, parsed.password)
+
+    raise ValueError(f"Unsupported SHARED_STORE_URL scheme: {parsed.scheme}")
+
+
+# Global instance (None when running without a shared store)
+shared_store = create_shared_store(os.getenv("SHARED_STORE_URL"))
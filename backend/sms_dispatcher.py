@@ -0,0 +1,251 @@
+"""
+SMS Dispatcher for MedicSense AI
+Delivers outbound SMS (OTPs) in the background
+
+Requests only enqueue a message and return; a small pool of worker
+threads sends it through the configured provider, retrying transient
+failures with exponential backoff and dead-lettering messages that keep
+failing.
+
+Providers (SMS_PROVIDER):
+- console  print the message (default, demo mode)
+- twilio   Twilio Messages API (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN,
+           TWILIO_PHONE_NUMBER)
+- fake     simulated provider with injected latency and failures, for
+           load testing (FAKE_SMS_LATENCY, FAKE_SMS_FAILURE_RATE)
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from twilio_client import TwilioClient, TwilioError
+
+load_dotenv()
+
+
+class DeliveryError(Exception):
+    """A failed send; retryable errors are tried again after a backoff"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class ConsoleSMSProvider:
+    """Demo provider - just prints the message"""
+
+    name = "console"
+
+    def send(self, to: str, body: str, idempotency_key: Optional[str] = None) -> str:
+        print(f"📱 SMS to {to}: {body}")
+        return f"console-{uuid.uuid4().hex[:12]}"
+
+
+class TwilioSMSProvider:
+    """Twilio SMS over the shared keep-alive REST client"""
+
+    name = "twilio"
+
+    def __init__(self, client: TwilioClient, from_number: str):
+        self.client = client
+        self.from_number = from_number
+
+    def send(self, to: str, body: str, idempotency_key: Optional[str] = None) -> str:
+        try:
+            return self.client.send_message(to, self.from_number, body,
+                                            idempotency_key=idempotency_key).get("sid", "")
+        except TwilioError as e:
+            raise DeliveryError(str(e), retryable=e.retryable)
+
+
+class FakeSMSProvider:
+    """Simulated provider with configurable latency and failure rate"""
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.2, failure_rate: float = 0.05,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.delivered = 0
+
+    def send(self, to: str, body: str, idempotency_key: Optional[str] = None) -> str:
+        time.sleep(self.latency)
+        if self._random.random() < self.failure_rate:
+            raise DeliveryError("Simulated provider failure")
+        self.delivered += 1
+        return f"fake-{uuid.uuid4().hex[:12]}"
+
+
+class OutboundMessage:
+    """One queued SMS and its delivery state"""
+
+    __slots__ = ("id", "to", "body", "attempts", "queued_at", "last_error")
+
+    def __init__(self, to: str, body: str):
+        self.id = uuid.uuid4().hex
+        self.to = to
+        self.body = body
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        self.last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "to": self.to,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+        }
+
+
+class SMSDispatcher:
+    """
+    Background delivery queue
+
+    Messages sit in a min-heap keyed by when they are next due, so new
+    messages and delayed retries share one queue; workers sleep on a
+    condition until the head is due.
+    """
+
+    def __init__(self, provider, workers: int = 4, max_attempts: int = 5,
+                 base_delay: float = 0.5, max_delay: float = 30.0,
+                 dead_letter_size: int = 1000):
+        self.provider = provider
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._queue: List = []  # (due_at, seq, message)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._in_flight = 0
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self.stats = {"queued": 0, "sent": 0, "retries": 0, "dead": 0}
+
+    def send(self, to: str, body: str) -> str:
+        """Queue a message for delivery; returns its id immediately"""
+        message = OutboundMessage(to, body)
+        with self._cond:
+            heapq.heappush(self._queue, (message.queued_at, next(self._seq), message))
+            self.stats["queued"] += 1
+            self._cond.notify()
+        self._ensure_workers()
+        return message.id
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue) + self._in_flight
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until nothing is queued or in flight; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.05))
+        return True
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            return dict(self.stats, pending=len(self._queue) + self._in_flight,
+                        provider=self.provider.name)
+
+    def _ensure_workers(self):
+        # Started lazily so each forked server worker gets its own threads
+        if len(self._threads) == self.workers and all(t.is_alive() for t in self._threads):
+            return
+        with self._cond:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._work, name=f"sms-worker-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_message(self) -> OutboundMessage:
+        with self._cond:
+            while True:
+                if self._queue:
+                    wait = self._queue[0][0] - time.monotonic()
+                    if wait <= 0:
+                        self._in_flight += 1
+                        return heapq.heappop(self._queue)[2]
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _work(self):
+        while True:
+            message = self._next_message()
+            message.attempts += 1
+            try:
+                # Same key on every attempt, so a retry can't send the OTP twice
+                self.provider.send(message.to, message.body, idempotency_key=message.id)
+                outcome = "sent"
+            except DeliveryError as e:
+                message.last_error = str(e)
+                outcome = "retry" if e.retryable else "dead"
+            except Exception as e:
+                message.last_error = str(e)
+                outcome = "retry"
+
+            with self._cond:
+                self._in_flight -= 1
+                if outcome == "retry" and message.attempts >= self.max_attempts:
+                    outcome = "dead"
+
+                if outcome == "sent":
+                    self.stats["sent"] += 1
+                elif outcome == "retry":
+                    self.stats["retries"] += 1
+                    heapq.heappush(self._queue, (time.monotonic() + self._backoff(message.attempts),
+                                                 next(self._seq), message))
+                else:
+                    self.stats["dead"] += 1
+                    self.dead_letters.append(message.to_dict())
+                    print(f"❌ SMS to {message.to} dead-lettered after "
+                          f"{message.attempts} attempts: {message.last_error}")
+                self._cond.notify_all()
+
+    def _backoff(self, attempts: int) -> float:
+        # Exponential with full jitter so retries from a provider outage spread out
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+
+
+def create_sms_provider():
+    provider = os.getenv("SMS_PROVIDER", "console").lower()
+    if provider == "twilio":
+        client = TwilioClient.from_env()
+        from_number = os.getenv("TWILIO_PHONE_NUMBER")
+        if client is not None and from_number:
+            return TwilioSMSProvider(client, from_number)
+        print("⚠️  Twilio SMS not configured - falling back to console SMS")
+    elif provider == "fake":
+        return FakeSMSProvider(
+            latency=float(os.getenv("FAKE_SMS_LATENCY", "0.2")),
+            failure_rate=float(os.getenv("FAKE_SMS_FAILURE_RATE", "0.05")),
+        )
+    return ConsoleSMSProvider()
+
+
+# Global instance
+sms_dispatcher = SMSDispatcher(
+    create_sms_provider(),
+    workers=int(os.getenv("SMS_WORKERS", "4")),
+)
@@ -0,0 +1,191 @@
+"""
+Static Assets for MedicSense AI
+In-memory, precompressed serving of the frontend directory
+
+Every file is read once, hashed and compressed (gzip, plus brotli when the
+`brotli` package is installed) and kept in memory; requests only pick a
+representation and send its bytes. HTML pages get their stylesheet and
+classic script references rewritten to `file?v=<hash>`, and a request for
+the current hash is cached by browsers for a year as immutable. Everything
+else - HTML, the service worker, unversioned URLs - is no-cache with an
+ETag, so a revalidation costs a bodyless 304.
+
+The directory is rescanned (a stat per file) at most every few seconds, so
+edits and generated files such as env-config.js are picked up without a
+restart. Module scripts are not versioned: importing the same module under
+two URLs would run it twice.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone is still served
+    brotli = None
+
+# Seconds between checks of the directory for edited files
+RESCAN_SECONDS = 2.0
+
+# Smaller files are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# <link ...> and <script ...> tags, and the local URL in their href/src
+TAG_RE = re.compile(r"<(?:link|script)\b[^>]*>", re.IGNORECASE)
+URL_ATTR_RE = re.compile(r'\b(href|src)="/?([\w./-]+\.(?:css|js))"')
+
+
+class StaticAsset:
+    """One file's bytes in each encoding worth sending"""
+
+    __slots__ = ("mimetype", "version", "encodings")
+
+    def __init__(self, name: str, data: bytes):
+        self.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.version = hashlib.blake2b(data, digest_size=8).hexdigest()
+        # encoding -> (bytes, etag); identity always present
+        self.encodings: Dict[str, Tuple[bytes, str]] = {"identity": (data, self.version)}
+        if len(data) < MIN_COMPRESS_BYTES:
+            return
+        # mtime=0 keeps the gzip bytes (and so the ETag) stable across restarts
+        gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(gzipped) < len(data):
+            self.encodings["gzip"] = (gzipped, f"{self.version}-gzip")
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                self.encodings["br"] = (compressed, f"{self.version}-br")
+
+    def pick(self) -> Tuple[str, bytes, str]:
+        """(encoding, bytes, etag) preferred by the current request"""
+        accepted = request.accept_encodings
+        for encoding in ("br", "gzip"):
+            if encoding in self.encodings and accepted.quality(encoding) > 0:
+                return (encoding, *self.encodings[encoding])
+        return ("identity", *self.encodings["identity"])
+
+    def matches(self, if_none_match) -> bool:
+        return any(if_none_match.contains_weak(etag) for _, etag in self.encodings.values())
+
+
+class StaticAssets:
+    """The frontend directory, loaded into memory and served from there"""
+
+    def __init__(self, root: str, index: str = "index.html"):
+        self.root = root
+        self.index = index
+        self._assets: Dict[str, StaticAsset] = {}
+        self._signature = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """name -> (mtime_ns, size) for every servable file under root"""
+        files = {}
+        for directory, subdirs, names in os.walk(self.root):
+            subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+            for name in names:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                files[os.path.relpath(path, self.root).replace(os.sep, "/")] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def load(self, files: Optional[Dict[str, Tuple[int, int]]] = None):
+        """Read, version and compress every file; swapped in atomically"""
+        files = self._scan() if files is None else files
+        raw = {}
+        for name in files:
+            with open(os.path.join(self.root, name), "rb") as f:
+                raw[name] = f.read()
+
+        assets = {name: StaticAsset(name, data) for name, data in raw.items()
+                  if not name.endswith(".html")}
+
+        def versioned(match):
+            tag = match.group(0)
+            if 'type="module"' in tag:
+                return tag
+
+            def add_version(attr):
+                asset = assets.get(attr.group(2))
+                if asset is None:
+                    return attr.group(0)
+                return f'{attr.group(1)}="{attr.group(2)}?v={asset.version}"'
+
+            return URL_ATTR_RE.sub(add_version, tag)
+
+        for name, data in raw.items():
+            if name.endswith(".html"):
+                page = TAG_RE.sub(versioned, data.decode("utf-8"))
+                assets[name] = StaticAsset(name, page.encode("utf-8"))
+
+        self._assets = assets
+        self._signature = files
+        self._checked = time.monotonic()
+        print(f"📦 Loaded {len(assets)} frontend files into memory"
+              f"{' (gzip + brotli)' if brotli is not None else ' (gzip)'}")
+
+    def refresh(self):
+        """Reload if files changed since the last look, checked every RESCAN_SECONDS"""
+        now = time.monotonic()
+        if now - self._checked < RESCAN_SECONDS:
+            return
+        with self._lock:
+            if now - self._checked < RESCAN_SECONDS:
+                return
+            try:
+                files = self._scan()
+                if files != self._signature:
+                    self.load(files)
+            except OSError as e:
+                print(f"⚠️  Frontend reload failed, keeping the current files: {e}")
+            self._checked = time.monotonic()
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        self.refresh()
+        return self._assets.get(path)
+
+    def serve(self, path: str) -> Response:
+        """
+        The file at path; extensionless paths not found get the index page
+
+        A missing file that has an extension is a 404 rather than HTML
+        pretending to be a script.
+        """
+        asset = self.get(path)
+        if asset is None:
+            last = path.rsplit("/", 1)[-1]
+            asset = self.get(self.index) if "." not in last else None
+            if asset is None:
+                return Response("Not Found", status=404, mimetype="text/plain")
+
+        encoding, body, etag = asset.pick()
+        if request.if_none_match and asset.matches(request.if_none_match):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=asset.mimetype)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        if request.args.get("v") == asset.version:
+            response.headers["Cache-Control"] = IMMUTABLE
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+# Global instance
+static_assets = StaticAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend"))
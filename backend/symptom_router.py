@@ -0,0 +1,125 @@
+"""
+Symptom Router for MedicSense AI
+Symptom -> ranked specialties -> doctors, compiled from the knowledge bases
+
+medical_kb.json lists specialists per symptom (reached through the
+symptom's name, keywords and synonyms) plus a `specialist_routing` table
+of loose terms ("rash", "tumor", ...). Both are compiled once into
+postings: normalized term -> {specialty: weight}, earlier specialties in a
+list weighing more and whole-symptom phrases outweighing single words.
+Routing a request is a union of the postings its symptoms hit; the
+specialties' doctors come from a second precomputed map.
+"""
+
+import re
+from typing import Dict, Iterable, List
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# A KB symptom/keyword/synonym phrase counts this much more than a loose term
+PHRASE_WEIGHT = 2.0
+
+GENERALIST = "general physician"
+
+
+def normalize(text: str) -> str:
+    return " ".join(TOKEN_RE.findall(str(text).lower()))
+
+
+class SymptomRouter:
+    """Precomputed symptom -> specialty -> doctor postings"""
+
+    def __init__(self):
+        self._state = ({}, {}, {}, [], [])
+        self.version = 0
+
+    def rebuild(self, medical_kb: Dict, doctors_db: Dict):
+        """Compile the routing postings; swapped in atomically"""
+        postings: Dict[str, Dict[str, float]] = {}
+        names: Dict[str, str] = {}  # normalized specialty -> display name
+
+        def add(term: str, specialties: Iterable[str], weight: float):
+            term = normalize(term)
+            if not term:
+                return
+            bucket = postings.setdefault(term, {})
+            for rank, specialty in enumerate(specialties):
+                key = normalize(specialty)
+                names.setdefault(key, specialty)
+                bucket[key] = max(bucket.get(key, 0.0), weight / (rank + 1))
+
+        synonyms = medical_kb.get("symptom_synonyms", {})
+        for symptom, info in medical_kb.get("symptoms", {}).items():
+            specialties = info.get("specialists", [])
+            for phrase in [symptom, *info.get("keywords", []), *synonyms.get(symptom, [])]:
+                add(phrase, specialties, PHRASE_WEIGHT)
+
+        routing = medical_kb.get("specialist_routing", {})
+        for term, specialties in routing.get("terms", {}).items():
+            add(term, specialties, 1.0)
+
+        known = {normalize(name) for name in doctors_db.get("specializations", [])}
+        unknown = sorted({names[key] for key in names if key not in known})
+        if unknown:
+            print(f"⚠️  Routing mentions specialties with no doctors listed: {', '.join(unknown)}")
+
+        doctors: Dict[str, List[Dict]] = {}
+        for doctor in doctors_db.get("doctors", []):
+            doctors.setdefault(normalize(doctor.get("specialization", "")), []).append(doctor)
+
+        self._state = (
+            postings,
+            names,
+            doctors,
+            list(routing.get("default", ["General Physician"])),
+            list(routing.get("serious_default", ["Specialist Physician"])),
+        )
+        self.version += 1
+
+    def _scores(self, symptoms: Iterable[str]) -> Dict[str, float]:
+        postings = self._state[0]
+        scores: Dict[str, float] = {}
+        for symptom in symptoms:
+            phrase = normalize(symptom)
+            # The whole phrase if the KB knows it, otherwise its words
+            hits = [phrase] if phrase in postings else phrase.split()
+            for term in hits:
+                for specialty, weight in postings.get(term, {}).items():
+                    scores[specialty] = scores.get(specialty, 0.0) + weight
+        return scores
+
+    def route(self, symptoms: Iterable[str], serious: bool = False, limit: int = 3) -> List[str]:
+        """
+        Ranked specialty names for the symptoms
+
+        For serious cases specialists are preferred: the generalist is only
+        kept when nothing more specific matched.
+        """
+        _, names, _, default, serious_default = self._state
+        scores = self._scores(symptoms)
+        if serious and len(scores) > 1:
+            scores.pop(GENERALIST, None)
+        if not scores:
+            return list(serious_default if serious else default)[:limit]
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [names[specialty] for specialty, _ in ranked[:limit]]
+
+    def doctors_for(self, specialties: Iterable[str], limit: int = 3) -> List[Dict]:
+        """Doctors for the specialties, best-ranked specialty first"""
+        doctors = self._state[2]
+        matched: List[Dict] = []
+        for specialty in specialties:
+            for doctor in doctors.get(normalize(specialty), ()):
+                if len(matched) == limit:
+                    return matched
+                matched.append(doctor)
+        return matched
+
+    def stats(self) -> Dict[str, int]:
+        postings, names, doctors, _, _ = self._state
+        return {"version": self.version, "terms": len(postings), "specialties": len(names),
+                "routed_doctors": sum(len(d) for d in doctors.values())}
+
+
+# Global instance
+symptom_router = SymptomRouter()
@@ -0,0 +1,12 @@
+"""
+Shared pytest setup: the backend modules are flat files imported by name,
+and some of them open data files relative to the working directory
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
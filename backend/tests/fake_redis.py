@@ -0,0 +1,111 @@
+"""
+In-process Redis-protocol server for tests
+Speaks enough RESP2 for RedisStore: GET, SET (PX, NX), DEL, INCR,
+PEXPIRE (NX), MULTI/EXEC and PING
+"""
+
+import socketserver
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """One dict behind a lock, served on 127.0.0.1:<port> from a daemon thread"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-redis", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, args):
+        """Run one command atomically; returns the encoded reply"""
+        return self.execute_all([args])[0]
+
+    def execute_all(self, commands):
+        """Run commands as one atomic step (a MULTI/EXEC transaction)"""
+        with self.lock:
+            self.commands += len(commands)
+            now = time.time()
+            for key in [k for k, (_, exp) in self.data.items() if exp is not None and exp <= now]:
+                del self.data[key]
+            return [self._run(args, now) for args in commands]
+
+    def _run(self, args, now: float) -> bytes:
+        command = args[0].upper()
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command == b"GET":
+            entry = self.data.get(args[1].decode())
+            if entry is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+        if command == b"SET":
+            key, value = args[1].decode(), args[2]
+            options = [a.upper() for a in args[3:]]
+            expires_at = None
+            if b"PX" in options:
+                expires_at = now + int(args[3 + options.index(b"PX") + 1]) / 1000
+            if b"NX" in options and key in self.data:
+                return b"$-1\r\n"
+            self.data[key] = (value, expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return b":%d\r\n" % (1 if self.data.pop(args[1].decode(), None) else 0)
+        if command == b"INCR":
+            key = args[1].decode()
+            value, expires_at = self.data.get(key, (b"0", None))
+            value = b"%d" % (int(value) + 1)
+            self.data[key] = (value, expires_at)
+            return b":%s\r\n" % value
+        if command == b"PEXPIRE":
+            key = args[1].decode()
+            entry = self.data.get(key)
+            if entry is None or (b"NX" in [a.upper() for a in args[3:]] and entry[1] is not None):
+                return b":0\r\n"
+            self.data[key] = (entry[0], now + int(args[2]) / 1000)
+            return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        queued = None  # commands since MULTI
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+
+            command = args[0].upper()
+            if command == b"MULTI":
+                queued = []
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"EXEC" and queued is not None:
+                replies = self.server.execute_all(queued)
+                queued = None
+                self.wfile.write(b"*%d\r\n" % len(replies) + b"".join(replies))
+            elif queued is not None:
+                queued.append(args)
+                self.wfile.write(b"+QUEUED\r\n")
+            else:
+                self.wfile.write(self.server.execute(args))
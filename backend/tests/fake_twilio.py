@@ -0,0 +1,87 @@
+"""
+In-process stand-in for the Twilio Messages API, for tests
+
+Records every request and, like the real Messages API, creates a message
+for each one it accepts - there is no server-side deduplication. It can be
+told to hang up after acting on the next requests, to fail or reject them,
+or to close a kept-alive connection after answering.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs
+
+
+class FakeTwilioServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.requests: List[Dict] = []  # every POST received, including dropped ones
+        self.messages: List[Dict] = []  # messages actually created
+        self.drop_next = 0  # create the message, then close without answering
+        self.fail_next = 0  # answer 503
+        self.reject_next = 0  # answer 400 (not retryable)
+        self.close_after_next = 0  # answer, then close the kept-alive connection
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,), name="fake-twilio", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_message(self, form: Dict):
+        """(status, body) for one POST, or None to hang up"""
+        with self.lock:
+            self.requests.append({"form": form})
+            if self.fail_next:
+                self.fail_next -= 1
+                return 503, {"message": "Service unavailable"}
+            if self.reject_next:
+                self.reject_next -= 1
+                return 400, {"message": "Invalid 'To' Phone Number"}
+            message = {"sid": f"SM{len(self.messages) + 1:032d}", "to": form.get("To"),
+                       "body": form.get("Body"), "status": "queued"}
+            self.messages.append(message)
+            if self.drop_next:
+                self.drop_next -= 1
+                return None
+            return 201, message
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this each answer
+    # waits out the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        form = {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+        result = self.server.handle_message(form)
+        if result is None:
+            self.close_connection = True
+            return
+        status, body = result
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server.lock:
+            if self.server.close_after_next:
+                self.server.close_after_next -= 1
+                self.close_connection = True
+
+    def log_message(self, *args):
+        pass
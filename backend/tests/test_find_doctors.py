@@ -0,0 +1,44 @@
+"""
+/api/find-doctors with lat/lon: nearest doctors honour the same city and
+specialization filters as the directory lookup
+"""
+
+import pytest
+
+import app as app_module
+
+NEW_YORK = {"lat": "40.7128", "lon": "-74.006"}
+
+
+@pytest.fixture
+def client():
+    app_module.rate_limiter.enabled = False
+    yield app_module.app.test_client()
+    app_module.rate_limiter.enabled = True
+
+
+def names(client, **params):
+    response = client.get("/api/find-doctors", query_string=params)
+    assert response.status_code == 200
+    return [doctor["name"] for doctor in response.get_json()["doctors"]]
+
+
+def test_nearest_without_filters(client):
+    assert names(client, **NEW_YORK, limit=2) == ["Dr. Sarah Johnson", "Dr. Michael Chen"]
+
+
+def test_nearest_filtered_by_city(client):
+    assert names(client, **NEW_YORK, city="boston") == ["Dr. Emily White"]
+
+
+def test_nearest_filtered_by_city_and_specialization(client):
+    assert names(client, **NEW_YORK, city="new york", specialization="cardio") == ["Dr. Michael Chen"]
+    assert names(client, **NEW_YORK, city="boston", specialization="cardio") == []
+
+
+def test_radius_filtered_by_specialization(client):
+    assert names(client, **NEW_YORK, radius_km=500, specialization="general") == ["Dr. Sarah Johnson"]
+
+
+def test_nearest_corrects_misspelled_filters(client):
+    assert names(client, **NEW_YORK, specialization="dermatolgist") == ["Dr. Emily White"]
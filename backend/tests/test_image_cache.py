@@ -0,0 +1,57 @@
+"""
+Image analysis cache: near-duplicate photos reuse a result, but a scoped
+cache (Gemini's analyses of a user's photo) never hands one user's result
+to another
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+from gemini_service import gemini_service
+from image_cache import ImageAnalysisCache
+
+
+def photo(quality: int) -> bytes:
+    """The same wound photo; different JPEG qualities give near duplicates"""
+    pixels = np.full((240, 320, 3), (220, 180, 160), dtype=np.uint8)
+    pixels[60:180, 80:240] = (200, 20, 20)
+    pixels[100:140, 120:200] = (90, 50, 150)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_unscoped_cache_matches_near_duplicates():
+    cache = ImageAnalysisCache()
+    _, key = cache.lookup(photo(90))
+    cache.store(key, {"type": "cut"})
+
+    assert cache.lookup(photo(90))[0] == {"type": "cut"}
+    assert cache.lookup(photo(60))[0] == {"type": "cut"}
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["near_hits"] == 1
+
+
+def test_scoped_cache_keeps_users_apart():
+    cache = ImageAnalysisCache(scoped=True)
+    _, key = cache.lookup(photo(90), "user_a")
+    cache.store(key, {"description": "user_a's wound"})
+
+    assert cache.lookup(photo(60), "user_a")[0] == {"description": "user_a's wound"}
+    assert cache.lookup(photo(60), "user_b")[0] is None
+    assert cache.lookup(photo(90), "user_b")[0] is None
+
+
+def test_scoped_cache_without_a_user_only_matches_exact_bytes():
+    cache = ImageAnalysisCache(scoped=True)
+    _, key = cache.lookup(photo(90))
+    cache.store(key, {"description": "anonymous upload"})
+
+    assert cache.lookup(photo(90))[0] == {"description": "anonymous upload"}
+    assert cache.lookup(photo(60))[0] is None
+    assert cache.lookup(photo(90), "user_a")[0] is None
+
+
+def test_gemini_cache_is_scoped():
+    assert gemini_service.image_cache.scoped is True
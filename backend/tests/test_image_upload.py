@@ -0,0 +1,157 @@
+"""
+Upload limits and format checks for /api/image/analyze
+(read_image_upload, open_image and CameraInjuryAnalyzer.analyze_image)
+"""
+
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import image_processing
+from camera_analyzer import camera_analyzer
+from image_processing import (
+    MAX_IMAGE_PIXELS,
+    MAX_UPLOAD_BYTES,
+    UPLOAD_CHUNK_SIZE,
+    ImageTooLargeError,
+    ImageUploadError,
+    image_dhash,
+    open_image,
+    read_image_upload,
+)
+
+
+class CountingStream(io.BytesIO):
+    """BytesIO that remembers how many bytes were read from it"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def jpeg_bytes(color=(200, 20, 20), size=(400, 400)) -> bytes:
+    """Skin-toned photo with a colored patch in the middle"""
+    pixels = np.full((size[1], size[0], 3), (220, 180, 160), dtype=np.uint8)
+    pixels[size[1] // 4: 3 * size[1] // 4, size[0] // 4: 3 * size[0] // 4] = color
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def png_with_dimensions(width: int, height: int) -> bytes:
+    """A tiny PNG whose header claims width x height (decoding bombs look like this)"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(buffer, "PNG")
+    data = bytearray(buffer.getvalue())
+    # IHDR data starts after the 8-byte signature and the chunk's length + type
+    data[16:24] = struct.pack(">II", width, height)
+    data[29:33] = struct.pack(">I", zlib.crc32(bytes(data[12:29])))
+    return bytes(data)
+
+
+def upload(data: bytes, filename="photo.jpg") -> FileStorage:
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+
+def test_reads_a_jpeg_upload():
+    data = jpeg_bytes()
+    image_bytes, image_format = read_image_upload(io.BytesIO(data))
+    assert image_bytes == data
+    assert image_format == "JPEG"
+
+
+def test_upload_over_size_cap_stops_reading():
+    data = b"\xff\xd8\xff" + b"\0" * (MAX_UPLOAD_BYTES + 5 * UPLOAD_CHUNK_SIZE)
+    stream = CountingStream(data)
+    with pytest.raises(ImageTooLargeError):
+        read_image_upload(stream)
+    # Gives up within a chunk of the cap instead of reading the whole body
+    assert stream.bytes_read <= MAX_UPLOAD_BYTES + UPLOAD_CHUNK_SIZE
+
+
+def test_oversized_upload_is_413():
+    result = camera_analyzer.analyze_image(upload(b"\xff\xd8\xff" + b"\0" * MAX_UPLOAD_BYTES))
+    assert result["success"] is False
+    assert result["status"] == 413
+
+
+@pytest.mark.parametrize("data", [
+    b"%PDF-1.7\n" + b"\0" * 1000,
+    b"<html><body>not an image</body></html>",
+    b"MZ\x90\0" + b"\0" * 100,
+])
+def test_non_image_is_rejected_from_its_magic_bytes(data):
+    stream = CountingStream(data + b"\0" * (4 * UPLOAD_CHUNK_SIZE))
+    with pytest.raises(ImageUploadError) as excinfo:
+        read_image_upload(stream)
+    assert not isinstance(excinfo.value, ImageTooLargeError)
+    # Rejected on the first chunk
+    assert stream.bytes_read <= UPLOAD_CHUNK_SIZE
+
+
+def test_non_image_upload_is_400():
+    result = camera_analyzer.analyze_image(upload(b"%PDF-1.7\n" + b"\0" * 1000, "scan.jpg"))
+    assert result["success"] is False
+    assert result["status"] == 400
+
+
+def test_empty_upload_is_400():
+    result = camera_analyzer.analyze_image(upload(b""))
+    assert result["status"] == 400
+
+
+def test_open_image_rejects_too_many_pixels():
+    data = png_with_dimensions(10_000, MAX_IMAGE_PIXELS // 10_000 + 1)
+    with pytest.raises(ImageTooLargeError):
+        open_image(data, (200, 200))
+
+
+def test_open_image_pixel_cap_boundary(monkeypatch):
+    # A cap small enough to decode real images right at it and one pixel row over
+    monkeypatch.setattr(image_processing, "MAX_IMAGE_PIXELS", 300 * 200)
+    at_cap = jpeg_bytes(size=(300, 200))
+    over_cap = jpeg_bytes(size=(300, 201))
+
+    assert open_image(at_cap).size == (300, 200)
+    assert open_image(at_cap, (200, 200)).size == (200, 200)
+    with pytest.raises(ImageTooLargeError):
+        open_image(over_cap)
+    with pytest.raises(ImageTooLargeError):
+        open_image(over_cap, (200, 200))
+
+
+def test_hash_rejects_too_many_pixels_before_decoding(monkeypatch):
+    # The duplicate cache hashes uploads before open_image sees them
+    data = png_with_dimensions(10_000, MAX_IMAGE_PIXELS // 10_000 + 1)
+    with pytest.raises(ImageTooLargeError):
+        image_dhash(data)
+
+    decoded = []
+    monkeypatch.setattr(Image.Image, "load", lambda img: decoded.append(img))
+    result = camera_analyzer.analyze_image(upload(data, "bomb.png"))
+    assert result["status"] == 413
+    assert decoded == []
+
+
+def test_decompression_bomb_upload_is_413():
+    result = camera_analyzer.analyze_image(upload(png_with_dimensions(20_000, 20_000), "bomb.png"))
+    assert result["success"] is False
+    assert result["status"] == 413
+
+
+def test_normal_upload_is_analyzed():
+    result = camera_analyzer.analyze_image(upload(jpeg_bytes(color=(200, 20, 20))))
+    assert result["success"] is True
+    assert result["details"]["injury_type"] == "cut"
+    assert result["severity"] in ("low", "medium", "high")
+    assert result["recommendations"]
@@ -0,0 +1,87 @@
+"""
+Tiled injury analysis: summed-area tables and window sums match brute
+force, the densest window locates a small wound, and severity is graded
+on the whole frame
+"""
+
+import numpy as np
+import pytest
+
+from camera_analyzer import camera_analyzer
+from image_processing import color_masks, integral_images, window_sums
+
+SKIN = (220, 180, 160)
+BLOOD = (200, 20, 20)
+
+
+def skin_with_patch(side: int, top: int, left: int, patch: int, color=BLOOD) -> np.ndarray:
+    pixels = np.full((side, side, 3), SKIN, dtype=np.uint8)
+    pixels[top:top + patch, left:left + patch] = color
+    return pixels
+
+
+@pytest.mark.parametrize("cell", [1, 3])
+def test_integral_images_match_brute_force(cell):
+    rng = np.random.default_rng(0)
+    masks = {"a": rng.random((31, 40)) < 0.3, "b": rng.random((31, 40)) < 0.6}
+    sat = integral_images(masks, cell)
+
+    rows, cols = 31 // cell, 40 // cell
+    assert sat.shape == (2, rows + 1, cols + 1)
+    assert not sat[:, 0, :].any() and not sat[:, :, 0].any()
+    for channel, mask in enumerate(masks.values()):
+        cropped = mask[:rows * cell, :cols * cell]
+        for y, x in [(1, 1), (rows, cols), (5, 7), (rows // 2, cols)]:
+            assert sat[channel, y, x] == cropped[:y * cell, :x * cell].sum()
+
+
+def test_window_sums_cover_the_stride_grid():
+    rng = np.random.default_rng(1)
+    masks = {"a": rng.random((20, 26)) < 0.5}
+    sat = integral_images(masks)
+
+    sums = window_sums(sat, size=6, stride=4)
+
+    mask = masks["a"]
+    ys, xs = range(0, 20 - 6 + 1, 4), range(0, 26 - 6 + 1, 4)
+    expected = [[mask[y:y + 6, x:x + 6].sum() for x in xs] for y in ys]
+    assert sums.shape == (1, len(ys), len(xs))
+    assert (sums[0] == np.array(expected)).all()
+
+
+def test_densest_window_locates_a_small_cut():
+    # 2% of the frame: below the frame-wide cut threshold
+    pixels = skin_with_patch(200, top=140, left=20, patch=28)
+    region = camera_analyzer.locate_injury_region(color_masks(pixels))
+
+    assert region["type"] == "cut"
+    # Windows snap to the stride grid; the wound's centre is inside the box
+    box = region["region"]
+    assert box["x"] <= 34 / 200 <= box["x"] + box["width"]
+    assert box["y"] <= 154 / 200 <= box["y"] + box["height"]
+    assert box["width"] <= 0.4 and box["height"] <= 0.4
+
+
+def test_severity_is_graded_on_the_frame(monkeypatch):
+    monkeypatch.setattr(camera_analyzer, "analysis_mode", "tiled")
+    # The window around the cut is nearly all red; the frame is 2% red
+    percentages, injury_type, region = camera_analyzer.color_profile(
+        skin_with_patch(200, top=140, left=20, patch=28))
+
+    assert injury_type == "cut" and region is not None
+    assert percentages["red"] < 5
+    assert camera_analyzer.grade_severity(injury_type, percentages)[0] == "minor"
+
+    # A large wound is graded severe from the frame as well
+    percentages, injury_type, _ = camera_analyzer.color_profile(
+        skin_with_patch(200, top=40, left=40, patch=120))
+    assert injury_type == "cut"
+    assert camera_analyzer.grade_severity(injury_type, percentages)[0] == "severe"
+
+
+def test_frame_mode_has_no_region(monkeypatch):
+    monkeypatch.setattr(camera_analyzer, "analysis_mode", "frame")
+    percentages, injury_type, region = camera_analyzer.color_profile(
+        skin_with_patch(200, top=140, left=20, patch=28))
+    assert region is None
+    assert injury_type == camera_analyzer.classify_color_profile(percentages)
@@ -0,0 +1,78 @@
+"""
+Local injury triage: confident answers use the Gemini Vision schema, and
+the triage counters stay exact under concurrent requests
+"""
+
+import base64
+import io
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from camera_analyzer import camera_analyzer
+from injury_classifier import CATEGORIES
+
+
+class ConfidentClassifier:
+    """Stands in for a trained model: always the same probabilities"""
+
+    labels = list(CATEGORIES)
+
+    def __init__(self, probabilities):
+        self.probabilities = np.array(probabilities)
+
+    def predict_proba(self, features):
+        return self.probabilities
+
+
+def cut_image() -> str:
+    pixels = np.full((300, 400, 3), (220, 180, 160), dtype=np.uint8)
+    pixels[100:200, 100:300] = (200, 20, 20)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def triage(monkeypatch):
+    monkeypatch.setattr(camera_analyzer, "triage_counts", {"local": 0, "escalated": 0})
+    return camera_analyzer
+
+
+def test_local_answer_uses_the_gemini_schema(triage, monkeypatch):
+    monkeypatch.setattr(triage, "classifier", ConfidentClassifier([0.9, 0.02, 0.05, 0.03, 0.0]))
+
+    analysis = triage.triage_injury_image(cut_image())
+
+    assert analysis["success"] is True and analysis["source"] == "local"
+    assert analysis["injury_type"] == "cut"
+    assert analysis["severity"] in ("mild", "moderate", "severe")
+    assert analysis["possible_conditions"] == ["Laceration (cut)", "Contusion (bruise)",
+                                               "Abrasion (scrape)"]
+    assert analysis["confidence"] == 90
+    assert triage.triage_statistics()["local"] == 1
+
+
+def test_unsure_classifier_escalates(triage, monkeypatch):
+    monkeypatch.setattr(triage, "classifier", ConfidentClassifier([0.5, 0.3, 0.1, 0.1, 0.0]))
+
+    assert triage.triage_injury_image(cut_image()) is None
+    assert triage.triage_statistics()["escalated"] == 1
+
+
+def test_triage_counts_are_exact_across_threads(triage):
+    def count(answered_locally):
+        for _ in range(20_000):
+            triage.record_triage(answered_locally)
+
+    threads = [threading.Thread(target=count, args=(n % 2 == 0,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = triage.triage_statistics()
+    assert (stats["local"], stats["escalated"]) == (80_000, 80_000)
+    assert stats["remote_call_rate"] == 0.5
@@ -0,0 +1,57 @@
+"""
+json_file_store: atomic writes keep the file's permissions, and both
+stores built on it see each other's writes through the file
+"""
+
+import os
+import stat
+
+from appointment_store import AppointmentStore
+from family_doctor_store import FamilyDoctorStore
+from json_file_store import file_signature, read_rows, write_rows
+from records import Appointment
+
+
+def mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_file_is_world_readable(tmp_path):
+    path = str(tmp_path / "rows.json")
+    signature = write_rows(path, [{"id": 1}])
+
+    assert mode(path) == 0o644
+    assert signature == file_signature(path)
+    assert read_rows(path) == [{"id": 1}]
+
+
+def test_existing_mode_is_kept(tmp_path):
+    path = str(tmp_path / "rows.json")
+    write_rows(path, [])
+    os.chmod(path, 0o640)
+
+    write_rows(path, [{"id": 2}])
+
+    assert mode(path) == 0o640
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".")] == []
+
+
+def test_unreadable_file_reads_as_empty(tmp_path):
+    path = tmp_path / "rows.json"
+    path.write_text("{not json")
+    assert read_rows(str(path)) == []
+    assert read_rows(str(tmp_path / "missing.json")) == []
+
+
+def test_stores_share_the_file(tmp_path):
+    path = str(tmp_path / "appointments.json")
+    writer, reader = AppointmentStore(path), AppointmentStore(path)
+    writer.add(Appointment(id="APT1", user_id="user_1", name="Test Patient", phone="+910000000001",
+                           doctor_id="dr_a", date="2030-01-02", time="10:00"))
+    assert [apt.id for apt in reader.for_user("user_1")] == ["APT1"]
+    assert mode(path) == 0o644
+
+    doctors_path = str(tmp_path / "family_doctor.json")
+    FamilyDoctorStore(doctors_path).save({"user_id": "user_1", "name": "Test Doctor"})
+    assert FamilyDoctorStore(doctors_path).get("user_1")["name"] == "Test Doctor"
+    assert mode(doctors_path) == 0o644
@@ -0,0 +1,216 @@
+"""
+WhatsApp notification outbox against a fake Twilio Messages API:
+delivery through outages, lost responses that must not be resent, leases
+"""
+
+import datetime
+import time
+
+import pytest
+
+from appointment_store import AppointmentStore
+from fake_twilio import FakeTwilioServer
+from notification_outbox import NotificationOutbox, OutboxStore, doctor_notification
+from records import Appointment
+from shared_store import SQLiteStore
+from twilio_client import TwilioClient
+
+
+def notification(n: int):
+    appointment = Appointment(id=f"APT{n:06d}", user_id="user_1", name="Test Patient",
+                              phone="+910000000001", doctor_id="dr_aakash",
+                              date="2030-01-02", time="10:00")
+    return doctor_notification(appointment)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def server():
+    server = FakeTwilioServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OutboxStore(str(tmp_path / "outbox.db"))
+
+
+@pytest.fixture
+def send_log(tmp_path):
+    return SQLiteStore(str(tmp_path / "send_log.db"))
+
+
+@pytest.fixture
+def outbox(store, server, send_log):
+    client = TwilioClient("ACtest", "secret", base_url=server.base_url, send_log=send_log)
+    outbox = NotificationOutbox(store, client, "whatsapp:+15550000", workers=3,
+                                base_delay=0.01, max_delay=0.05, poll_interval=0.02)
+    yield outbox
+    outbox.stop()
+
+
+def test_delivers_every_notification_once_through_outages(outbox, store, server):
+    server.fail_next = 4
+    ids = [notification(n)["id"] for n in range(30)]
+    for n in range(30):
+        assert outbox.enqueue(notification(n))
+
+    assert wait_for(lambda: all(store.get(i)["status"] == "sent" for i in ids))
+    assert not store.has_pending()
+    assert len(server.messages) == 30
+    assert {store.get(i)["sid"] for i in ids} == {m["sid"] for m in server.messages}
+    assert outbox.stats["sent"] == 30
+    assert outbox.stats["retries"] == 4
+
+
+def test_lost_response_is_never_resent(outbox, store, server):
+    server.drop_next = 1  # Twilio created the message; the worker never hears back
+    outbox.enqueue(notification(1))
+    assert wait_for(lambda: store.get(notification(1)["id"])["status"] == "dead")
+    entry = store.get(notification(1)["id"])
+    assert entry["attempts"] == 1
+    assert "may have been sent" in entry["last_error"]
+    assert len(server.requests) == 1
+
+
+def test_reclaimed_after_a_crash_is_recorded_from_the_send_log(outbox, store, server, send_log):
+    # A worker sent this one and died before recording it
+    note = notification(1)
+    store.add(note)
+    store.claim(lease_seconds=60)
+    send_log.set(f"twilio:send:{note['id']}", {"status": "sent", "message": {"sid": "SMearlier"}})
+    store._conn().execute("UPDATE notifications SET lease_until = 0")
+
+    outbox.wake()
+    assert wait_for(lambda: store.get(note["id"])["status"] == "sent")
+    assert store.get(note["id"])["sid"] == "SMearlier"
+    assert server.requests == []
+
+
+def test_enqueueing_the_same_id_twice_is_a_no_op(outbox, store, server):
+    assert outbox.enqueue(notification(1))
+    assert not outbox.enqueue(notification(1))
+    assert wait_for(lambda: store.get(notification(1)["id"])["status"] == "sent")
+    assert len(server.messages) == 1
+
+
+def test_rejected_message_is_dead_without_retries(outbox, store, server):
+    server.reject_next = 1
+    outbox.enqueue(notification(1))
+    assert wait_for(lambda: store.get(notification(1)["id"])["status"] == "dead")
+    entry = store.get(notification(1)["id"])
+    assert entry["attempts"] == 1
+    assert "Invalid" in entry["last_error"]
+
+
+def test_a_lease_is_exclusive_until_it_lapses(store):
+    store.add(notification(1))
+    first = store.claim(lease_seconds=60)
+    assert first["attempts"] == 1
+    assert store.claim(lease_seconds=60) is None
+
+    # Lapse the lease, as if the worker had died mid-send
+    store._conn().execute("UPDATE notifications SET lease_until = 0")
+    second = store.claim(lease_seconds=60)
+    assert second["id"] == first["id"]
+    assert second["attempts"] == 2
+
+    # The first worker's late result can't overwrite the new claim
+    assert not store.finish(first, "sent", sid="SMstale")
+    assert store.finish(second, "sent", sid="SMfresh")
+    assert store.get(first["id"])["sid"] == "SMfresh"
+
+
+def test_undelivered_rows_survive_a_restart(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    OutboxStore(path).add(notification(1))
+    reopened = OutboxStore(path)
+    assert reopened.has_pending()
+    assert reopened.claim(lease_seconds=60)["id"] == notification(1)["id"]
+
+
+def booking(tmp_path, n: int):
+    """An appointment saved with its notification, as book_appointment does"""
+    appointments = AppointmentStore(str(tmp_path / "appointments.json"))
+    note = notification(n)
+    appointment = Appointment(id=note["appointment_id"], user_id="user_1", doctor_id="dr_aakash",
+                              date="2030-01-02", time="10:00")
+    appointments.add(appointment, [note])
+    return appointments, note
+
+
+def test_notification_is_saved_with_its_appointment(tmp_path):
+    appointments, note = booking(tmp_path, 1)
+    # Another worker reading the file sees both
+    reopened = AppointmentStore(appointments.path)
+    assert reopened.get(note["appointment_id"]) is not None
+    assert reopened.unsent_notifications() == [note]
+    # The API shape doesn't carry it
+    assert "outbox" not in reopened.get(note["appointment_id"]).to_dict()
+
+
+def test_relay_moves_saved_notifications_into_the_outbox(tmp_path, store, server):
+    appointments, note = booking(tmp_path, 1)
+    outbox = NotificationOutbox(store, TwilioClient("ACtest", "secret", base_url=server.base_url),
+                                "whatsapp:+15550000", poll_interval=0.02, source=appointments)
+    try:
+        assert outbox.relay() == 1
+        assert appointments.unsent_notifications() == []
+        assert wait_for(lambda: store.get(note["id"])["status"] == "sent")
+    finally:
+        outbox.stop()
+    assert len(server.messages) == 1
+
+
+def test_relay_cut_short_queues_nothing_twice(tmp_path, store):
+    appointments, note = booking(tmp_path, 1)
+    # Crash after the row was copied, before the appointment was cleared
+    store.add(note)
+    store.finish(store.claim(lease_seconds=60), "sent", sid="SMdone")
+
+    outbox = NotificationOutbox(store, None, None, source=appointments)
+    assert outbox.relay() == 0
+    assert appointments.unsent_notifications() == []
+    assert store.get(note["id"])["status"] == "sent"
+
+
+def test_idle_workers_relay_saved_notifications(tmp_path, store, server):
+    appointments, note = booking(tmp_path, 2)
+    outbox = NotificationOutbox(store, TwilioClient("ACtest", "secret", base_url=server.base_url),
+                                "whatsapp:+15550000", poll_interval=0.02, source=appointments)
+    outbox.wake()  # e.g. woken by another booking; this one was never relayed
+    try:
+        assert wait_for(lambda: (store.get(note["id"]) or {}).get("status") == "sent")
+    finally:
+        outbox.stop()
+
+
+def test_booking_fails_when_it_cannot_be_saved(tmp_path, monkeypatch):
+    import app as app_module
+    from schedule_engine import ScheduleEngine
+
+    def failing_add(appointment, notifications=()):
+        raise OSError("disk full")
+
+    engine = ScheduleEngine(str(tmp_path / "schedule.db"))
+    monkeypatch.setattr(app_module, "schedule_engine", engine)
+    monkeypatch.setattr(app_module.appointment_store, "add", failing_add)
+    monkeypatch.setattr(app_module.rate_limiter, "enabled", False)
+    booking = {"userId": "user_1", "doctorId": "dr_a", "date": "2030-01-07", "time": "09:00"}
+
+    response = app_module.app.test_client().post("/api/appointments/book", json=booking)
+
+    assert response.status_code == 500
+    assert response.get_json()["success"] is False
+    # The slot was given back
+    assert "09:00" in engine.free_slots("dr_a", datetime.date(2030, 1, 7))["2030-01-07"]
+    engine._conn.close()
@@ -0,0 +1,51 @@
+"""
+/api/auth/send-otp + verify-otp: the OTP is checked and a real session
+is issued, which the rate limiter recognizes and logout revokes
+"""
+
+import pytest
+
+import app as app_module
+from auth_manager import auth_manager
+
+
+@pytest.fixture
+def client():
+    app_module.rate_limiter.enabled = False
+    yield app_module.app.test_client()
+    app_module.rate_limiter.enabled = True
+
+
+def send_otp(client, phone: str) -> str:
+    response = client.post("/api/auth/send-otp", json={"phone": phone})
+    assert response.status_code == 200
+    return response.get_json()["otp"]
+
+
+def test_verified_otp_issues_a_session(client):
+    phone = "+910000000042"
+    otp = send_otp(client, phone)
+    response = client.post("/api/auth/verify-otp", json={"phone": phone, "otp": otp})
+
+    assert response.status_code == 200
+    data = response.get_json()
+    session = auth_manager.validate_session(data["token"])
+    assert session is not None
+    assert session.user_id == data["user"]["id"] == auth_manager.generate_user_id(phone)
+
+    # Logging out revokes it
+    client.post("/api/auth/logout", headers={"Authorization": f"Bearer {data['token']}"})
+    assert auth_manager.validate_session(data["token"]) is None
+
+
+def test_wrong_otp_gets_no_session(client):
+    phone = "+910000000043"
+    otp = send_otp(client, phone)
+    wrong = "000000" if otp != "000000" else "111111"
+    response = client.post("/api/auth/verify-otp", json={"phone": phone, "otp": wrong})
+    assert response.status_code == 401
+    assert "token" not in response.get_json()
+
+
+def test_otp_is_required(client):
+    assert client.post("/api/auth/verify-otp", json={"phone": "+910000000044"}).status_code == 400
@@ -0,0 +1,96 @@
+"""
+Route policies in rate_limiter: OTP routes, per-IP ceilings and keys that
+can't be changed from the request body
+"""
+
+import pytest
+from flask import Flask, jsonify, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from auth_manager import auth_manager
+from rate_limiter import MemoryBuckets, RateLimiter
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    limiter = RateLimiter(MemoryBuckets())
+
+    @app.before_request
+    def limit():
+        allowed, retry_after = limiter.check(request)
+        if not allowed:
+            return jsonify({"retry_after": retry_after}), 429
+        return None
+
+    def ok():
+        return jsonify({"success": True})
+
+    for rule in ("/api/auth/otp/send", "/api/auth/otp/resend", "/api/auth/otp/verify",
+                 "/api/auth/send-otp", "/api/chat"):
+        app.add_url_rule(rule, rule, ok, methods=["POST"])
+    return app.test_client()
+
+
+def post(client, path, body, ip="203.0.113.7", **kwargs):
+    return client.post(path, json=body, environ_base={"REMOTE_ADDR": ip}, **kwargs).status_code
+
+
+@pytest.mark.parametrize("path", ["/api/auth/otp/send", "/api/auth/otp/resend", "/api/auth/send-otp"])
+def test_one_otp_per_phone(client, path):
+    assert post(client, path, {"phone": "+910000000001"}) == 200
+    assert post(client, path, {"phone": "+910000000001"}, ip="198.51.100.1") == 429
+
+
+def test_send_and_resend_share_the_phone_budget(client):
+    assert post(client, "/api/auth/otp/send", {"phone": "+910000000001"}) == 200
+    assert post(client, "/api/auth/otp/resend", {"phone": "+910000000001"}) == 429
+
+
+def test_rotating_phones_hits_the_ip_ceiling(client):
+    statuses = [post(client, "/api/auth/otp/send", {"phone": f"+91000000{i:04d}"}) for i in range(8)]
+    assert statuses[:5] == [200] * 5
+    assert set(statuses[5:]) == {429}
+    # Another client is unaffected
+    assert post(client, "/api/auth/otp/send", {"phone": "+919999999999"}, ip="198.51.100.1") == 200
+
+
+def test_rotating_phones_cannot_brute_force_verify(client):
+    statuses = [post(client, "/api/auth/otp/verify", {"phone": f"+91000000{i:04d}", "otp": "123456"})
+                for i in range(15)]
+    assert statuses.count(200) == 10
+    assert statuses[-1] == 429
+
+
+def test_body_user_id_does_not_reset_the_chat_budget(client):
+    statuses = [post(client, "/api/chat", {"user_id": f"user_{i}", "message": "hi"}) for i in range(8)]
+    assert statuses[:5] == [200] * 5
+    assert set(statuses[5:]) == {429}
+
+
+def test_chat_is_keyed_on_the_signed_in_session(client, monkeypatch):
+    monkeypatch.setattr(auth_manager, "_ensure_sweeper", lambda: None)
+    token = auth_manager.create_session("user_rate_test", {})["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    # The session's budget follows the user across IPs...
+    statuses = [post(client, "/api/chat", {}, ip=f"198.51.100.{i}", headers=headers) for i in range(6)]
+    assert statuses == [200] * 5 + [429]
+    # ...and is separate from the anonymous budget of those IPs
+    assert post(client, "/api/chat", {}, ip="198.51.100.1") == 200
+
+
+def test_behind_one_proxy_the_forwarded_client_is_limited(client):
+    # As app.py configures it for the Heroku router (PROXY_FIX_HOPS=1)
+    client.application.wsgi_app = ProxyFix(client.application.wsgi_app, x_for=1)
+    router = "10.1.2.3"
+
+    def send(forwarded_for, phone):
+        return post(client, "/api/auth/otp/send", {"phone": phone}, ip=router,
+                    headers={"X-Forwarded-For": forwarded_for})
+
+    statuses = [send(f"1.1.1.{i}, 203.0.113.7", f"+91000000{i:04d}") for i in range(8)]
+    # The router appends the real peer; a client-chosen first entry changes nothing
+    assert statuses[:5] == [200] * 5
+    assert set(statuses[5:]) == {429}
+    # Other clients behind the same router have their own budget
+    assert send("198.51.100.1", "+919999999999") == 200
@@ -0,0 +1,97 @@
+"""
+Schedule engine shared by two workers (two connections to one database):
+a worker's own commits are not replayed, other workers' commits are; the
+log is trimmed as it grows, and bookings are checked before they are taken
+"""
+
+import datetime
+
+import pytest
+
+import schedule_engine
+from schedule_engine import InvalidBookingError, ScheduleEngine, SlotUnavailableError
+
+MONDAY = datetime.date(2030, 1, 7)
+
+
+@pytest.fixture
+def engines(tmp_path):
+    path = str(tmp_path / "schedule.db")
+    first, second = ScheduleEngine(path), ScheduleEngine(path)
+    yield first, second
+    first._conn.close()
+    second._conn.close()
+
+
+def test_own_writes_are_not_replayed(engines):
+    first, _ = engines
+    first.reserve("dr_a", MONDAY, "09:00", "APT1")
+    first.release("dr_a", MONDAY, "09:00", "APT1")
+    version = first.version("dr_a")
+
+    first.refresh()
+
+    assert first.version("dr_a") == version
+    assert "09:00" in first.free_slots("dr_a", MONDAY)[MONDAY.isoformat()]
+
+
+def test_other_workers_writes_are_replayed_once(engines):
+    first, second = engines
+    first.reserve("dr_a", MONDAY, "09:00", "APT1")
+    second.reserve("dr_a", MONDAY, "09:30", "APT2")
+    # first has not seen 09:30 yet; its next write catches up before logging
+    first.reserve("dr_a", MONDAY, "10:00", "APT3")
+    version = first.version("dr_a")
+
+    first.refresh()
+    second.refresh()
+
+    assert first.version("dr_a") == version
+    for engine in engines:
+        free = engine.free_slots("dr_a", MONDAY)[MONDAY.isoformat()]
+        assert not {"09:00", "09:30", "10:00"} & set(free)
+
+
+def test_slot_taken_in_another_worker(engines):
+    first, second = engines
+    first.reserve("dr_a", MONDAY, "09:00", "APT1")
+
+    with pytest.raises(SlotUnavailableError):
+        second.reserve("dr_a", MONDAY, "09:00", "APT2")
+
+    assert first.release("dr_a", MONDAY, "09:00", "APT2") is False
+    second.refresh()
+    assert "09:00" not in second.free_slots("dr_a", MONDAY)[MONDAY.isoformat()]
+
+
+def test_unknown_doctor_and_past_slots_are_rejected(tmp_path):
+    engine = ScheduleEngine(str(tmp_path / "schedule.db"), doctors=["dr_a"])
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+
+    with pytest.raises(InvalidBookingError):
+        engine.reserve("dr_unknown", MONDAY, "09:00", "APT1")
+    with pytest.raises(InvalidBookingError):
+        engine.reserve("dr_a", yesterday, "09:00", "APT2")
+
+    engine.set_doctors(["dr_b"])
+    engine.reserve("dr_b", MONDAY, "09:00", "APT3")
+    with pytest.raises(InvalidBookingError):
+        engine.reserve("dr_a", MONDAY, "09:30", "APT4")
+    engine._conn.close()
+
+
+def test_log_is_trimmed_every_n_writes(engines, monkeypatch):
+    first, second = engines
+    monkeypatch.setattr(schedule_engine, "TRIM_EVERY", 4)
+    trims = []
+    trim_log = first.trim_log
+    monkeypatch.setattr(first, "trim_log", lambda: trims.append(trim_log(keep=2)))
+
+    for i, slot in enumerate(["09:00", "09:30", "10:00", "10:30"]):
+        first.reserve("dr_a", MONDAY, slot, f"APT{i}")
+
+    assert len(trims) == 1
+    assert first._conn.execute("SELECT COUNT(*) FROM reservation_log").fetchone()[0] == 2
+    # second is behind the trimmed log and reloads from the table
+    free = second.free_slots("dr_a", MONDAY)[MONDAY.isoformat()]
+    assert not {"09:00", "09:30", "10:00", "10:30"} & set(free)
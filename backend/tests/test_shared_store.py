@@ -0,0 +1,256 @@
+"""
+Shared store across worker processes
+
+Several processes - standing in for gunicorn workers - share one SQLite
+file, or one Redis-protocol server (tests/fake_redis.py), and must agree
+on OTP attempt counts, single-use OTPs, session reads and logouts. Each
+worker times its store-backed calls; the latencies are printed per backend.
+"""
+
+import json
+import multiprocessing
+import statistics
+import time
+
+import pytest
+
+from auth_manager import AuthManager
+from fake_redis import FakeRedisServer
+from otp_service import OTPService
+from shared_store import RedisStore, SharedStore, create_shared_store
+
+WORKERS = 4
+SECRET = "shared-store-test-secret"
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def store_url(request, tmp_path):
+    if request.param == "sqlite":
+        yield f"sqlite:///{tmp_path / 'shared.db'}"
+        return
+    server = FakeRedisServer().start()
+    yield f"redis://127.0.0.1:{server.port}/0"
+    server.stop()
+
+
+def _worker(store_url, task, args, barrier, results):
+    """Process entry point: run one task against a store opened in this process"""
+    store = create_shared_store(store_url)
+    barrier.wait(timeout=30)  # start together so the calls overlap
+    timings = []
+
+    def timed(fn, *call_args):
+        started = time.perf_counter()
+        value = fn(*call_args)
+        timings.append(time.perf_counter() - started)
+        return value
+
+    if task == "guess_otp":
+        service = OTPService(store)
+        phone, guesses, max_attempts = args
+        service.max_attempts = max_attempts
+        outcome = [timed(service.verify_otp, phone, guess)["message"] for guess in guesses]
+    elif task == "validate_sessions":
+        manager = AuthManager(store, cache_ttl=0.0, token_format="opaque")
+        outcome = [getattr(timed(manager.validate_session, token), "user_id", None) for token in args]
+    elif task == "validate_signed":
+        manager = AuthManager(store, cache_ttl=0.0, token_format="signed", secret=SECRET)
+        outcome = [getattr(timed(manager.validate_session, token), "user_id", None) for token in args]
+    elif task == "logout":
+        manager = AuthManager(store, cache_ttl=0.0, token_format=args[0], secret=SECRET)
+        outcome = [timed(manager.destroy_session, token) for token in args[1]]
+    else:
+        raise ValueError(task)
+    results.put((outcome, timings))
+
+
+def run_workers(store_url, jobs):
+    """Run (task, args) jobs in parallel processes; returns [(outcome, timings)] in job order"""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(len(jobs))
+    queues = [context.Queue() for _ in jobs]
+    processes = [
+        context.Process(target=_worker, args=(store_url, task, args, barrier, queue))
+        for (task, args), queue in zip(jobs, queues)
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get(timeout=60) for queue in queues]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+    return results
+
+
+def report(store_url, label, results):
+    timings = sorted(t for _, worker_timings in results for t in worker_timings)
+    p50 = statistics.median(timings) * 1e6
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6
+    print(f"\n{store_url.split(':')[0]:>6} {label}: {len(timings)} calls"
+          f" across {len(results)} workers, p50 {p50:.0f}us, p99 {p99:.0f}us")
+
+
+def test_otp_attempts_are_counted_across_workers(store_url):
+    service = OTPService(create_shared_store(store_url))
+    service._send_sms = lambda phone, otp: True
+    otp = service.generate_otp("+910000000001")["otp"]
+    wrong = "000000" if otp != "000000" else "111111"
+
+    results = run_workers(store_url, [("guess_otp", ("+910000000001", [wrong, wrong],
+                                                     service.max_attempts))] * WORKERS)
+    messages = [message for outcome, _ in results for message in outcome]
+    report(store_url, "verify_otp", results)
+
+    # Exactly max_attempts guesses were judged, whichever workers made them
+    invalid = sorted(m for m in messages if m.startswith("Invalid OTP"))
+    assert invalid == [f"Invalid OTP. {n} attempts remaining." for n in (0, 1, 2)]
+    assert len(messages) - len(invalid) == 2 * WORKERS - service.max_attempts
+    assert service.verify_otp("+910000000001", otp)["success"] is False
+
+
+def test_otp_is_single_use_across_workers(store_url):
+    service = OTPService(create_shared_store(store_url))
+    service._send_sms = lambda phone, otp: True
+    otp = service.generate_otp("+910000000002")["otp"]
+    # Every worker's guess is judged
+    results = run_workers(store_url, [("guess_otp", ("+910000000002", [otp], WORKERS))] * WORKERS)
+    messages = [message for outcome, _ in results for message in outcome]
+    assert messages.count("OTP verified successfully") == 1
+    assert messages.count("OTP already used. Please request a new one.") == WORKERS - 1
+
+
+def test_sessions_and_logout_agree_across_workers(store_url):
+    manager = AuthManager(create_shared_store(store_url), cache_ttl=0.0, token_format="opaque")
+    manager._ensure_sweeper = lambda: None
+    tokens = [manager.create_session(f"user_{i}", {"phone": f"+91{i:010d}"})["token"] for i in range(50)]
+
+    results = run_workers(store_url, [("validate_sessions", tokens)] * WORKERS)
+    report(store_url, "validate_session", results)
+    for outcome, _ in results:
+        assert outcome == [f"user_{i}" for i in range(50)]
+
+    logged_out = tokens[:10]
+    results = run_workers(store_url, [("logout", ("opaque", logged_out))])
+    assert results[0][0] == [True] * 10
+
+    results = run_workers(store_url, [("validate_sessions", tokens)] * WORKERS)
+    for outcome, _ in results:
+        assert outcome == [None] * 10 + [f"user_{i}" for i in range(10, 50)]
+
+
+def test_signed_token_revocations_reach_every_worker(store_url):
+    manager = AuthManager(create_shared_store(store_url), cache_ttl=0.0, token_format="signed", secret=SECRET)
+    manager._ensure_sweeper = lambda: None
+    tokens = [manager.create_session(f"user_{i}", {})["token"] for i in range(20)]
+
+    results = run_workers(store_url, [("logout", ("signed", tokens[:5]))])
+    assert results[0][0] == [True] * 5
+
+    results = run_workers(store_url, [("validate_signed", tokens)] * WORKERS)
+    report(store_url, "validate_session (signed)", results)
+    for outcome, _ in results:
+        assert outcome == [None] * 5 + [f"user_{i}" for i in range(5, 20)]
+    # The issuing process picks the revocations up too
+    assert manager.validate_session(tokens[0]) is None
+
+
+class CountingStore:
+    """Wraps a store and counts reads of numbered revocation entries"""
+
+    def __init__(self, store):
+        self.store = store
+        self.log_reads = 0
+
+    def get(self, key):
+        if key.startswith("revoked:") and key[len("revoked:"):].isdigit():
+            self.log_reads += 1
+        return self.store.get(key)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def test_a_new_worker_does_not_replay_the_revocation_log(store_url):
+    store = create_shared_store(store_url)
+    issuer = AuthManager(store, cache_ttl=0.0, token_format="signed", secret=SECRET)
+    issuer._ensure_sweeper = lambda: None
+    tokens = [issuer.create_session(f"user_{i}", {})["token"] for i in range(40)]
+    for token in tokens[:30]:
+        assert issuer.destroy_session(token)
+
+    counting = CountingStore(create_shared_store(store_url))
+    worker = AuthManager(counting, cache_ttl=0.0, token_format="signed", secret=SECRET)
+    # Earlier revocations are found per token, without reading the log
+    assert worker.validate_session(tokens[0]) is None
+    assert worker.validate_session(tokens[35]).user_id == "user_35"
+    assert counting.log_reads == 0
+
+    # Later ones arrive through the log, even for tokens it has already seen
+    assert issuer.destroy_session(tokens[35])
+    assert worker.validate_session(tokens[35]) is None
+    assert counting.log_reads == 1
+
+
+def test_session_dict_is_json_ready():
+    manager = AuthManager(token_format="opaque")
+    manager._ensure_sweeper = lambda: None
+    session = manager.create_session("user_1", {"phone": "+910000000001"})
+
+    now = int(time.time())
+    assert isinstance(session["created_at"], int) and isinstance(session["expires_at"], int)
+    assert abs(session["created_at"] - now) <= 2
+    assert session["expires_at"] - session["created_at"] == manager.session_ttl
+    json.dumps(session)
+
+
+def test_a_log_entry_not_written_yet_is_waited_for(tmp_path):
+    store = create_shared_store(f"sqlite:///{tmp_path / 'shared.db'}")
+    worker = AuthManager(store, cache_ttl=0.0, token_format="signed", secret=SECRET)
+    worker._sync_revocations(time.time())
+    # Another worker has numbered its revocation but not yet written it
+    store.incr("revoked:seq")
+
+    worker._sync_revocations(time.time())
+    assert worker._revocations_seen == 0
+    store.set("revoked:1", {"token_id": "abc", "expires_at": time.time() + 60})
+    worker._sync_revocations(time.time())
+    assert worker._revocations_seen == 1 and "abc" in worker.revoked
+
+    # One that never shows up (its writer died) stops holding up the log
+    store.incr("revoked:seq")
+    worker._sync_revocations(time.time())
+    worker._sync_revocations(time.time() + worker.revocation_gap_timeout)
+    assert worker._revocations_seen == 2
+
+
+def test_redis_counter_gets_its_expiry_in_the_same_transaction():
+    server = FakeRedisServer().start()
+    try:
+        store = RedisStore("127.0.0.1", server.port)
+        assert store.incr("otp_attempts:+910000000001", ttl=60) == 1
+        _, expires_at = server.data["otp_attempts:+910000000001"]
+        assert 55 < expires_at - time.time() <= 60
+
+        # Later increments keep the first expiry
+        server.data["otp_attempts:+910000000001"] = (b"1", time.time() + 5)
+        assert store.incr("otp_attempts:+910000000001", ttl=60) == 2
+        assert server.data["otp_attempts:+910000000001"][1] - time.time() <= 5
+
+        assert store.incr("revoked:seq") == 1
+        assert server.data["revoked:seq"][1] is None
+        # The connection is still in step after the transaction
+        assert store.get("missing") is None
+    finally:
+        server.stop()
+
+
+def test_shared_store_is_an_abstract_interface():
+    with pytest.raises(TypeError):
+        SharedStore()
+
+    class Incomplete(SharedStore):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
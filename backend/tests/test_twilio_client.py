@@ -0,0 +1,113 @@
+"""
+TwilioClient.send_message against a fake Messages API: keep-alive reuse,
+the send log behind idempotency keys, and when a request may be retried
+"""
+
+import time
+
+import pytest
+
+from fake_twilio import FakeTwilioServer
+from shared_store import SQLiteStore
+from twilio_client import TwilioClient, TwilioError
+
+
+@pytest.fixture
+def server():
+    server = FakeTwilioServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    return TwilioClient("ACtest", "secret", base_url=server.base_url)
+
+
+@pytest.fixture
+def send_log(tmp_path):
+    return SQLiteStore(str(tmp_path / "send_log.db"))
+
+
+@pytest.fixture
+def logged_client(server, send_log):
+    return TwilioClient("ACtest", "secret", base_url=server.base_url, send_log=send_log)
+
+
+def test_sends_and_returns_the_message(client, server):
+    result = client.send_message("+15550001", "+15550000", "hello")
+    assert result["sid"] == server.messages[0]["sid"]
+    assert server.messages[0]["body"] == "hello"
+
+
+def test_lost_response_is_not_resent(client, server):
+    server.drop_next = 1
+    with pytest.raises(TwilioError) as excinfo:
+        client.send_message("+15550001", "+15550000", "hello")
+    assert not excinfo.value.retryable
+    # Twilio created the message; resending would have sent it twice
+    assert len(server.requests) == 1
+    assert len(server.messages) == 1
+
+
+def test_repeated_key_returns_the_logged_message(logged_client, server):
+    first = logged_client.send_message("+15550001", "+15550000", "hello", idempotency_key="otp-42")
+    second = logged_client.send_message("+15550001", "+15550000", "hello", idempotency_key="otp-42")
+    assert first["sid"] == second["sid"]
+    assert len(server.requests) == 1
+
+
+def test_key_with_an_unknown_outcome_is_never_resent(logged_client, server):
+    server.drop_next = 1
+    with pytest.raises(TwilioError) as excinfo:
+        logged_client.send_message("+15550001", "+15550000", "hello", idempotency_key="otp-42")
+    assert not excinfo.value.retryable
+
+    with pytest.raises(TwilioError) as excinfo:
+        logged_client.send_message("+15550001", "+15550000", "hello", idempotency_key="otp-42")
+    assert not excinfo.value.retryable
+    assert len(server.requests) == 1
+
+
+def test_key_in_flight_elsewhere_is_retried_later(logged_client, send_log, server):
+    # Another worker wrote its entry and hasn't heard back yet
+    send_log.add("twilio:send:otp-42", {"status": "sending"})
+    with pytest.raises(TwilioError) as excinfo:
+        logged_client.send_message("+15550001", "+15550000", "hello", idempotency_key="otp-42")
+    assert excinfo.value.retryable
+    assert server.requests == []
+
+    send_log.set("twilio:send:otp-42", {"status": "sent", "message": {"sid": "SMother"}})
+    assert logged_client.send_message("+15550001", "+15550000", "hello",
+                                      idempotency_key="otp-42")["sid"] == "SMother"
+
+
+def test_failed_key_can_be_sent_again(logged_client, server):
+    server.fail_next = 1
+    with pytest.raises(TwilioError) as excinfo:
+        logged_client.send_message("+15550001", "+15550000", "hello", idempotency_key="otp-42")
+    assert excinfo.value.retryable
+    result = logged_client.send_message("+15550001", "+15550000", "hello", idempotency_key="otp-42")
+    assert result["sid"] == server.messages[0]["sid"]
+    assert len(server.messages) == 1
+
+
+def test_connection_closed_while_idle_is_replaced_before_sending(client, server):
+    server.close_after_next = 1  # e.g. its idle timeout
+    client.send_message("+15550001", "+15550000", "hello")
+    stale = client._local.conn
+    time.sleep(0.1)
+    # Noticed before a request is written to it (and the response lost)
+    assert client._connection() is not stale
+    client.send_message("+15550001", "+15550000", "again")
+    assert len(server.messages) == 2
+
+
+def test_server_errors_are_retryable(client, server):
+    server.fail_next = 1
+    with pytest.raises(TwilioError) as excinfo:
+        client.send_message("+15550001", "+15550000", "hello")
+    assert excinfo.value.status == 503
+    assert excinfo.value.retryable
+    # The connection stays usable
+    assert client.send_message("+15550001", "+15550000", "hello")["sid"]
@@ -0,0 +1,124 @@
+"""
+WhatsApp broadcast: template validation and rendering, recipient checks,
+and jobs that always finish (against the fake Twilio server)
+"""
+
+import time
+
+import pytest
+
+from fake_twilio import FakeTwilioServer
+from shared_store import SQLiteStore
+from twilio_client import TwilioClient
+from whatsapp_broadcast import BroadcastJob, WhatsAppBroadcaster, render_template, validate_template
+
+
+@pytest.fixture
+def server():
+    server = FakeTwilioServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def send_log(tmp_path):
+    return SQLiteStore(str(tmp_path / "send_log.db"))
+
+
+@pytest.fixture
+def broadcaster(server, send_log):
+    client = TwilioClient("ACtest", "secret", base_url=server.base_url, send_log=send_log)
+    return WhatsAppBroadcaster(client, "whatsapp:+15550000", max_concurrency=4, rate_per_second=1000)
+
+
+def wait_until_done(broadcaster, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = broadcaster.get_job(job_id)
+        if job["status"] == "completed":
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job still {broadcaster.get_job(job_id)['status']}")
+
+
+@pytest.mark.parametrize("template", [
+    "Hi {name",
+    "Hi name}",
+    "Hi {0}",
+    "Hi {}",
+    "Hi {to:>999999999}",
+    "Hi {name!r}",
+    "Hi {name.__class__}",
+    "Hi {recipient[to]}",
+])
+def test_rejects_templates_beyond_plain_placeholders(template):
+    with pytest.raises(ValueError):
+        validate_template(template)
+
+
+def test_renders_placeholders_and_escapes():
+    template = "Hi {name}, {doctor_name} says {{stay safe}} {unknown}"
+    validate_template(template)
+    assert render_template(template, {"name": "Asha", "doctor_name": "Dr. Rao"}) == \
+        "Hi Asha, Dr. Rao says {stay safe} {unknown}"
+
+
+def test_start_rejects_a_bad_template(broadcaster):
+    with pytest.raises(ValueError):
+        broadcaster.start("Hi {to:>999999999}", ["+15550001"])
+
+
+@pytest.mark.parametrize("recipients", [[42], [["+15550001"]], [None], "+15550001"])
+def test_start_rejects_bad_recipients(broadcaster, recipients):
+    with pytest.raises(ValueError):
+        broadcaster.start("Hi {name}", recipients)
+
+
+def test_job_finishes_with_per_recipient_results(broadcaster, server):
+    server.reject_next = 1
+    job = broadcaster.start("Hi {name}, from {doctor_name}",
+                            [{"to": "+15550001", "name": "Asha"}, "+15550002", {"to": "+15550003"}],
+                            {"doctor_name": "Dr. Rao"})
+    done = wait_until_done(broadcaster, job.id)
+    assert (done["sent"], done["failed"]) == (2, 1)
+    assert len(server.messages) == 2
+    assert {m["body"] for m in server.messages} <= {"Hi Asha, from Dr. Rao", "Hi {name}, from Dr. Rao"}
+
+
+def test_a_recipient_that_cannot_be_rendered_fails_alone(broadcaster, server):
+    class Unprintable:
+        def __str__(self):
+            raise RuntimeError("no text form")
+
+    job = BroadcastJob("Hi {name}", [{"to": "whatsapp:+15550001", "name": Unprintable()},
+                                     {"to": "whatsapp:+15550002", "name": "Asha"}])
+    broadcaster._deliver(job, 0)
+    broadcaster._deliver(job, 1)
+    assert job.status == "completed"
+    assert (job.sent, job.failed) == (1, 1)
+    assert job.results[0]["status"] == "failed"
+    assert "no text form" in job.results[0]["error"]
+
+
+def test_each_recipient_is_messaged_at_most_once(broadcaster, server, send_log):
+    server.fail_next = 1  # retried: Twilio never took it
+    server.drop_next = 1  # not retried: Twilio created it but never answered
+    job = broadcaster.start("Hi", ["+15550001", "+15550002", "+15550003"])
+    done = wait_until_done(broadcaster, job.id)
+
+    assert (done["sent"], done["failed"]) == (2, 1)
+    assert len(server.messages) == 3
+    assert sorted(m["to"] for m in server.messages) == \
+        ["whatsapp:+15550001", "whatsapp:+15550002", "whatsapp:+15550003"]
+    # Each send was logged under the job id and the recipient's index
+    for index in range(3):
+        assert send_log.get(f"twilio:send:{job.id}:{index}") is not None
+
+
+def test_a_rerun_of_a_recipient_is_answered_from_the_send_log(broadcaster, server):
+    job = BroadcastJob("Hi", [{"to": "whatsapp:+15550001"}])
+    broadcaster._deliver(job, 0)
+    job.sent, job.results[0] = 0, None
+    broadcaster._deliver(job, 0)
+    assert job.results[0]["status"] == "sent"
+    assert len(server.messages) == 1
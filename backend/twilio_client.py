@@ -0,0 +1,183 @@
+"""
+Twilio REST Client for MedicSense AI
+Sends SMS / WhatsApp messages over kept-alive HTTPS connections
+
+A thin replacement for the Twilio SDK's messages.create(): one persistent
+connection per thread instead of a new TLS handshake per message.
+
+The Messages API has no idempotency support, so a request is never resent
+once it was written: Twilio may have acted on it even if the response was
+lost. Callers that retry pass an idempotency_key, which is checked against
+a send log (a SharedStore) before anything is sent - a key that already
+produced a message returns that message, and a key whose earlier request
+has an unknown outcome is refused instead of risking a second message.
+"""
+
+import base64
+import http.client
+import json
+import os
+import select
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlencode, urlparse
+
+from dotenv import load_dotenv
+
+from shared_store import SQLiteStore, SharedStore, shared_store
+
+load_dotenv()
+
+# How long a send log entry outlives its message (covers every retry schedule)
+SEND_LOG_TTL = 7 * 86400
+
+
+class TwilioError(Exception):
+    """
+    A failed Twilio API call
+
+    `retryable` is set for 429s, 5xx and network errors from before the
+    request was written - never once Twilio may have created the message.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class TwilioClient:
+    """Minimal Messages API client with per-thread keep-alive connections"""
+
+    def __init__(self, account_sid: str, auth_token: str,
+                 base_url: str = "https://api.twilio.com", timeout: float = 10.0,
+                 send_log: Optional[SharedStore] = None):
+        self.account_sid = account_sid
+        self.timeout = timeout
+        self.send_log = send_log  # idempotency key -> outcome of its send
+        parsed = urlparse(base_url)
+        self._secure = parsed.scheme == "https"
+        self._host = parsed.netloc
+        credentials = base64.b64encode(f"{account_sid}:{auth_token}".encode()).decode()
+        self._headers = {
+            "Authorization": f"Basic {credentials}",
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Accept": "application/json",
+            "Connection": "keep-alive",
+        }
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> Optional["TwilioClient"]:
+        """Client from TWILIO_* environment variables (None if not configured)"""
+        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+        if not account_sid or not auth_token:
+            return None
+        send_log = shared_store or SQLiteStore(os.getenv("TWILIO_SEND_LOG_PATH", "data/twilio_send_log.db"))
+        return cls(account_sid, auth_token,
+                   base_url=os.getenv("TWILIO_API_BASE", "https://api.twilio.com"),
+                   send_log=send_log)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            # An idle kept-alive socket is only readable once the server closed
+            # it; find that out now, since a request written to it isn't resent
+            self._reset()
+            conn = None
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self._secure else http.client.HTTPConnection
+            conn = conn_class(self._host, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def send_message(self, to: str, from_: str, body: str,
+                     idempotency_key: Optional[str] = None) -> Dict:
+        """
+        Create a message (SMS, or WhatsApp with whatsapp: prefixed numbers)
+
+        With an idempotency_key and a send log, a repeat of a key that was
+        sent returns the first message without sending again.
+
+        Returns:
+            Twilio's message resource as a dict (has "sid")
+        """
+        log_key = f"twilio:send:{idempotency_key}" if idempotency_key and self.send_log else None
+        if log_key is not None:
+            try:
+                claimed = self.send_log.add(log_key, {"status": "sending"}, ttl=SEND_LOG_TTL)
+                record = None if claimed else self.send_log.get(log_key)
+            except Exception as e:
+                raise TwilioError(f"Send log unavailable: {e}", retryable=True)
+            if record is not None:
+                if record.get("status") == "sent":
+                    return record["message"]
+                if record.get("status") == "sending":
+                    # Another worker's request; its outcome decides the retry
+                    raise TwilioError(f"Message {idempotency_key} is being sent", retryable=True)
+                raise TwilioError(f"Message {idempotency_key} may already have been sent; not resending")
+
+        try:
+            result = self._post(to, from_, body)
+        except TwilioError as e:
+            if log_key is not None:
+                self._log(log_key, None if e.retryable or e.status else {"status": "unknown"})
+            raise
+        if log_key is not None:
+            self._log(log_key, {"status": "sent", "message": result})
+        return result
+
+    def _log(self, log_key: str, record: Optional[Dict]):
+        """Record a send's outcome; None forgets it (the request was never accepted)"""
+        try:
+            if record is None:
+                self.send_log.delete(log_key)
+            else:
+                self.send_log.set(log_key, record, ttl=SEND_LOG_TTL)
+        except Exception as e:
+            print(f"⚠️  Could not update the Twilio send log: {e}")
+
+    def _post(self, to: str, from_: str, body: str) -> Dict:
+        path = f"/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        payload = urlencode({"To": to, "From": from_, "Body": body})
+
+        # A connection that fails before the request is fully written is
+        # retried once on a fresh one. Once it was written Twilio may have
+        # created the message, so a lost response is reported, not resent.
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", path, body=payload, headers=self._headers)
+            except (OSError, http.client.HTTPException) as e:
+                self._reset()
+                if attempt == 1:
+                    raise TwilioError(f"Could not reach Twilio: {e}", retryable=True)
+                continue
+            try:
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self._reset()
+                raise TwilioError(f"No response from Twilio, the message may have been sent: {e}")
+
+        if response.will_close:
+            self._reset()
+
+        try:
+            result = json.loads(data) if data else {}
+        except ValueError:
+            result = {}
+
+        if response.status >= 400:
+            message = result.get("message") or f"HTTP {response.status}"
+            retryable = response.status == 429 or response.status >= 500
+            raise TwilioError(f"Twilio error: {message}", status=response.status, retryable=retryable)
+        return result
@@ -0,0 +1,249 @@
+"""
+WhatsApp Broadcast for MedicSense AI
+Sends one templated message to many patients as a background job
+
+Recipients are delivered concurrently on a bounded thread pool through the
+shared kept-alive Twilio client, paced by a token bucket so the provider's
+messages-per-second limit is never exceeded. Each broadcast gets a job id
+whose progress can be polled.
+
+Every send carries the idempotency key "<job id>:<recipient index>", so a
+retry is checked against the Twilio client's send log and a recipient is
+never messaged twice; a send whose response was lost is not retried.
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from dotenv import load_dotenv
+
+from rate_limiter import MemoryBuckets
+from shared_store import SharedStore, shared_store
+from twilio_client import TwilioClient, TwilioError
+
+load_dotenv()
+
+
+# {name} placeholders, plus {{ and }} for literal braces. Nothing else is
+# template syntax: no format specs, conversions, attribute access, indexing
+# or positional fields, since the template comes from the client.
+TEMPLATE_TOKEN_RE = re.compile(r"\{\{|\}\}|\{([A-Za-z_]\w*)\}")
+
+
+def validate_template(template: str):
+    """ValueError unless every brace is part of a {name} placeholder or an escape"""
+    if not isinstance(template, str):
+        raise ValueError("Message template must be a string")
+    leftover = TEMPLATE_TOKEN_RE.sub("", template)
+    if "{" in leftover or "}" in leftover:
+        raise ValueError("Invalid template: use {name} placeholders, and {{ or }} for literal braces")
+
+
+def render_template(template: str, variables: Dict) -> str:
+    """Fill {name} placeholders; unknown ones are left as written"""
+
+    def substitute(match):
+        token, name = match.group(0), match.group(1)
+        if name is None:
+            return token[0]  # {{ -> {, }} -> }
+        return str(variables[name]) if name in variables else token
+
+    return TEMPLATE_TOKEN_RE.sub(substitute, template)
+
+
+class BroadcastJob:
+    """Progress of one broadcast"""
+
+    __slots__ = ("id", "template", "recipients", "results", "sent", "failed",
+                 "status", "created_at", "finished_at", "_lock")
+
+    def __init__(self, template: str, recipients: List[Dict]):
+        self.id = f"bc_{uuid.uuid4().hex[:12]}"
+        self.template = template
+        self.recipients = recipients
+        self.results: List[Optional[Dict]] = [None] * len(recipients)
+        self.sent = 0
+        self.failed = 0
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def to_dict(self, include_results: bool = True) -> Dict:
+        total = len(self.recipients)
+        done = self.sent + self.failed
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "total": total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "pending": total - done,
+            "progress": round(100.0 * done / total, 1) if total else 100.0,
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.created_at, 2),
+        }
+        if include_results:
+            data["results"] = [r for r in self.results if r is not None]
+        return data
+
+
+class WhatsAppBroadcaster:
+    """Concurrency-capped, rate-paced bulk WhatsApp delivery"""
+
+    def __init__(self, client: Optional[TwilioClient], from_number: Optional[str],
+                 max_concurrency: int = 8, rate_per_second: float = 10.0,
+                 max_recipients: int = 1000, max_attempts: int = 3,
+                 store: Optional[SharedStore] = None, keep_jobs: int = 100):
+        self.client = client
+        self.from_number = from_number
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.max_recipients = max_recipients
+        self.max_attempts = max_attempts
+        self.store = store
+        self.keep_jobs = keep_jobs
+
+        # One bucket for the provider; burst of one second's worth of sends
+        self._pacer = MemoryBuckets()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._jobs: "OrderedDict[str, BroadcastJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return self.client is not None and bool(self.from_number)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Created lazily so each forked server worker builds its own
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                thread_name_prefix="whatsapp-broadcast")
+            return self._pool
+
+    @staticmethod
+    def normalize_recipients(recipients: List[Union[str, Dict]]) -> List[Dict]:
+        """Accept "+91..." strings or {"to": ..., <template vars>} objects"""
+        normalized = []
+        for recipient in recipients:
+            if isinstance(recipient, str):
+                entry = {"to": recipient}
+            elif isinstance(recipient, dict):
+                entry = dict(recipient)
+            else:
+                raise ValueError("Each recipient must be a phone number or an object with \"to\"")
+            to = str(entry.get("to", "")).strip()
+            if not to:
+                raise ValueError("Every recipient needs a phone number")
+            entry["to"] = to if to.startswith("whatsapp:") else f"whatsapp:{to}"
+            normalized.append(entry)
+        return normalized
+
+    def start(self, template: str, recipients: List[Union[str, Dict]],
+              variables: Optional[Dict] = None) -> BroadcastJob:
+        """Validate and queue a broadcast; returns immediately"""
+        if not template:
+            raise ValueError("Message template is required")
+        validate_template(template)
+        if not recipients:
+            raise ValueError("At least one recipient is required")
+        if not isinstance(recipients, list):
+            raise ValueError("Recipients must be a list")
+        if len(recipients) > self.max_recipients:
+            raise ValueError(f"Too many recipients (max {self.max_recipients})")
+
+        normalized = self.normalize_recipients(recipients)
+        if variables:
+            normalized = [dict(variables, **entry) for entry in normalized]
+
+        job = BroadcastJob(template, normalized)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep_jobs:
+                self._jobs.popitem(last=False)
+
+        executor = self._executor()
+        job.status = "running"
+        self._publish(job)
+        for index in range(len(normalized)):
+            executor.submit(self._deliver, job, index)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Job progress from this worker, or the shared store if another worker owns it"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is not None:
+            return self.store.get(f"broadcast:{job_id}")
+        return None
+
+    def _deliver(self, job: BroadcastJob, index: int):
+        recipient = job.recipients[index]
+        result = {"index": index, "to": recipient["to"]}
+
+        # Any failure is this recipient's; the job must still finish
+        try:
+            body = render_template(job.template, recipient)
+            key = f"{job.id}:{index}"  # same on every attempt
+            for attempt in range(1, self.max_attempts + 1):
+                self._pace()
+                try:
+                    message = self.client.send_message(recipient["to"], self.from_number, body,
+                                                       idempotency_key=key)
+                    result.update(status="sent", sid=message.get("sid"), attempts=attempt)
+                    result.pop("error", None)
+                    break
+                except TwilioError as e:
+                    result.update(status="failed", error=str(e), attempts=attempt)
+                    if not e.retryable:
+                        break
+                    time.sleep(min(2.0, 0.25 * 2 ** (attempt - 1)))
+        except Exception as e:
+            result.update(status="failed", error=str(e), attempts=result.get("attempts", 0))
+
+        with job._lock:
+            job.results[index] = result
+            if result["status"] == "sent":
+                job.sent += 1
+            else:
+                job.failed += 1
+            finished = job.sent + job.failed == len(job.recipients)
+            if finished:
+                job.status = "completed"
+                job.finished_at = time.time()
+        if finished or index % 25 == 0:
+            self._publish(job)
+
+    def _pace(self):
+        # Block until the provider bucket has a token
+        while True:
+            allowed, wait = self._pacer.hit("provider", self.rate_per_second,
+                                            max(1, int(self.rate_per_second)))
+            if allowed:
+                return
+            time.sleep(wait)
+
+    def _publish(self, job: BroadcastJob):
+        if self.store is None:
+            return
+        try:
+            self.store.set(f"broadcast:{job.id}", job.to_dict(include_results=False), ttl=86400)
+        except Exception as e:
+            print(f"⚠️  Could not publish broadcast progress: {e}")
+
+
+# Global instance
+whatsapp_broadcaster = WhatsAppBroadcaster(
+    TwilioClient.from_env(),
+    os.getenv("TWILIO_WHATSAPP_NUMBER"),
+    max_concurrency=int(os.getenv("WHATSAPP_BROADCAST_CONCURRENCY", "8")),
+    rate_per_second=float(os.getenv("WHATSAPP_RATE_LIMIT", "10")),
+    store=shared_store,
+)